@@ -0,0 +1,80 @@
+import time
+import logging
+
+DEFAULT_ACTIVITY_QUANTUM = 0.5  # Record user activity at most once per this many seconds
+
+
+class ActivityRecorder:
+    """Record mouse/keyboard activity with as little work per event as possible.
+
+    Input hooks call the ``on_*`` handlers for every event, thousands of times
+    a second while the mouse moves. A handler bumps its own counter and only
+    stores a new activity time once per ``quantum``; it takes no lock, builds
+    no strings and logs nothing. Each counter has a single writer (the mouse
+    or keyboard listener thread), and readers only need a recent value of the
+    activity time, whose assignment is atomic.
+    """
+
+    def __init__(self, quantum=DEFAULT_ACTIVITY_QUANTUM, clock=time.monotonic):
+        self.quantum = quantum
+        self.clock = clock
+        self.last_activity_time = clock()
+        self._next_record = 0.0  # Events before this time are only counted
+        # Per-source event counts, and how many of them updated the activity time
+        self.moves = self.clicks = self.scrolls = self.keys = 0
+        self.recorded = 0
+
+    def _record(self):
+        now = self.clock()
+        if now >= self._next_record:
+            self._next_record = now + self.quantum
+            self.last_activity_time = now
+            self.recorded += 1
+
+    def on_move(self, x=None, y=None, *args):
+        self.moves += 1
+        self._record()
+
+    def on_click(self, x=None, y=None, button=None, pressed=None, *args):
+        self.clicks += 1
+        self._record()
+
+    def on_scroll(self, x=None, y=None, dx=None, dy=None, *args):
+        self.scrolls += 1
+        self._record()
+
+    def on_press(self, key=None, *args):
+        self.keys += 1
+        self._record()
+
+    def last_activity(self):
+        """Monotonic time of the last recorded activity."""
+        return self.last_activity_time
+
+    def counters(self):
+        """Event counts per source plus the number of coalesced activity updates."""
+        return {"mouse_move": self.moves, "mouse_click": self.clicks, "mouse_scroll": self.scrolls,
+                "keyboard": self.keys, "recorded": self.recorded}
+
+
+def start_listeners(recorder):
+    """Hook mouse and keyboard input into ``recorder``; returns the started listeners.
+
+    pynput runs each listener on its own thread, so nothing else has to stay awake.
+    """
+    from pynput import mouse, keyboard
+
+    logging.info("Starting mouse and keyboard listeners")
+    mouse_listener = mouse.Listener(on_move=recorder.on_move, on_click=recorder.on_click,
+                                    on_scroll=recorder.on_scroll)
+    keyboard_listener = keyboard.Listener(on_press=recorder.on_press)
+    mouse_listener.start()
+    keyboard_listener.start()
+    return mouse_listener, keyboard_listener
+
+
+def stop_listeners(listeners, recorder):
+    logging.info("Stopping mouse and keyboard listeners")
+    for listener in listeners:
+        listener.stop()
+    logging.info(f"Mouse and keyboard listeners stopped - Events: {recorder.counters()}")
@@ -0,0 +1,233 @@
+import os
+import socket
+import struct
+import logging
+
+from decision import HysteresisRule
+from signals import ActivitySignal, ProcessTable
+
+FD_REFRESH_INTERVAL = 30  # Re-read every descriptor of a watched process this often, for reused fd numbers (in seconds)
+RECEIVE_BUFFER = 1 << 16  # Bytes read from the netlink socket per recv; the kernel fills it with whole messages
+
+# Linux sock_diag netlink interface (linux/sock_diag.h, linux/inet_diag.h)
+NETLINK_SOCK_DIAG = 4
+SOCK_DIAG_BY_FAMILY = 20
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+INET_DIAG_INFO = 2  # Attribute carrying the socket's struct tcp_info
+TCP_DATA_STATES = sum(1 << state for state in (1, 4, 5, 8, 9, 11))  # ESTABLISHED, FIN_WAIT1/2, CLOSE_WAIT, LAST_ACK, CLOSING
+TCP_INFO_BYTES_OFFSET = 120  # tcpi_bytes_acked, then tcpi_bytes_received, in struct tcp_info (Linux 4.1+)
+
+_HEADER = struct.Struct("=IHHII")  # nlmsghdr: length, type, flags, sequence, port id
+_REQUEST = struct.Struct("=BBBxI48x")  # inet_diag_req_v2: family, protocol, extensions, states, any socket id
+_MESSAGE = struct.Struct("=BBBB48xIIIII")  # inet_diag_msg: family, state, timer, retransmits, id, ..., uid, inode
+_ATTRIBUTE = struct.Struct("=HH")  # rtattr: length, type
+_TCP_BYTES = struct.Struct("=QQ")
+
+
+class SocketTable:
+    """Byte counters of the host's TCP sockets by inode, from one sock_diag netlink dump per address family.
+
+    One dump costs a single round trip to the kernel regardless of how many
+    processes are watched, and only sockets that can carry data are listed.
+    Linux only; the netlink socket is opened on the first dump.
+    """
+
+    def __init__(self):
+        self._sock = None
+        self._sequence = 0
+        self.sockets = 0  # Sockets in the last dump
+
+    def dump(self):
+        """{inode: (bytes received, bytes sent and acknowledged)} for every TCP socket with data."""
+        if self._sock is None:
+            self._sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_SOCK_DIAG)
+        counters = {}
+        for family in (socket.AF_INET, socket.AF_INET6):
+            self._dump_family(family, counters)
+        self.sockets = len(counters)
+        return counters
+
+    def _dump_family(self, family, counters):
+        self._sequence += 1
+        request = _REQUEST.pack(family, socket.IPPROTO_TCP, 1 << (INET_DIAG_INFO - 1), TCP_DATA_STATES)
+        self._sock.send(_HEADER.pack(_HEADER.size + len(request), SOCK_DIAG_BY_FAMILY,
+                                     NLM_F_REQUEST | NLM_F_DUMP, self._sequence, 0) + request)
+        while True:
+            data = self._sock.recv(RECEIVE_BUFFER)
+            offset = 0
+            while offset + _HEADER.size <= len(data):
+                length, kind, _, sequence, _ = _HEADER.unpack_from(data, offset)
+                if length < _HEADER.size:
+                    return
+                if sequence == self._sequence:
+                    if kind == NLMSG_DONE:
+                        return
+                    if kind == NLMSG_ERROR:
+                        error = -struct.unpack_from("=i", data, offset + _HEADER.size)[0]
+                        raise OSError(error, f"sock_diag dump failed: {os.strerror(error)}")
+                    if kind == SOCK_DIAG_BY_FAMILY:
+                        self._parse(data, offset + _HEADER.size, offset + length, counters)
+                offset += (length + 3) & ~3
+
+    @staticmethod
+    def _parse(data, start, end, counters):
+        inode = _MESSAGE.unpack_from(data, start)[-1]
+        offset = start + _MESSAGE.size
+        while offset + _ATTRIBUTE.size <= end:
+            length, kind = _ATTRIBUTE.unpack_from(data, offset)
+            if length < _ATTRIBUTE.size:
+                return
+            if kind == INET_DIAG_INFO and length - _ATTRIBUTE.size >= TCP_INFO_BYTES_OFFSET + _TCP_BYTES.size:
+                acked, received = _TCP_BYTES.unpack_from(data, offset + _ATTRIBUTE.size + TCP_INFO_BYTES_OFFSET)
+                counters[inode] = (received, acked)
+                return
+            offset += (length + 3) & ~3
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+class SocketOwners:
+    """Socket inodes held by each watched process, read incrementally from /proc/<pid>/fd.
+
+    Each read lists a process's descriptors but only resolves the links of
+    new ones, and of sockets that have left the TCP table, since their fd
+    number may have been reused. Every descriptor is re-read every
+    FD_REFRESH_INTERVAL seconds to catch a file's fd reused for a socket.
+    """
+
+    def __init__(self):
+        self._fds = {}  # {pid: {fd name: socket inode, or None for anything else}}
+        self._next_refresh = {}  # {pid: time of the next full re-read}
+        self.lookups = 0  # Links resolved since start, for the overhead metrics
+        self.unreadable = set()  # PIDs whose descriptors we may not read
+
+    def inodes(self, pid, now, live, previous_live):
+        """The socket inodes of ``pid``; ``live`` and ``previous_live`` are this and the last TCP table."""
+        path = f"/proc/{pid}/fd"
+        try:
+            names = os.listdir(path)
+        except PermissionError:
+            self.unreadable.add(pid)
+            return ()
+        except OSError:
+            return ()  # Exited since the process table was refreshed
+        known = self._fds.get(pid, {})
+        if now >= self._next_refresh.get(pid, 0.0):
+            self._next_refresh[pid] = now + FD_REFRESH_INTERVAL
+            known = {}
+        fds = {}
+        for name in names:
+            inode = known.get(name, False)
+            if inode is False or (inode in previous_live and inode not in live):
+                inode = self._resolve(path, name)
+            fds[name] = inode
+        self._fds[pid] = fds
+        return [inode for inode in fds.values() if inode is not None]
+
+    def _resolve(self, path, name):
+        self.lookups += 1
+        try:
+            link = os.readlink(f"{path}/{name}")
+        except OSError:
+            return None
+        return int(link[8:-1]) if link.startswith("socket:[") else None
+
+    def forget(self, pids):
+        """Drop the processes not in ``pids``."""
+        for pid in self._fds.keys() - pids:
+            del self._fds[pid]
+            self._next_refresh.pop(pid, None)
+        self.unreadable &= pids
+
+    def descriptors(self):
+        return sum(len(fds) for fds in self._fds.values())
+
+
+class ProcessTrafficSignal(ActivitySignal):
+    """TCP traffic in Mbps, download plus upload, of the processes matching each of a set of name patterns.
+
+    Sockets are attributed to processes by inode: the kernel's TCP table
+    (SocketTable) gives each socket's byte counters and the processes'
+    descriptors (SocketOwners) say which sockets they hold. Each pattern
+    feeds its own rule, with its own threshold, under the source
+    ``traffic:PATTERN``. Sockets first seen in a read only set a baseline.
+    UDP traffic is not counted.
+    """
+
+    name = "traffic"
+    cost = 0.002
+
+    def __init__(self, rules):
+        super().__init__(dict(rules))  # {pattern: Mbps threshold}
+        self.table = ProcessTable(self.threshold)
+        self.sockets = SocketTable()
+        self.owners = SocketOwners()
+        self.rates = {}  # {pattern: (download, upload) Mbps} at the last read
+        self.available = hasattr(socket, "AF_NETLINK")
+        self._previous = None  # (timestamp, {inode: counters}) of the watched sockets at the last read
+        self._previous_live = {}
+        self._tracked = 0
+
+    @staticmethod
+    def source(pattern):
+        return f"traffic:{pattern}"
+
+    def read_values(self, now):
+        if not self.available:
+            return {}
+        try:
+            live = self.sockets.dump()
+        except OSError as e:
+            self.available = False  # No sock_diag (not Linux, or blocked by a sandbox); the rules stay released
+            logging.error(f"Per-process traffic is unavailable, ignoring --process-traffic: {e}")
+            return {}
+        matches = self.table.refresh(now)
+        inodes = {pattern: set() for pattern in self.threshold}
+        for pid in matches:
+            held = self.owners.inodes(pid, now, live, self._previous_live)
+            for pattern in self.table.matching(pid):
+                inodes[pattern].update(inode for inode in held if inode in live)
+        self.owners.forget(matches.keys())
+        self._previous_live = live
+        watched = {inode: live[inode] for held in inodes.values() for inode in held}
+        self._tracked = len(watched)
+        previous, self._previous = self._previous, (now, watched)
+        if previous is None or now <= previous[0]:
+            return {}
+        elapsed = now - previous[0]
+        values, rates = {}, {}
+        for pattern, held in inodes.items():
+            received = sent = 0
+            for inode in held:
+                before = previous[1].get(inode)
+                if before is not None:
+                    received += max(0, watched[inode][0] - before[0])
+                    sent += max(0, watched[inode][1] - before[1])
+            rates[pattern] = (received * 8 / elapsed / 1_000_000, sent * 8 / elapsed / 1_000_000)
+            values[self.source(pattern)] = sum(rates[pattern])
+        self.rates = rates
+        return values
+
+    def reset(self):
+        super().reset()
+        self.table.reset()
+        self.rates = {}
+        self._previous = None
+
+    def rules(self, window, release_ratio, engage_hold, release_hold):
+        return [HysteresisRule(self.source(pattern), self.source(pattern), threshold, threshold * release_ratio,
+                               window, engage_hold, release_hold)
+                for pattern, threshold in self.threshold.items()]
+
+    def status(self):
+        return dict(super().status(), available=self.available,
+                    rates={pattern: [round(rate, 3) for rate in rates] for pattern, rates in self.rates.items()},
+                    attribution={"processes": len(self.table.matches), "sockets": self._tracked,
+                                 "fds": self.owners.descriptors(), "fd_lookups": self.owners.lookups,
+                                 "unreadable": len(self.owners.unreadable)})
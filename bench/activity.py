@@ -0,0 +1,104 @@
+"""Activity handler micro-benchmark: events/sec and per-event latency.
+
+Run from the repository root:
+
+    python bench/activity.py [--events 1000000] [--output activity.json]
+
+Floods ActivityRecorder's handlers with synthetic mouse moves (one thread)
+and key presses (a second thread, as pynput delivers them), and compares
+with the previous handler, which took a shared lock and formatted a debug
+message on every event. Latency percentiles come from timing every handler
+call individually with perf_counter_ns.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from activity import ActivityRecorder  # noqa: E402
+
+
+class LegacyHandler:
+    """The pre-ActivityRecorder on_activity: lock + timestamp formatting per event."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last_activity_time = time.time()
+
+    def on_activity(self, *args):
+        with self.lock:
+            self.last_activity_time = time.time()
+            logging.debug(f"User activity detected, reset timer at {datetime.fromtimestamp(self.last_activity_time).strftime('%H:%M:%S')}")
+
+
+def throughput(handler, events, threads=1):
+    """Events per second delivered to ``handler`` by ``threads`` concurrent senders."""
+    per_thread = events // threads
+
+    def flood():
+        for i in range(per_thread):
+            handler(i, i)
+
+    workers = [threading.Thread(target=flood) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return per_thread * threads / (time.perf_counter() - start)
+
+
+def latency_ns(handler, events):
+    """p50/p99/max latency of single handler calls, in nanoseconds."""
+    clock = time.perf_counter_ns
+    samples = []
+    append = samples.append
+    for i in range(events):
+        start = clock()
+        handler(i, i)
+        append(clock() - start)
+    samples.sort()
+    return {"p50": samples[len(samples) // 2], "p99": samples[int(len(samples) * 0.99)], "max": samples[-1]}
+
+
+def run(events):
+    results = {}
+    recorder = ActivityRecorder()
+    results["recorder_events_per_sec"] = round(throughput(recorder.on_move, events))
+    results["recorder_events_per_sec_2_threads"] = round(throughput(
+        lambda x, y: (recorder.on_move(x, y) if x & 1 else recorder.on_press(x)), events, threads=2))
+    results["recorder_latency_ns"] = latency_ns(recorder.on_move, min(events, 200_000))
+    results["recorder_coalesced_updates"] = recorder.recorded
+
+    legacy = LegacyHandler()
+    results["legacy_events_per_sec"] = round(throughput(legacy.on_activity, events))
+    results["legacy_events_per_sec_2_threads"] = round(throughput(legacy.on_activity, events, threads=2))
+    results["legacy_latency_ns"] = latency_ns(legacy.on_activity, min(events, 200_000))
+    results["speedup"] = round(results["recorder_events_per_sec"] / results["legacy_events_per_sec"], 2)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=1_000_000, help="Events per run (default: %(default)s)")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)  # DEBUG disabled, as in the application
+    results = run(args.events)
+    for name, value in results.items():
+        print(f"{name:36s} {value}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"python": sys.version.split()[0], "events": args.events, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""Load-test the fleet aggregator with simulated agents over loopback.
+
+Run from the repository root:
+
+    python bench/fleet.py [--agents 2000] [--interval 5] [--duration 30] [--unix]
+
+The aggregator runs in its own process, exactly as `main.py aggregator`
+would, and thousands of simulated agents connect to it from this process
+over TCP loopback (or a Unix socket with --unix). Each agent sends a
+compact update every --interval seconds with a randomly changing state.
+The report gives the aggregator's CPU use as a percentage of one core, its
+memory, the update rate it sustained and its final fleet summary.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fleet import run_aggregator, request_summary, raise_file_limit, FleetAggregator  # noqa: E402
+
+STATES = (("monitoring", ["download"]), ("monitoring", []), ("monitoring", ["upload"]), ("stopped", []),
+          ("sleeping", []))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def agent(address, host, interval, deadline, sent):
+    """One simulated daemon: connect, then send an update every ``interval`` seconds until ``deadline``."""
+    if address.startswith("/"):
+        reader, writer = await asyncio.open_unix_connection(address)
+    else:
+        host_part, port = address.rsplit(":", 1)
+        reader, writer = await asyncio.open_connection(host_part, int(port))
+    await asyncio.sleep(random.uniform(0, interval))  # Spread the agents over the interval
+    state, keep = random.choice(STATES)
+    while time.monotonic() < deadline:
+        if random.random() < 0.1:
+            state, keep = random.choice(STATES)
+        sleep_at = round(time.time()) + random.randint(0, 600) if state == "monitoring" and not keep else None
+        update = {"state": state, "down": round(random.uniform(0, 50), 1), "up": round(random.uniform(0, 5), 1),
+                  "sleep_at": sleep_at, "keep": keep, "reset": "input", "host": host}
+        writer.write(json.dumps(update, separators=(",", ":")).encode() + b"\n")
+        await writer.drain()
+        sent[0] += 1
+        await asyncio.sleep(interval)
+    writer.close()
+
+
+async def run_agents(address, agents, interval, duration):
+    sent = [0]
+    deadline = time.monotonic() + duration
+    tasks = [asyncio.create_task(agent(address, f"host-{i:05d}", interval, deadline, sent)) for i in range(agents)]
+    await asyncio.sleep(duration)
+    # Agents stay connected until their next update is due, so the summary still sees them
+    summary = await asyncio.to_thread(request_summary, address)
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    failed = [result for result in results if isinstance(result, Exception)]
+    return sent[0], failed, summary
+
+
+def cpu_seconds(pid):
+    """User plus system CPU seconds of a process."""
+    import psutil
+
+    times = psutil.Process(pid).cpu_times()
+    return times.user + times.system
+
+
+def rss_kb(pid):
+    import psutil
+
+    return psutil.Process(pid).memory_info().rss // 1024
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", type=int, default=2000, help="Simulated agents (default: %(default)s)")
+    parser.add_argument("--interval", type=float, default=5, help="Seconds between each agent's updates")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds the agents keep sending")
+    parser.add_argument("--unix", action="store_true", help="Use a Unix socket instead of TCP loopback")
+    args = parser.parse_args(argv)
+
+    limit = raise_file_limit()
+    if limit is not None and limit < args.agents + 100:
+        print(f"Open file limit {limit} is too low for {args.agents} agents")
+        return 1
+    directory = tempfile.mkdtemp(prefix="sleepsentinel-fleet-")
+    address = os.path.join(directory, "fleet.sock") if args.unix else f"127.0.0.1:{free_port()}"
+    log_path = os.path.join(directory, "fleet.jsonl")
+    aggregator = multiprocessing.Process(target=run_aggregator, args=(address, log_path), daemon=True)
+    aggregator.start()
+    for _ in range(100):  # Wait for the listener
+        try:
+            request_summary(address)
+            break
+        except OSError:
+            time.sleep(0.05)
+    cpu_before = cpu_seconds(aggregator.pid)
+    wall_before = time.perf_counter()
+    sent, failed, summary = asyncio.run(run_agents(address, args.agents, args.interval, args.duration))
+    wall = time.perf_counter() - wall_before
+    cpu = cpu_seconds(aggregator.pid) - cpu_before
+    memory = rss_kb(aggregator.pid)
+    aggregator.terminate()
+    aggregator.join()
+    logged = sum(1 for _ in open(log_path)) if os.path.exists(log_path) else 0
+
+    print(f"agents                {args.agents:10d}  ({len(failed)} failed to connect)")
+    print(f"updates sent          {sent:10d}  ({sent / wall:.0f}/s)")
+    print(f"updates logged        {logged:10d}")
+    print(f"aggregator CPU        {cpu / wall * 100:10.1f}  % of one core")
+    print(f"aggregator RSS        {memory:10d}  kB")
+    print(f"summary               {FleetAggregator.format_counts(summary)}")
+    for error in failed[:3]:
+        print(f"  {type(error).__name__}: {error}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""Drive the logind power backend through a monitoring engine against a fake logind.
+
+Run from the repository root:
+
+    python bench/power.py [--cycles 3] [--active 4] [--idle 8]
+
+Starts fakes.FakeLogind on a private socket and points the engine's logind
+backend at it through DBUS_SYSTEM_BUS_ADDRESS, so no systemd, D-Bus daemon
+or root is needed. Fake network counters alternate between a transfer
+above the threshold and silence; the report shows how many samples the
+engine took against how many inhibitor calls reached logind, and the final
+suspend.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fakes import FakeCounters, FakeLogind  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cycles", type=int, default=3, help="Transfer/idle cycles (default: %(default)s)")
+    parser.add_argument("--active", type=float, default=4, help="Seconds of each transfer (default: %(default)s)")
+    parser.add_argument("--idle", type=float, default=8, help="Seconds of silence after each (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    logind = FakeLogind(os.path.join(tempfile.mkdtemp(prefix="sleepsentinel-logind-"), "bus.sock")).start()
+    os.environ["DBUS_SYSTEM_BUS_ADDRESS"] = logind.address
+    from engine import MonitorEngine
+
+    engine = MonitorEngine(3600, idle_backend="none", power_backend="logind", release_hold=1,
+                           max_sample_interval=1)
+    counters = FakeCounters(time.monotonic, ("eth0",))
+    engine.sampler.read_counters = counters
+    engine.run()
+    engine.start()
+    for _ in range(args.cycles):
+        counters.set_rate("eth0", 50.0, 1.0)
+        wait_for(engine, True)
+        time.sleep(args.active)
+        counters.set_rate("eth0", 0.0, 0.0)
+        wait_for(engine, False)
+        time.sleep(args.idle)
+    wakeups = engine.scheduler.stats()["wakeups"]
+    engine.shutdown()
+    engine.power.suspend()
+    time.sleep(0.2)
+    logind.stop()
+
+    holds = [event for event in logind.events if event[1] == "inhibit"]
+    releases = [event for event in logind.events if event[1] == "release"]
+    print(f"scheduler wake-ups    {wakeups:10d}")
+    print(f"inhibitor holds       {len(holds):10d}")
+    print(f"inhibitor releases    {len(releases):10d}")
+    print(f"bus calls             {logind.calls:10d}  (Hello, CanSuspend, Inhibit, Suspend)")
+    print(f"suspend               {'requested' if any(e[1] == 'suspend' for e in logind.events) else 'MISSING'}")
+    for timestamp, event, detail in logind.events:
+        print(f"  {timestamp - logind.events[0][0]:7.2f}s  {event:16s} {detail}")
+    ok = len(holds) == len(releases) == args.cycles
+    return 0 if ok else 1
+
+
+def wait_for(engine, engaged, timeout=30):
+    """Wait until the download rule is ``engaged`` (or released)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if ("download" in engine.status()["keep_awake"]) == engaged:
+            return
+        time.sleep(0.05)
+    raise TimeoutError(f"download rule never {'engaged' if engaged else 'released'}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""Startup benchmark: import time, wall time and peak RSS of cold launches.
+
+Run from the repository root:
+
+    python bench/startup.py [--runs 10] [--output startup.json] [--budget bench/startup_budget.json]
+
+Each measurement runs in a fresh interpreter. Import times come from
+``python -X importtime``; wall time and peak RSS come from the child's
+rusage. The script exits non-zero when a median exceeds its budget, so it
+can gate CI and be tracked over time.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BUDGET = os.path.join(ROOT, "bench", "startup_budget.json")
+
+# Modules that must not be loaded just by importing main (the launcher path)
+FORBIDDEN_AT_IMPORT = ("tkinter", "ttkbootstrap", "PIL", "pynput", "psutil", "ctypes")
+
+
+def import_time_ms(modules):
+    """Cumulative import time of ``modules``, excluding interpreter startup (site etc.)."""
+    statement = "import " + ", ".join(modules)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Children are indented; modules already pulled in by an earlier name are not repeated
+        if name.strip() in modules and not name.startswith("  "):
+            total_us += int(cumulative)
+    return total_us / 1000
+
+
+def launch(args):
+    """Run ``python main.py *args`` and return (wall ms, peak RSS KB or None)."""
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, "main.py"), *args], cwd=ROOT,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if hasattr(os, "wait4"):
+        _, _, rusage = os.wait4(proc.pid, 0)
+        proc.returncode = 0  # Reaped by wait4; keep Popen from waiting again
+        wall_ms = (time.perf_counter() - start) * 1000
+        rss_kb = rusage.ru_maxrss // 1024 if sys.platform == "darwin" else rusage.ru_maxrss
+        return wall_ms, rss_kb
+    proc.wait()
+    return (time.perf_counter() - start) * 1000, None
+
+
+def loaded_at_import():
+    """Names from FORBIDDEN_AT_IMPORT that `import main` pulls in."""
+    statement = ("import sys, main; print(','.join(m for m in %r if m in sys.modules))"
+                 % (FORBIDDEN_AT_IMPORT,))
+    result = subprocess.run([sys.executable, "-c", statement], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    return [name for name in result.stdout.strip().split(",") if name]
+
+
+def measure(runs):
+    """Collect the median of each metric over ``runs`` cold starts."""
+    samples = {}
+
+    def add(name, value):
+        if value is not None:
+            samples.setdefault(name, []).append(value)
+
+    missing_socket = os.path.join(ROOT, "bench", ".no-such-daemon.sock")
+    for _ in range(runs):
+        add("import_main_ms", import_time_ms(("main",)))
+        add("import_daemon_ms", import_time_ms(("main", "engine", "control", "psutil")))
+        wall_ms, rss_kb = launch(["--help"])
+        add("help_wall_ms", wall_ms)
+        add("help_rss_kb", rss_kb)
+        wall_ms, rss_kb = launch(["--socket", missing_socket, "ctl", "status"])
+        add("ctl_wall_ms", wall_ms)
+        add("ctl_rss_kb", rss_kb)
+    return {name: round(statistics.median(values), 2) for name, values in samples.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10, help="Cold starts per metric (default: %(default)s)")
+    parser.add_argument("--budget", default=DEFAULT_BUDGET, help="Budget JSON file (default: %(default)s)")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    with open(args.budget) as f:
+        budget = json.load(f)
+    results = measure(args.runs)
+    leaked = loaded_at_import()
+
+    failures = [name for name, limit in budget.items() if name in results and results[name] > limit]
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "runs": args.runs,
+        "results": results,
+        "budget": budget,
+        "loaded_at_import": leaked,
+        "over_budget": failures,
+    }
+    for name, value in results.items():
+        limit = budget.get(name)
+        flag = "OVER" if name in failures else "ok"
+        print(f"{name:20s} {value:10.2f}   budget {limit if limit is not None else '-':>8}   {flag}")
+    if leaked:
+        print(f"Heavy modules loaded by `import main`: {', '.join(leaked)}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if failures or leaked else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+"""Hot-path benchmark suite on a virtual clock with fake network and input sources.
+
+Run from the repository root:
+
+    python bench/suite.py [--quick] [--output results.json] [--baseline previous.json]
+
+Needs no NICs, input devices or display. Counters come from fakes.FakeCounters
+and input from fakes.flood_input, and time advances on a VirtualClock wherever
+the code accepts a clock. Only the end-to-end idle measurement runs in real
+time, because it measures how much CPU a real scheduler thread burns while
+nothing happens. The GUI refresh, and the window against the minimized
+indicator, are measured only when a display is available.
+
+Results are written as JSON. With --baseline, any metric that is worse than
+the baseline by more than --tolerance exits non-zero, so regressions between
+versions fail CI.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fakes import FakeCounters, flood_input  # noqa: E402
+from scheduler import VirtualClock  # noqa: E402
+from activity import ActivityRecorder  # noqa: E402
+from decision import DecisionEngine, SleepPolicy, network_rules  # noqa: E402
+from sampler import NetworkSampler, InterfaceFilter  # noqa: E402
+
+REPEAT = 5  # Timed batches per micro-benchmark; the best one is reported
+DEFAULT_TOLERANCE = 0.25  # Fraction a metric may worsen against the baseline before it counts as a regression
+
+
+def timed(fn, repeat):
+    """Best seconds per call of ``fn`` over ``repeat`` batches; fn returns its batch size.
+
+    The minimum is used because other load on the machine only ever adds time.
+    """
+    fn()  # Warm-up: first-call imports, caches and allocator growth
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        calls = fn()
+        samples.append((time.perf_counter() - start) / calls)
+    return min(samples)
+
+
+def sampler_tick(nics, ticks, repeat=REPEAT):
+    """Seconds per NetworkSampler.tick with ``nics`` interfaces, half of them excluded containers."""
+    clock = VirtualClock()
+    names = [f"eth{i}" for i in range(nics // 2)] + [f"veth{i}" for i in range(nics - nics // 2)]
+    counters = FakeCounters(clock, names)
+    for name in names:
+        counters.set_rate(name, 5.0, 1.0)
+    sampler = NetworkSampler(read_counters=counters, clock=clock, interface_filter=InterfaceFilter())
+
+    def batch():
+        for _ in range(ticks):
+            clock.advance(1)
+            sampler.tick()
+        return ticks
+
+    sampler.tick()
+    return timed(batch, repeat)
+
+
+def activity_flood(events, repeat=REPEAT):
+    """Seconds per synthetic mouse-move event through ActivityRecorder."""
+    recorder = ActivityRecorder()
+    return timed(lambda: (flood_input(recorder, events), events)[1], repeat)
+
+
+def decision_eval(evaluations, repeat=REPEAT):
+    """Seconds per SleepPolicy.observe_sample with the default download/upload rules."""
+    clock = VirtualClock()
+    policy = SleepPolicy(DecisionEngine(network_rules(10, 10)), 60, clock())
+
+    def batch():
+        observe = policy.observe_sample
+        for i in range(evaluations):
+            # Alternate around the thresholds so the rules engage and release
+            value = 20.0 if (i // 30) % 2 else 1.0
+            observe(clock.advance(1), {"download": value, "upload": 0.0})
+        return evaluations
+
+    return timed(batch, repeat)
+
+
+def engine_sample(ticks, repeat=REPEAT):
+    """Seconds per MonitorEngine.sample: tick, decision update and adaptive interval."""
+    from engine import MonitorEngine
+
+    clock = VirtualClock(time.monotonic())  # Same origin as the policy's start time
+    counters = FakeCounters(clock, ("eth0", "wlan0"))
+    counters.set_rate("eth0", 2.0, 0.5)
+    engine = MonitorEngine(3600, idle_backend="none", power_backend="none", on_sleep=lambda: None)
+    engine.sampler.read_counters = counters
+    engine.sampler.clock = clock
+    engine.start()
+    engine.scheduler.stop()  # Nothing runs in the background; sample() is called directly
+
+    def batch():
+        for _ in range(ticks):
+            engine.sample(clock.advance(1))
+        return ticks
+
+    try:
+        return timed(batch, repeat)
+    finally:
+        engine.shutdown()
+
+
+def idle_cpu(seconds):
+    """CPU used by a monitoring engine with no traffic and no input, as a percentage of one core."""
+    from engine import MonitorEngine
+
+    engine = MonitorEngine(3600, idle_backend="fake", power_backend="none", on_sleep=lambda: None)
+    engine.sampler.read_counters = FakeCounters(time.monotonic, ("eth0",))
+    engine.run()
+    engine.start()
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    time.sleep(seconds)  # The benchmark thread itself uses no CPU here
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    stats = engine.scheduler.stats()
+    engine.shutdown()
+    return cpu / wall * 100, stats["wakeups"] * 60 / wall
+
+
+def gui_refresh(refreshes):
+    """Seconds and Tk calls per GUI refresh while monitoring, or None without a display."""
+    try:
+        import tkinter as tk
+        import ttkbootstrap as tb
+        from gui import NetworkMonitorGUI
+        from engine import MonitorEngine
+    except ImportError:
+        return None
+    try:
+        root = tb.Window(themename="flatly")
+    except tk.TclError:
+        return None
+    engine = MonitorEngine(3600, idle_backend="none", power_backend="none", on_sleep=lambda: None)
+    engine.sampler.read_counters = FakeCounters(time.monotonic, ("eth0",))
+    app = NetworkMonitorGUI(root, engine)
+    engine.start()
+    try:
+        calls_before = app.tk_calls
+        seconds = timed(lambda: ([app.refresh_now() for _ in range(refreshes)], refreshes)[1], 3)
+        calls = (app.tk_calls - calls_before) / (refreshes * 3)
+        return seconds, calls
+    finally:
+        app.cleanup()
+        root.destroy()
+
+
+def gui_minimized(refreshes, idle_seconds):
+    """The open window against the minimized indicator in one process, or None without a display.
+
+    Returns {metric: value}: widgets, idle CPU of the whole process while
+    monitoring, RSS change on minimizing, the indicator's cost per refresh
+    and the time to rebuild the window. bench/tray.py compares fresh
+    processes instead.
+    """
+    try:
+        import tkinter as tk
+        import psutil
+        import ttkbootstrap as tb
+        from gui import NetworkMonitorGUI
+        from engine import MonitorEngine
+        from tray import count_widgets
+    except ImportError:
+        return None
+    try:
+        root = tb.Window(themename="flatly")
+    except tk.TclError:
+        return None
+    engine = MonitorEngine(3600, idle_backend="none", power_backend="none", on_sleep=lambda: None)
+    engine.sampler.read_counters = FakeCounters(time.monotonic, ("eth0",))
+    engine.run()
+    app = NetworkMonitorGUI(root, engine)
+    engine.start()
+    process = psutil.Process()
+
+    def idle_cpu_percent():
+        root.after(int(idle_seconds * 1000), root.quit)
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        root.mainloop()
+        return (time.process_time() - cpu_start) / (time.perf_counter() - wall_start) * 100
+
+    try:
+        results = {"gui_widgets_open": count_widgets(root), "gui_idle_cpu_open_percent": idle_cpu_percent()}
+        rss_open = process.memory_info().rss
+        app.minimize()
+        root.update()
+        results["gui_widgets_minimized"] = count_widgets(root)
+        results["gui_minimized_rss_change_kb"] = (process.memory_info().rss - rss_open) / 1024
+        results["gui_idle_cpu_minimized_percent"] = idle_cpu_percent()
+        results["gui_indicator_refresh_us"] = timed(
+            lambda: ([app.refresh_now() for _ in range(refreshes)], refreshes)[1], 3) * 1e6
+        started = time.perf_counter()
+        app.restore()
+        root.update()
+        results["gui_rebuild_ms"] = (time.perf_counter() - started) * 1000
+        return results
+    finally:
+        app.cleanup()
+        root.destroy()
+
+
+# Metric name -> (unit, whether lower is better, absolute change always treated as noise)
+METRICS = {
+    "sampler_tick_4nic_us": ("us", True, 0),
+    "sampler_tick_256nic_us": ("us", True, 0),
+    "activity_move_ns": ("ns", True, 0),
+    "activity_events_per_s": ("events/s", False, 0),
+    "decision_eval_us": ("us", True, 0),
+    "engine_sample_us": ("us", True, 0),
+    "idle_cpu_percent": ("%", True, 0.1),
+    "idle_wakeups_per_min": ("1/min", True, 2),
+    "gui_refresh_us": ("us", True, 0),
+    "gui_tk_calls_per_refresh": ("calls", True, 0.5),
+    "gui_widgets_open": ("widgets", True, 0),
+    "gui_widgets_minimized": ("widgets", True, 0),
+    "gui_idle_cpu_open_percent": ("%", True, 0.1),
+    "gui_idle_cpu_minimized_percent": ("%", True, 0.1),
+    "gui_minimized_rss_change_kb": ("KiB", True, 512),
+    "gui_indicator_refresh_us": ("us", True, 0),
+    "gui_rebuild_ms": ("ms", True, 20),
+}
+
+
+def measure(quick=False, idle_seconds=5, repeat=REPEAT):
+    scale = 10 if quick else 1
+    results = {
+        "sampler_tick_4nic_us": sampler_tick(4, 20000 // scale, repeat) * 1e6,
+        "sampler_tick_256nic_us": sampler_tick(256, 2000 // scale, repeat) * 1e6,
+        "decision_eval_us": decision_eval(100000 // scale, repeat) * 1e6,
+        "engine_sample_us": engine_sample(20000 // scale, repeat) * 1e6,
+    }
+    move = activity_flood(1_000_000 // scale, repeat)
+    results["activity_move_ns"] = move * 1e9
+    results["activity_events_per_s"] = 1 / move
+    if quick:
+        idle_seconds /= scale
+    cpu, wakeups = idle_cpu(idle_seconds)
+    results["idle_cpu_percent"] = cpu
+    results["idle_wakeups_per_min"] = wakeups
+    gui = gui_refresh(200 // scale)
+    if gui is not None:
+        results["gui_refresh_us"] = gui[0] * 1e6
+        results["gui_tk_calls_per_refresh"] = gui[1]
+        results.update(gui_minimized(200 // scale, idle_seconds) or {})
+    return {name: round(value, 3) for name, value in results.items()}
+
+
+def regressions(results, baseline, tolerance):
+    """Metrics worse than ``baseline`` by more than ``tolerance`` (a fraction)."""
+    worse = []
+    for name, value in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        _, lower_is_better, noise = METRICS[name]
+        worsening = value - previous if lower_is_better else previous - value
+        if worsening > noise and worsening / abs(previous) > tolerance:
+            worse.append(name)
+    return worse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="Run a tenth of the iterations (for smoke tests)")
+    parser.add_argument("--repeat", type=int, default=REPEAT,
+                        help="Timed batches per micro-benchmark; more resists noise on busy machines (default: %(default)s)")
+    parser.add_argument("--idle-seconds", type=float, default=5,
+                        help="Wall time of the idle CPU measurement (default: %(default)s)")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Results JSON of a previous version to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed worsening against the baseline, as a fraction (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    results = measure(args.quick, args.idle_seconds, args.repeat)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            previous = json.load(f)
+        if previous.get("quick") != args.quick:
+            print("Baseline was measured with a different --quick setting; not comparing.")
+        else:
+            baseline = previous["results"]
+    failures = regressions(results, baseline, args.tolerance)
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": args.quick,
+        "units": {name: METRICS[name][0] for name in results},
+        "results": results,
+        "regressions": failures,
+    }
+    for name, value in results.items():
+        previous = baseline.get(name)
+        flag = "REGRESSED" if name in failures else ""
+        against = f"(baseline {previous:g})" if previous is not None else ""
+        print(f"{name:26s} {value:14.3f} {METRICS[name][0]:9s} {against} {flag}")
+    if "gui_refresh_us" not in results:
+        print("gui_refresh_us             skipped (no display)")
+        print("gui_minimized_*            skipped (no display)")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""Resident cost of the open window against the minimized indicator: RSS, idle CPU and Tk widgets.
+
+Run from the repository root, on a machine with a display (or under xvfb-run):
+
+    python bench/tray.py [--seconds 60] [--settle 5] [--output tray.json]
+
+Each mode runs in a fresh process with an in-process engine that is
+monitoring fake counters, so nothing sleeps:
+
+- window: the full window stays open;
+- minimized: the window is built, then minimized, which destroys its widgets;
+- tray: started with --tray, so the window is never built.
+
+After --settle seconds, each process records its CPU time over --seconds
+and then its RSS and number of live Tk widgets. Without a display the
+benchmark is skipped.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODES = ("window", "minimized", "tray")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=60, help="Measured idle time per mode (default: %(default)s)")
+    parser.add_argument("--settle", type=float, default=5, help="Seconds before measuring (default: %(default)s)")
+    parser.add_argument("--output", help="Save the results as JSON")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        print(json.dumps(measure(args.child, args.settle, args.seconds)))
+        return 0
+
+    results = {}
+    for mode in MODES:
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", mode,
+                                 "--seconds", str(args.seconds), "--settle", str(args.settle)],
+                                capture_output=True, text=True, cwd=ROOT, check=True).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+        if results[mode] is None:
+            print("skipped (no display; try xvfb-run python bench/tray.py)")
+            return 0
+
+    window = results["window"]
+    print(f"{'mode':12s}{'RSS MiB':>10s}{'vs window':>11s}{'CPU %':>9s}{'vs window':>11s}{'widgets':>9s}{'Tk calls/s':>12s}")
+    for mode, result in results.items():
+        print(f"{mode:12s}{result['rss_kb'] / 1024:10.1f}{(result['rss_kb'] - window['rss_kb']) / 1024:+11.1f}"
+              f"{result['cpu_percent']:9.3f}{result['cpu_percent'] - window['cpu_percent']:+11.3f}"
+              f"{result['widgets']:9d}{result['tk_calls_per_s']:12.2f}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+def measure(mode, settle, seconds):
+    """Run the GUI in ``mode`` and return its idle cost, or None without a display."""
+    import tkinter as tk
+    import psutil
+    import ttkbootstrap as tb
+    from engine import MonitorEngine
+    from fakes import FakeCounters
+    from gui import NetworkMonitorGUI
+
+    try:
+        root = tb.Window(themename="flatly")
+    except tk.TclError:
+        return None
+    engine = MonitorEngine(3600, idle_backend="none", power_backend="none", on_sleep=lambda: None)
+    engine.sampler.read_counters = FakeCounters(time.monotonic, ("eth0",))
+    engine.run()
+    engine.start()
+    app = NetworkMonitorGUI(root, engine, minimized=mode == "tray")
+    if mode == "minimized":
+        root.after(int(settle * 500), app.minimize)
+    result = {}
+
+    def begin():
+        result["cpu"], result["wall"], result["calls"] = time.process_time(), time.perf_counter(), app.tk_calls
+        root.after(int(seconds * 1000), finish)
+
+    def finish():
+        wall = time.perf_counter() - result.pop("wall")
+        result["cpu_percent"] = (time.process_time() - result.pop("cpu")) / wall * 100
+        result["tk_calls_per_s"] = (app.tk_calls - result.pop("calls")) / wall
+        result["rss_kb"] = psutil.Process().memory_info().rss // 1024
+        result["widgets"] = count_widgets(root)
+        root.quit()
+
+    root.after(int(settle * 1000), begin)
+    root.mainloop()
+    app.cleanup()
+    root.destroy()
+    return result
+
+
+def count_widgets(widget):
+    return 1 + sum(count_widgets(child) for child in widget.winfo_children())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+import json
+import logging
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+import traceback
+
+# Commands accepted on the control socket
+COMMANDS = ("start", "stop", "status", "profile")
+DEFAULT_TCP_PORT = 47800  # Used where Unix sockets are unavailable (Windows)
+
+
+def default_address():
+    """Return the per-user control socket address for this platform."""
+    if hasattr(socket, "AF_UNIX") and os.name != 'nt':
+        runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+        return os.path.join(runtime_dir, f"sleepsentinel-{os.getuid()}.sock")
+    return f"127.0.0.1:{DEFAULT_TCP_PORT}"
+
+
+def parse_address(address):
+    """Split an address into (family, target): a filesystem path or a host:port pair."""
+    if ":" in address and not address.startswith(("/", ".")) and os.path.sep not in address:
+        host, port = address.rsplit(":", 1)
+        return socket.AF_INET, (host, int(port))
+    return socket.AF_UNIX, address
+
+
+class _ControlHandler(socketserver.StreamRequestHandler):
+    """Serve newline-delimited JSON requests: {"cmd": "status"} -> {"ok": true, ...}."""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            response = self.server.dispatch(line)
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+class _UnixControlServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPControlServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class ControlServer:
+    """Expose a MonitorEngine's start/stop/status over a local socket."""
+
+    def __init__(self, engine, address=None):
+        self.engine = engine
+        self.address = address or default_address()
+        family, target = parse_address(self.address)
+        if family == socket.AF_UNIX:
+            if os.path.exists(target):
+                os.unlink(target)  # Stale socket from a previous run
+            # Created owner-only: a chmod after bind() would let another user connect in between
+            old_umask = os.umask(0o177)
+            try:
+                self.server = _UnixControlServer(target, _ControlHandler)
+            finally:
+                os.umask(old_umask)
+        else:
+            self.server = _TCPControlServer(target, _ControlHandler)
+        self.server.dispatch = self.dispatch
+        self._thread = None
+
+    def dispatch(self, line):
+        """Decode one request line and run it against the engine."""
+        try:
+            request = json.loads(line)
+            cmd = request.get("cmd")
+            if cmd not in COMMANDS:
+                return {"ok": False, "error": f"Unknown command: {cmd}"}
+            if cmd == "start":
+                self.engine.start(request.get("inactivity_limit"),
+                                  request.get("download_threshold"),
+                                  request.get("upload_threshold"),
+                                  request.get("include_interfaces"),
+                                  request.get("exclude_interfaces"))
+                logging.info("Monitoring started via control socket")
+            elif cmd == "stop":
+                self.engine.stop()
+                logging.info("Monitoring stopped via control socket")
+            elif cmd == "profile":
+                return {"ok": True, "profile": self.engine.profile(request.get("action", "status"),
+                                                                  request.get("stacks", False), request.get("path"))}
+            return {"ok": True, "status": self.engine.status()}
+        except ValueError as e:
+            return {"ok": False, "error": f"Invalid request: {e}"}
+        except Exception as e:
+            logging.error(f"Error handling control request: {e}")
+            logging.error(traceback.format_exc())
+            return {"ok": False, "error": str(e)}
+
+    def start(self):
+        """Serve requests on a background thread."""
+        logging.info(f"Control socket listening on {self.address}")
+        self._thread = threading.Thread(target=self.server.serve_forever, name="control", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stop serving and remove the socket file."""
+        self.server.shutdown()
+        self.server.server_close()
+        family, target = parse_address(self.address)
+        if family == socket.AF_UNIX and os.path.exists(target):
+            os.unlink(target)
+        logging.info("Control socket closed")
+
+
+class ControlClient:
+    """Talk to a running engine over its control socket; mirrors MonitorEngine's API."""
+
+    def __init__(self, address=None, timeout=2.0):
+        self.address = address or default_address()
+        self.timeout = timeout
+        self._sock = None
+        self._file = None
+
+    def _connect(self):
+        family, target = parse_address(self.address)
+        self._sock = socket.socket(family, socket.SOCK_STREAM)
+        self._sock.settimeout(self.timeout)
+        self._sock.connect(target)
+        self._file = self._sock.makefile("rwb")
+
+    def request(self, cmd, **params):
+        """Send one command and return the decoded response, reconnecting once if needed."""
+        payload = json.dumps(dict(params, cmd=cmd)).encode() + b"\n"
+        for attempt in range(2):
+            try:
+                if self._sock is None:
+                    self._connect()
+                self._file.write(payload)
+                self._file.flush()
+                line = self._file.readline()
+                if not line:
+                    raise ConnectionError("Control socket closed the connection")
+                response = json.loads(line)
+                if not response.get("ok"):
+                    raise ValueError(response.get("error", "Request failed"))
+                return response
+            except (OSError, ConnectionError):
+                self.close()
+                if attempt:
+                    raise
+
+    def start(self, inactivity_limit=None, download_threshold=None, upload_threshold=None,
+              include_interfaces=None, exclude_interfaces=None):
+        params = {k: v for k, v in (("inactivity_limit", inactivity_limit),
+                                    ("download_threshold", download_threshold),
+                                    ("upload_threshold", upload_threshold),
+                                    ("include_interfaces", include_interfaces),
+                                    ("exclude_interfaces", exclude_interfaces)) if v is not None}
+        return self.request("start", **params)["status"]
+
+    def stop(self):
+        return self.request("stop")["status"]
+
+    def status(self):
+        return self.request("status")["status"]
+
+    def profile(self, action="status", stacks=False, path=None):
+        params = {"action": action, "stacks": stacks}
+        if path is not None:
+            params["path"] = path
+        return self.request("profile", **params)["profile"]
+
+    def close(self):
+        """Drop the connection; the engine on the other end keeps running."""
+        try:
+            if self._file is not None:
+                self._file.close()
+            if self._sock is not None:
+                self._sock.close()
+        finally:
+            self._sock = None
+            self._file = None
+
+    shutdown = close  # A GUI attached over the socket must not stop the daemon
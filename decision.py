@@ -0,0 +1,187 @@
+import logging
+from collections import deque
+
+DEFAULT_DECISION_WINDOW = 5  # Seconds of samples averaged before comparing against a threshold
+DEFAULT_RELEASE_RATIO = 0.5  # Release threshold as a fraction of the engage threshold
+DEFAULT_ENGAGE_HOLD = 0  # Seconds the mean must stay above engage before a rule engages
+DEFAULT_RELEASE_HOLD = 10  # Seconds the mean must stay below release before a rule releases
+
+
+class WindowedMean:
+    """Mean of the samples from the last ``window`` seconds, updated in O(1) amortized time."""
+
+    def __init__(self, window):
+        if window <= 0:
+            raise ValueError("Window must be positive.")
+        self.window = window
+        self._samples = deque()
+        self._sum = 0.0
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add(self, timestamp, value):
+        """Add a sample and return the updated mean."""
+        samples = self._samples
+        samples.append((timestamp, value))
+        self._sum += value
+        cutoff = timestamp - self.window
+        while samples[0][0] <= cutoff:
+            self._sum -= samples.popleft()[1]
+        return self.mean
+
+    @property
+    def mean(self):
+        # max() guards against float drift taking an all-zero window slightly negative
+        return max(0.0, self._sum / len(self._samples)) if self._samples else 0.0
+
+
+class HysteresisRule:
+    """Keep-awake rule over one signal, with separate engage and release thresholds.
+
+    The rule engages once the windowed mean has been at or above ``engage``
+    for ``engage_hold`` seconds, and releases only after it has stayed below
+    ``release`` for ``release_hold`` seconds. A lone spike is diluted by the
+    window; a short stall in a long transfer is bridged by the release hold.
+    """
+
+    def __init__(self, name, source, engage, release=None, window=DEFAULT_DECISION_WINDOW,
+                 engage_hold=DEFAULT_ENGAGE_HOLD, release_hold=DEFAULT_RELEASE_HOLD):
+        release = engage * DEFAULT_RELEASE_RATIO if release is None else release
+        if engage < 0 or release < 0 or release > engage:
+            raise ValueError("Thresholds must satisfy 0 <= release <= engage.")
+        if engage_hold < 0 or release_hold < 0:
+            raise ValueError("Hold times must not be negative.")
+        self.name = name
+        self.source = source
+        self.engage = engage
+        self.release = release
+        self.engage_hold = engage_hold
+        self.release_hold = release_hold
+        self.mean = WindowedMean(window)
+        self.engaged = False
+        self._pending_since = None  # When the mean first crossed towards the other state
+
+    def update(self, timestamp, value):
+        """Feed one sample; returns True when the engaged state changed."""
+        mean = self.mean.add(timestamp, value)
+        if self.engaged:
+            crossing, hold = mean < self.release, self.release_hold
+        else:
+            crossing, hold = mean >= self.engage, self.engage_hold
+        if not crossing:
+            self._pending_since = None
+            return False
+        if self._pending_since is None:
+            self._pending_since = timestamp
+        if timestamp - self._pending_since < hold:
+            return False
+        self.engaged = not self.engaged
+        self._pending_since = None
+        return True
+
+    def closeness(self):
+        """How near the mean is to flipping this rule: 0 (far) to 1 (at the threshold)."""
+        mean = self.mean.mean
+        if self.engaged:
+            ratio = self.release / mean if mean > 0 else 1.0
+        else:
+            ratio = mean / self.engage if self.engage > 0 else 1.0
+        return min(1.0, ratio)
+
+    def describe(self):
+        return (f"{self.name} mean {self.mean.mean:.2f} "
+                f"({'engaged' if self.engaged else 'released'}, engage >= {self.engage:g}, release < {self.release:g})")
+
+
+class DecisionEngine:
+    """Evaluate keep-awake rules against each new sample."""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+
+    def update(self, timestamp, values):
+        """Feed {source: value} for one sample; returns the rules whose state changed."""
+        changed = []
+        for rule in self.rules:
+            value = values.get(rule.source)
+            if value is not None and rule.update(timestamp, value):
+                changed.append(rule)
+        return changed
+
+    def closeness(self, sources=None):
+        """The closeness of the rule nearest to changing state (0 to 1), optionally only over ``sources``."""
+        return max((rule.closeness() for rule in self.rules if sources is None or rule.source in sources),
+                   default=0.0)
+
+    def engaged(self):
+        """Rules currently keeping the system awake."""
+        return [rule for rule in self.rules if rule.engaged]
+
+
+def network_rules(download_threshold, upload_threshold, window=DEFAULT_DECISION_WINDOW,
+                  release_ratio=DEFAULT_RELEASE_RATIO, engage_hold=DEFAULT_ENGAGE_HOLD,
+                  release_hold=DEFAULT_RELEASE_HOLD):
+    """The download/upload rules built from the user's thresholds (in Mbps)."""
+    return [
+        HysteresisRule("download", "download", download_threshold, download_threshold * release_ratio,
+                       window, engage_hold, release_hold),
+        HysteresisRule("upload", "upload", upload_threshold, upload_threshold * release_ratio,
+                       window, engage_hold, release_hold),
+    ]
+
+
+def reset_cause(rule):
+    """The timer reset cause reported for ``rule``: "network", or the signal it watches ("cpu", "traffic", ...)."""
+    if rule.source in ("download", "upload"):
+        return "network"
+    return rule.source.partition(":")[0]
+
+
+class SleepPolicy:
+    """Combine keep-awake rules with the inactivity timer.
+
+    Times are monotonic seconds. The timer restarts on user activity and is
+    held at zero while any rule is engaged; sleep is due once no rule is
+    engaged and the timer has run for ``inactivity_limit`` seconds.
+    """
+
+    def __init__(self, decision_engine, inactivity_limit, now, on_reset=None):
+        self.decision_engine = decision_engine
+        self.inactivity_limit = inactivity_limit
+        self.last_activity = now
+        self.last_reason = "start"
+        self.on_reset = on_reset  # Called with the cause of every timer reset
+
+    def observe_sample(self, timestamp, values):
+        """Feed one sample to the rules; returns the rules whose state changed."""
+        changed = self.decision_engine.update(timestamp, values)
+        for rule in changed:
+            logging.info(f"Keep-awake rule {'engaged' if rule.engaged else 'released'}: {rule.describe()}")
+        responsible = changed or self.decision_engine.engaged()
+        if responsible:
+            # Released rules count as activity up to the moment they released
+            self.reset(timestamp, reset_cause(responsible[0]))
+        return changed
+
+    def observe_activity(self, timestamp, reason="input"):
+        """Record activity at ``timestamp`` unless a later reset is already known."""
+        if timestamp > self.last_activity:
+            self.reset(timestamp, reason)
+
+    def reset(self, timestamp, reason):
+        self.last_activity = max(self.last_activity, timestamp)
+        self.last_reason = reason
+        if self.on_reset is not None:
+            self.on_reset(reason)
+
+    def time_remaining(self, now, last_activity=None):
+        """Seconds until sleep; ``last_activity`` is input not observed yet, counted without recording it."""
+        if self.decision_engine.engaged():
+            return self.inactivity_limit
+        if last_activity is None or last_activity < self.last_activity:
+            last_activity = self.last_activity
+        return max(0.0, self.inactivity_limit - (now - last_activity))
+
+    def should_sleep(self, now):
+        return not self.decision_engine.engaged() and now - self.last_activity >= self.inactivity_limit
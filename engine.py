@@ -0,0 +1,499 @@
+import time
+import threading
+import traceback
+import logging
+import os
+from datetime import datetime
+from activity import DEFAULT_ACTIVITY_QUANTUM
+from idle import NullIdleBackend, IdleBackendUnavailable, start_idle_backend
+from decision import (DecisionEngine, SleepPolicy, network_rules, DEFAULT_DECISION_WINDOW,
+                      DEFAULT_RELEASE_RATIO, DEFAULT_ENGAGE_HOLD, DEFAULT_RELEASE_HOLD)
+from history import STATS_WINDOW
+from logs import stop_logging
+from metrics import Metrics
+from power import NullPowerBackend, start_power_backend
+from profiling import PROFILER
+from scheduler import Scheduler
+from signals import build_signals
+from sampler import (NetworkSampler, InterfaceFilter, AdaptiveInterval, CHECK_INTERVAL,
+                     DEFAULT_EXCLUDE_INTERFACES, DEFAULT_MAX_SAMPLE_INTERVAL, DEFAULT_EXPIRY_ACCURACY)
+
+# Constants
+NETWORK_SOURCES = ("download", "upload")  # Rule sources fed by the network sampler
+DEFAULT_SPEED_THRESHOLD = 10  # Default threshold in Mbps
+DEFAULT_INACTIVITY_LIMIT = 60  # Default inactivity time in seconds (1 minutes)
+SLEEP_GRACE_PERIOD = 2  # Seconds between announcing sleep and suspending, so clients can show it
+MIN_CHECK_INTERVAL = 0.5  # Never re-check the inactivity timer more often than this (in seconds)
+
+
+def force_system_sleep(power):
+    """Force the system to go to sleep through the power backend; returns False when it could not."""
+    logging.info("Forcing system to sleep.")
+
+    try:
+        if power.suspend():
+            return True
+    except Exception as e:
+        logging.error(f"Error forcing sleep: {e}")
+        logging.error(traceback.format_exc())
+    return False
+
+
+def exit_application():
+    """Stop the application after the system was put to sleep."""
+    logging.info("Application is stopping.")
+    stop_logging()  # os._exit skips atexit, so write out queued records first
+    os._exit(0)  # Forcefully exit the application
+
+
+class MonitorEngine:
+    """Sampler, activity tracker and decision loop, independent of any GUI.
+
+    Clients (the Tk window, the control socket) drive it through ``start``,
+    ``stop`` and ``status``; all of them are safe to call from any thread.
+    All periodic work (sampling, the inactivity check, the sleep countdown)
+    runs as tasks on one Scheduler thread.
+    """
+
+    def __init__(self, inactivity_limit=DEFAULT_INACTIVITY_LIMIT,
+                 download_threshold=DEFAULT_SPEED_THRESHOLD,
+                 upload_threshold=DEFAULT_SPEED_THRESHOLD,
+                 include_interfaces=(), exclude_interfaces=DEFAULT_EXCLUDE_INTERFACES,
+                 idle_backend="auto", burst_interval=None, decision_window=DEFAULT_DECISION_WINDOW,
+                 release_ratio=DEFAULT_RELEASE_RATIO, engage_hold=DEFAULT_ENGAGE_HOLD,
+                 release_hold=DEFAULT_RELEASE_HOLD, activity_quantum=DEFAULT_ACTIVITY_QUANTUM,
+                 max_sample_interval=DEFAULT_MAX_SAMPLE_INTERVAL, expiry_accuracy=DEFAULT_EXPIRY_ACCURACY,
+                 cpu_threshold=None, disk_threshold=None, keep_awake_processes=(), process_traffic=(),
+                 power_backend="auto", trace_path=None, on_sleep=None):
+        self.inactivity_limit = inactivity_limit
+        self.download_threshold = download_threshold
+        self.upload_threshold = upload_threshold
+        self.include_interfaces = tuple(include_interfaces)
+        self.exclude_interfaces = tuple(exclude_interfaces)
+        self.decision_window = decision_window
+        self.release_ratio = release_ratio
+        self.engage_hold = engage_hold
+        self.release_hold = release_hold
+        self.burst_interval = burst_interval
+        self.idle_backend = idle_backend
+        self.activity_quantum = activity_quantum
+        self.cpu_threshold = cpu_threshold
+        self.disk_threshold = disk_threshold
+        self.keep_awake_processes = tuple(keep_awake_processes)
+        self.process_traffic = tuple((pattern, threshold) for pattern, threshold in process_traffic)
+        self.signals = []  # ActivitySignals of the current monitoring session
+        self._signals_key = None  # Settings the signals were built from; they are reused while these hold
+        self._signal_sources = {}  # {signal name: rule sources it feeds}, to pace it by their closeness
+        self.power_backend = power_backend
+        self.power = NullPowerBackend()  # Replaced by the configured backend in run()
+        self.on_sleep = on_sleep or (lambda: force_system_sleep(self.power))  # Returns False when sleep failed
+        self._exit_after_sleep = on_sleep is None
+        self.stop_event = threading.Event()  # Set once the engine has shut down
+        self.lock = threading.Lock()  # Guards monitoring state and settings
+        self._power_lock = threading.Lock()  # Orders reading the engaged rules with applying them to the backend
+        self.scheduler = Scheduler()
+        self.metrics = Metrics()
+        self.sampler = NetworkSampler(CHECK_INTERVAL, burst_interval,
+                                      InterfaceFilter(self.include_interfaces, self.exclude_interfaces))
+        self.sampler.on_sample = self.on_sample
+        self.trace = None  # TraceWriter recording counters, input and decisions
+        if trace_path:
+            from tracefile import TraceWriter
+            self.trace = TraceWriter(trace_path)
+            self.sampler.on_counters = self.trace.counters
+        self.adaptive = AdaptiveInterval(self.sampler.tick_interval, max_sample_interval, expiry_accuracy)
+        self.sample_interval = None  # Current adaptive sampling interval while monitoring
+        self._logged_interval = None  # Last interval written to the log
+        self.activity = NullIdleBackend()  # Replaced by the configured backend in run()
+        self.policy = None  # SleepPolicy for the current monitoring session
+        self.monitoring_active = False  # Flag to control monitoring
+        self.sleep_pending = False
+        self.sleep_error = None  # Why the last sleep failed, until monitoring starts again
+        self._sample_task = None
+        self._check_task = None
+        self._signal_tasks = []
+        self._backend_started = False
+        self._scheduler_thread = None
+
+    def _start_backend(self):
+        if self._backend_started:
+            return
+        self._backend_started = True
+        try:
+            self.activity = start_idle_backend(self.idle_backend, self.activity_quantum,
+                                               self.metrics.activity_seconds)
+        except (IdleBackendUnavailable, ValueError) as e:
+            logging.error(f"No user idle source, continuing with network activity only: {e}")
+        try:
+            self.power = start_power_backend(self.power_backend)
+        except ValueError as e:
+            logging.error(f"Continuing without a power backend: {e}")
+        logging.info(f"Engine running - Inactivity limit: {self.inactivity_limit}s, Download threshold: {self.download_threshold} Mbps, Upload threshold: {self.upload_threshold} Mbps")
+
+    def run(self):
+        """Start the engine on a background scheduler thread (for the GUI)."""
+        self._start_backend()
+        if self._scheduler_thread is None:
+            self._scheduler_thread = threading.Thread(target=self.scheduler.run, name="scheduler", daemon=True)
+            self._scheduler_thread.start()
+
+    def run_forever(self):
+        """Run the engine on the calling thread until ``shutdown`` (for the daemon)."""
+        self._start_backend()
+        self.scheduler.run()
+
+    def configure(self, inactivity_limit=None, download_threshold=None, upload_threshold=None,
+                  include_interfaces=None, exclude_interfaces=None):
+        """Validate and apply new settings; raises ValueError on bad values."""
+        inactivity_limit = self.inactivity_limit if inactivity_limit is None else int(inactivity_limit)
+        download_threshold = self.download_threshold if download_threshold is None else float(download_threshold)
+        upload_threshold = self.upload_threshold if upload_threshold is None else float(upload_threshold)
+        if inactivity_limit <= 0 or download_threshold < 0 or upload_threshold < 0:
+            raise ValueError("Values must be positive.")
+        if (self.decision_window <= 0 or not 0 <= self.release_ratio <= 1
+                or self.engage_hold < 0 or self.release_hold < 0):
+            raise ValueError("Decision window must be positive, release ratio between 0 and 1, and hold times not negative.")
+        if (self.cpu_threshold is not None and not 0 < self.cpu_threshold <= 100) or \
+                (self.disk_threshold is not None and self.disk_threshold <= 0) or \
+                any(threshold <= 0 for _, threshold in self.process_traffic):
+            raise ValueError("CPU threshold must be between 0 and 100 percent and disk and traffic thresholds positive.")
+        with self.lock:
+            self.inactivity_limit = inactivity_limit
+            self.download_threshold = download_threshold
+            self.upload_threshold = upload_threshold
+            if include_interfaces is None and exclude_interfaces is None:
+                return
+            if include_interfaces is not None:
+                self.include_interfaces = tuple(include_interfaces)
+            if exclude_interfaces is not None:
+                self.exclude_interfaces = tuple(exclude_interfaces)
+            interface_filter = InterfaceFilter(self.include_interfaces, self.exclude_interfaces)
+        self.sampler.set_filter(interface_filter)
+        logging.info(f"Interface filter - Include: {list(interface_filter.include) or 'all'}, Exclude: {list(interface_filter.exclude)}")
+
+    def start(self, inactivity_limit=None, download_threshold=None, upload_threshold=None,
+              include_interfaces=None, exclude_interfaces=None):
+        """Begin monitoring, optionally with new settings."""
+        self.configure(inactivity_limit, download_threshold, upload_threshold,
+                       include_interfaces, exclude_interfaces)
+        self._start_backend()
+        with self.lock:
+            if self.monitoring_active:
+                return
+            now = time.monotonic()
+            rules = network_rules(self.download_threshold, self.upload_threshold, self.decision_window,
+                                  self.release_ratio, self.engage_hold, self.release_hold)
+            signals_key = (self.cpu_threshold, self.disk_threshold, self.keep_awake_processes, self.process_traffic)
+            if signals_key != self._signals_key:
+                self.signals = build_signals(*signals_key)
+                self._signals_key = signals_key
+            self._signal_sources = {}
+            for signal in self.signals:
+                signal_rules = signal.rules(self.decision_window, self.release_ratio, self.engage_hold,
+                                            self.release_hold)
+                self._signal_sources[signal.name] = [rule.source for rule in signal_rules]
+                rules += signal_rules
+            self.policy = SleepPolicy(DecisionEngine(rules), self.inactivity_limit, now, self.metrics.count_reset)
+            if self.trace is not None:
+                self.trace.settings(now, self.settings())
+            self.monitoring_active = True
+            self.sleep_pending = False
+            self.sleep_error = None
+            # Only sample while monitoring: a stopped engine schedules nothing and never wakes
+            self._reset_baselines()
+            self.sample_interval = self._logged_interval = self.sampler.tick_interval
+            self._sample_task = self.scheduler.call_at(now, self.sample, "sample")
+            self._check_task = self.scheduler.call_at(now + self.inactivity_limit, self.check_inactivity, "check")
+            self._signal_tasks = [self.scheduler.call_at(now, lambda now, signal=signal: self.sample_signal(signal, now),
+                                                         signal.name) for signal in self.signals]
+        logging.info(f"Starting monitoring with settings - Inactivity: {self.inactivity_limit}s, "
+                     f"Download threshold: {self.download_threshold} Mbps, "
+                     f"Upload threshold: {self.upload_threshold} Mbps, "
+                     f"Window: {self.decision_window}s, Release ratio: {self.release_ratio}, "
+                     f"Hold: {self.engage_hold}s engage / {self.release_hold}s release, "
+                     f"Sampling: every {self.adaptive.min_interval:g}-{self.adaptive.max_interval:g}s, "
+                     f"expiry accuracy {self.adaptive.expiry_accuracy:g}s")
+        for signal in self.signals:
+            logging.info(f"Activity signal {signal.name} - Threshold: {signal.threshold}, every {signal.interval:g}s")
+        logging.info(f"Reset activity timer to {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+    def _reset_baselines(self):
+        """Make the sampler and every signal start from a fresh reading, so a pause is not read as a burst."""
+        self.sampler.reset()
+        for signal in self.signals:
+            signal.reset()
+
+    def settings(self):
+        """The settings that decide when to sleep, as a plain dict."""
+        return {
+            "inactivity_limit": self.inactivity_limit,
+            "download_threshold": self.download_threshold,
+            "upload_threshold": self.upload_threshold,
+            "include_interfaces": list(self.include_interfaces),
+            "exclude_interfaces": list(self.exclude_interfaces),
+            "burst_interval": self.burst_interval,
+            "decision_window": self.decision_window,
+            "release_ratio": self.release_ratio,
+            "engage_hold": self.engage_hold,
+            "release_hold": self.release_hold,
+            "cpu_threshold": self.cpu_threshold,
+            "disk_threshold": self.disk_threshold,
+            "keep_awake_processes": list(self.keep_awake_processes),
+            "process_traffic": [list(rule) for rule in self.process_traffic],
+        }
+
+    def stop(self):
+        """Stop monitoring; the engine stays ready to start again."""
+        with self.lock:
+            if not self.monitoring_active:
+                return
+            self._stop_monitoring()
+            if self.trace is not None:
+                self.trace.stop(time.monotonic())
+        self.release_power()
+        logging.info("Monitoring stopped")
+
+    def _stop_monitoring(self):
+        """Cancel the monitoring tasks; the caller holds the lock."""
+        self.monitoring_active = False
+        self.sleep_pending = False
+        self.sample_interval = None
+        for task in (self._sample_task, self._check_task, *self._signal_tasks):
+            if task is not None:
+                task.cancel()
+        self._sample_task = self._check_task = None
+        self._signal_tasks = []
+
+    def status(self):
+        """Return a consistent snapshot of the engine state as a plain dict; changes nothing, so polling is safe."""
+        download_speed, upload_speed = self.sampler.speeds()
+        peak_download, peak_upload = self.sampler.peaks()
+        interfaces = self.sampler.interfaces()
+        history = self.sampler.history.stats(STATS_WINDOW)
+        last_activity = self.activity.last_activity()
+        now = time.monotonic()
+        with self.lock:
+            monitoring_active = self.monitoring_active
+            policy = self.policy
+            # Every configured rule, engaged or not; the network ones exist before the first start too
+            rules = [rule.name for rule in policy.decision_engine.rules] if policy is not None else ["download", "upload"]
+            if monitoring_active:
+                time_remaining = policy.time_remaining(now, last_activity)
+                keep_awake = [rule.name for rule in policy.decision_engine.engaged()]
+                last_reset = policy.last_reason
+            else:
+                time_remaining = last_reset = None
+                keep_awake = []
+            if self.sleep_pending:
+                state = "sleeping"
+            elif monitoring_active:
+                state = "monitoring"
+            elif self.sleep_error:
+                state = "sleep failed"
+            else:
+                state = "stopped"
+            return {
+                "state": state,
+                "monitoring": monitoring_active,
+                "download_speed": download_speed,
+                "upload_speed": upload_speed,
+                "peak_download": peak_download,
+                "peak_upload": peak_upload,
+                "time_remaining": time_remaining,
+                "keep_awake": keep_awake,
+                "rules": rules,
+                "last_reset": last_reset,
+                "sleep_error": self.sleep_error,
+                "sample_interval": self.sample_interval,
+                "signals": {signal.name: signal.status() for signal in self.signals},
+                "activity": self.activity.counters(),
+                "power": self.power.counters(),
+                "profiling": PROFILER.enabled,
+                "inactivity_limit": self.inactivity_limit,
+                "download_threshold": self.download_threshold,
+                "upload_threshold": self.upload_threshold,
+                "include_interfaces": list(self.include_interfaces),
+                "exclude_interfaces": list(self.exclude_interfaces),
+                "interfaces": interfaces,
+                "stats_window": STATS_WINDOW,
+                "stats": history,
+                "scheduler": self.scheduler.stats(),
+                "threads": threading.active_count(),
+            }
+
+    def profile(self, action="status", stacks=False, path=None):
+        """Start or stop the process-wide profiler, or report on it; see profiling.Profiler."""
+        if action == "start":
+            return PROFILER.start(stacks, path)
+        if action == "stop":
+            return PROFILER.stop()
+        if action == "status":
+            return PROFILER.status()
+        raise ValueError(f"Unknown profile action: {action}")
+
+    def sample(self, now):
+        """Scheduled sampler tick; returns the next tick time chosen by AdaptiveInterval."""
+        started = time.perf_counter()
+        try:
+            self.sampler.tick()
+        except Exception as e:
+            # A failed read must not end sampling
+            logging.error(f"Error sampling network counters: {e}")
+            logging.error(traceback.format_exc())
+        # A trace needs input at sample resolution, not only at the expiry checks
+        last_activity = self.activity.last_activity() if self.trace is not None else None
+        with self.lock:
+            if not self.monitoring_active:
+                return None
+            if last_activity is not None:
+                self._observe_activity(now, last_activity)
+            # Other signals are read on their own schedule; only the network rules pace network sampling
+            closeness = self.policy.decision_engine.closeness(NETWORK_SOURCES)
+            time_remaining = self.policy.time_remaining(now)
+            interval = self.adaptive.next_interval(closeness, time_remaining)
+            self.sample_interval = interval
+            self.metrics.sample_seconds.observe(time.perf_counter() - started)
+            PROFILER.end("sample", started)
+            # Log only changes of 2x or more, not every step of the countdown
+            changed = not self._logged_interval / 2 < interval < self._logged_interval * 2
+            if changed:
+                self._logged_interval = interval
+        if changed:
+            logging.info(f"Sampling every {interval:.2f}s - Closest threshold at {closeness:.0%}, {time_remaining:.0f}s to expiry")
+        return now + interval
+
+    def on_sample(self, timestamp, download_speed, upload_speed, interface_speeds):
+        """Feed each sampler tick to the decision rules."""
+        with self.lock:
+            if self.monitoring_active:
+                started = PROFILER.begin()
+                changed = self.policy.observe_sample(timestamp, {"download": download_speed, "upload": upload_speed})
+                PROFILER.end("decision", started)
+                self._rules_changed(timestamp, changed)
+
+    def sample_signal(self, signal, now):
+        """Scheduled read of one activity signal; returns the next read time.
+
+        Like network sampling, a signal backs off while its rules are far from
+        flipping and speeds up near them or near expiry, but is never read more
+        often than its cost allows.
+        """
+        started = PROFILER.begin()
+        try:
+            values = signal.sample(now)
+        except Exception as e:
+            logging.error(f"Error reading activity signal {signal.name}: {e}")
+            logging.error(traceback.format_exc())
+            values = None
+        with self.lock:
+            if not self.monitoring_active:
+                return None
+            if started is not None:
+                PROFILER.end(f"signal:{signal.name}", started)
+            if values:
+                started = PROFILER.begin()
+                changed = self.policy.observe_sample(now, values)
+                PROFILER.end("decision", started)
+                if self.trace is not None:
+                    for source, value in values.items():
+                        self.trace.signal(now, source, value)
+                self._rules_changed(now, changed)
+                closeness = self.policy.decision_engine.closeness(self._signal_sources.get(signal.name, ()))
+                period = max(signal.interval, self.adaptive.next_interval(closeness, self.policy.time_remaining(now)))
+            else:
+                period = signal.interval  # Only a baseline so far; get a first value soon
+            signal.period = period
+        return now + period
+
+    def _rules_changed(self, timestamp, changed):
+        """Trace rule transitions and have the power backend follow them; the caller holds the lock."""
+        if not changed:
+            return
+        if self.trace is not None:
+            for rule in changed:
+                self.trace.rule(timestamp, rule)
+        # The inhibitor is changed on the scheduler thread, outside the lock, since it may wait on the OS
+        self.scheduler.call_at(timestamp, self.update_power, "power")
+
+    def update_power(self, now):
+        """Hold the power backend's inhibitor exactly while a keep-awake rule is engaged."""
+        with self._power_lock:
+            with self.lock:
+                engaged = [rule.name for rule in self.policy.decision_engine.engaged()] if self.monitoring_active else []
+            self._set_power(engaged)
+        return None
+
+    def release_power(self):
+        """Drop any hold now, from any thread; a scheduled ``update_power`` cannot re-take it once stopped."""
+        with self._power_lock:
+            self._set_power([])
+
+    def _set_power(self, engaged):
+        try:
+            self.power.set_awake(bool(engaged), f"{' and '.join(engaged)} activity")
+        except Exception as e:
+            logging.error(f"Error changing the sleep inhibitor: {e}")
+            logging.error(traceback.format_exc())
+
+    def _observe_activity(self, now, last_activity):
+        """Pass the idle backend's last input time to the policy; the caller holds the lock."""
+        self.policy.observe_activity(last_activity)
+        if self.trace is not None:
+            self.trace.activity(now, last_activity)
+
+    def check_inactivity(self, now):
+        """Scheduled at the inactivity expiry; returns the next expiry, or starts the sleep countdown."""
+        last_tick = self.sampler.last_tick
+        if last_tick is None or now - last_tick > self.adaptive.expiry_accuracy:
+            self.sample(now)  # Decide on fresh counters even when sampling has backed off
+        last_activity = self.activity.last_activity()
+        with self.lock:
+            if not self.monitoring_active:
+                return None
+            policy = self.policy
+            self._observe_activity(now, last_activity)
+            if not policy.should_sleep(now):
+                # Input-polling backends only learn about input when asked, so check again at the
+                # expiry implied by what is known now; engaged rules push it a full limit away.
+                return now + max(policy.time_remaining(now), MIN_CHECK_INTERVAL)
+            inactivity_duration = now - policy.last_activity
+            self.sleep_pending = True
+            self.metrics.sleep_events += 1
+            if self.trace is not None:
+                self.trace.sleep(now, inactivity_duration)
+        download_speed, upload_speed = self.sampler.speeds()
+        logging.info(f"Timer expired - Inactivity: {inactivity_duration:.1f}s, Download: {download_speed:.2f} Mbps, Upload: {upload_speed:.2f} Mbps")
+        self.scheduler.call_later(SLEEP_GRACE_PERIOD, self.go_to_sleep, "sleep")
+        return None
+
+    def go_to_sleep(self, now):
+        """Run after the grace period that lets clients show the pending sleep."""
+        with self.lock:
+            if not self.sleep_pending:
+                return None  # Stopped during the grace period
+            self._stop_monitoring()
+        self.release_power()
+        if self.on_sleep() is False:
+            # Stay up, stopped, so the window or `ctl status` can show why instead of quitting awake
+            with self.lock:
+                self.sleep_error = "Could not suspend the system; see the log"
+                if self.trace is not None:
+                    self.trace.stop(now)
+            logging.error("Sleep failed; monitoring stopped and the application keeps running")
+            return None
+        self.shutdown()
+        if self._exit_after_sleep:
+            exit_application()
+        return None
+
+    def shutdown(self):
+        """Stop monitoring and the scheduler, and release the idle backend."""
+        logging.info("Shutting down engine.")
+        with self.lock:
+            self._stop_monitoring()
+        self.scheduler.stop()
+        self.activity.stop()
+        if self.trace is not None:
+            self.trace.close()
+        self.stop_event.set()
+        self.release_power()  # The backend stays connected so on_sleep can still suspend
@@ -0,0 +1,207 @@
+import os
+import time
+import select
+import socket
+import struct
+import selectors
+import threading
+
+from power import (MessageStream, encode_message, FIELD_MEMBER, FIELD_REPLY_SERIAL, FIELD_DESTINATION,
+                   FIELD_ERROR_NAME, FIELD_UNIX_FDS, FIELD_PATH, FIELD_INTERFACE, METHOD_RETURN, ERROR, SIGNAL)
+from sampler import NicCounters
+
+
+class FakeCounters:
+    """Stand-in for ``psutil.net_io_counters(pernic=True)`` with per-interface rates set by the caller.
+
+    Calling it returns byte counters advanced by each interface's rate over
+    the time elapsed on ``clock`` since the previous call, so a sampler fed
+    by it measures exactly the configured rates.
+    """
+
+    def __init__(self, clock, interfaces=("eth0",)):
+        self.clock = clock
+        self._rates = {name: (0.0, 0.0) for name in interfaces}  # {name: (download, upload)} in Mbps
+        self._bytes = {name: [0.0, 0.0] for name in interfaces}  # {name: [received, sent]}
+        self._last = clock()
+
+    def set_rate(self, interface, download=0.0, upload=0.0):
+        """Set an interface's rates in Mbps; unknown interfaces are added."""
+        self._advance()
+        self._rates[interface] = (download, upload)
+        self._bytes.setdefault(interface, [0.0, 0.0])
+
+    def remove(self, interface):
+        self._advance()
+        self._rates.pop(interface, None)
+        self._bytes.pop(interface, None)
+
+    def _advance(self):
+        now = self.clock()
+        elapsed = now - self._last
+        self._last = now
+        if elapsed <= 0:
+            return
+        for name, (download, upload) in self._rates.items():
+            counters = self._bytes[name]
+            counters[0] += download * 125_000 * elapsed  # Mbps to bytes per second
+            counters[1] += upload * 125_000 * elapsed
+
+    def __call__(self):
+        self._advance()
+        return {name: NicCounters(int(sent), int(received))
+                for name, (received, sent) in self._bytes.items()}
+
+
+def flood_input(recorder, events, kind="move"):
+    """Deliver ``events`` synthetic input events to an ActivityRecorder, the way pynput's hooks would."""
+    if kind == "move":
+        handler = recorder.on_move
+        for i in range(events):
+            handler(i, i)
+    elif kind == "key":
+        handler = recorder.on_press
+        for _ in range(events):
+            handler(None)
+    else:
+        raise ValueError(f"Unknown input kind: {kind}")
+
+
+class FakeLogind:
+    """Stand-in for systemd-logind on a private D-Bus socket, for running the logind power backend anywhere.
+
+    Speaks just enough of the bus protocol for LogindPowerBackend: Hello,
+    CanSuspend, Inhibit and Suspend. Point DBUS_SYSTEM_BUS_ADDRESS at
+    ``address``. Like logind, Inhibit hands out one end of a pipe and the
+    inhibitor lasts until every copy of it is closed. Suspend is recorded
+    instead of performed, and refused while a block inhibitor on sleep is
+    held. ``events`` lists (monotonic time, event, detail) tuples.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.address = f"unix:path={path}"
+        self.events = []
+        self.inhibitors = {}  # {read end fd: (what, who, why, mode)}
+        self.calls = 0
+        self._server = None
+        self._thread = None
+        self._wake = None
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        self._server.listen()
+        self._wake = os.pipe()
+        self._thread = threading.Thread(target=self._serve, name="fake-logind", daemon=True)
+        self._thread.start()
+        return self
+
+    def _record(self, event, detail=None):
+        self.events.append((time.monotonic(), event, detail))
+
+    def _serve(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self._server, selectors.EVENT_READ, "accept")
+        selector.register(self._wake[0], selectors.EVENT_READ, "stop")
+        clients = 0
+        while True:
+            for key, _ in selector.select():
+                if key.data == "stop":
+                    selector.close()
+                    return
+                if key.data == "accept":
+                    conn, _ = self._server.accept()
+                    clients += 1
+                    selector.register(conn, selectors.EVENT_READ, [MessageStream(conn), False, f":1.{clients}"])
+                elif key.data == "inhibitor":
+                    if key.fd in self.inhibitors:  # Not already collected by a Suspend in this round
+                        self._collect_released(selector, [key.fd])
+                else:
+                    stream, authenticated, name = key.data
+                    if not stream.receive():
+                        selector.unregister(key.fileobj)
+                        key.fileobj.close()
+                        continue
+                    if not authenticated:
+                        key.data[1] = self._authenticate(stream)
+                    if key.data[1]:
+                        message = stream.next_message()
+                        while message is not None:
+                            self._dispatch(stream.sock, name, message, selector)
+                            message = stream.next_message()
+
+    def _collect_released(self, selector, fds=None):
+        """Drop the inhibitors whose pipe has been closed by every holder."""
+        fds = list(self.inhibitors) if fds is None else fds
+        for fd in select.select(fds, [], [], 0)[0] if fds else ():
+            if not os.read(fd, 1):
+                selector.unregister(fd)
+                self._record("release", self.inhibitors.pop(fd)[2])
+                os.close(fd)
+
+    @staticmethod
+    def _authenticate(stream):
+        """Answer the authentication lines received so far; returns True after BEGIN."""
+        line = stream.read_line()
+        while line is not None:
+            line = line.lstrip(b"\0")
+            if line.startswith(b"AUTH"):
+                stream.sock.sendall(b"OK 0123456789abcdef0123456789abcdef\r\n")
+            elif line == b"NEGOTIATE_UNIX_FD":
+                stream.sock.sendall(b"AGREE_UNIX_FD\r\n")
+            elif line == b"BEGIN":
+                return True
+            else:
+                stream.sock.sendall(b"ERROR\r\n")
+            line = stream.read_line()
+        return False
+
+    def _dispatch(self, sock, name, message, selector):
+        self.calls += 1
+        member = message.fields.get(FIELD_MEMBER)
+        reply = {FIELD_REPLY_SERIAL: message.serial, FIELD_DESTINATION: name}
+        message.close_fds()
+        if member == "Hello":
+            sock.sendall(encode_message(METHOD_RETURN, 1, reply, "s", [name]))
+            sock.sendall(encode_message(SIGNAL, 2, {FIELD_PATH: "/org/freedesktop/DBus",
+                                                    FIELD_INTERFACE: "org.freedesktop.DBus",
+                                                    FIELD_MEMBER: "NameAcquired", FIELD_DESTINATION: name},
+                                        "s", [name]))
+        elif member == "CanSuspend":
+            sock.sendall(encode_message(METHOD_RETURN, 3, reply, "s", ["yes"]))
+        elif member == "Inhibit":
+            read_end, write_end = os.pipe()
+            self.inhibitors[read_end] = tuple(message.body)
+            selector.register(read_end, selectors.EVENT_READ, "inhibitor")
+            self._record("inhibit", message.body[2])
+            data = encode_message(METHOD_RETURN, 4, {**reply, FIELD_UNIX_FDS: 1}, "h", [0])
+            sock.sendmsg([data], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, struct.pack("i", write_end))])
+            os.close(write_end)
+        elif member == "Suspend":
+            self._collect_released(selector)
+            blocking = [why for what, _, why, mode in self.inhibitors.values() if "sleep" in what and mode == "block"]
+            if blocking:
+                self._record("suspend-refused", blocking)
+                error = {**reply, FIELD_ERROR_NAME: "org.freedesktop.login1.BlockedByInhibitorLock"}
+                sock.sendall(encode_message(ERROR, 5, error, "s", ["Operation denied due to active block inhibitor"]))
+            else:
+                self._record("suspend", message.body[0])
+                sock.sendall(encode_message(METHOD_RETURN, 5, reply))
+        else:
+            error = {**reply, FIELD_ERROR_NAME: "org.freedesktop.DBus.Error.UnknownMethod"}
+            sock.sendall(encode_message(ERROR, 6, error, "s", [f"Unknown method {member}"]))
+
+    def stop(self):
+        if self._thread is not None:
+            os.write(self._wake[1], b"x")
+            self._thread.join()
+            self._thread = None
+            self._server.close()
+            for fd in (*self._wake, *self.inhibitors):
+                os.close(fd)
+            self.inhibitors.clear()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
@@ -0,0 +1,326 @@
+import os
+import json
+import time
+import signal
+import socket
+import logging
+import threading
+import traceback
+
+from control import parse_address
+
+DEFAULT_FLEET_PORT = 47801  # Aggregator TCP port; the control socket uses 47800
+DEFAULT_FLEET_ADDRESS = f"127.0.0.1:{DEFAULT_FLEET_PORT}"
+DEFAULT_REPORT_INTERVAL = 5  # Seconds between agent status checks
+HEARTBEAT_INTERVAL = 60  # An unchanged status is still sent this often, so the aggregator knows the host is alive
+OFFLINE_AFTER = 3 * HEARTBEAT_INTERVAL  # Hosts silent for this long count as offline (in seconds)
+MAX_RECONNECT_DELAY = 60  # Longest wait between agent reconnection attempts (in seconds)
+FLUSH_INTERVAL = 1  # Seconds of updates buffered before the aggregator writes them out
+SUMMARY_INTERVAL = 60  # Seconds between summary lines in the aggregator's log
+LISTEN_BACKLOG = 4096  # Pending connections, so a fleet reconnecting at once is not refused
+
+
+def compact_status(status):
+    """The fields of ``MonitorEngine.status`` the fleet view needs, rounded so small jitter is not a change.
+
+    The countdown is sent as the wall-clock time sleep is due, which stays
+    the same while the timer runs, so a counting-down host sends nothing new.
+    """
+    remaining = status["time_remaining"]
+    counting = remaining is not None and not status["keep_awake"]
+    return {
+        "state": status["state"],
+        "down": round(status["download_speed"], 1),
+        "up": round(status["upload_speed"], 1),
+        "sleep_at": round(time.time() + remaining) if counting else None,
+        "keep": status["keep_awake"],
+        "reset": status["last_reset"],
+    }
+
+
+def awake_reason(update):
+    """Why a host is (or is not) awake, from its last update."""
+    state = update.get("state")
+    if state != "monitoring":
+        return state or "unknown"
+    if update.get("keep"):
+        return "+".join(update["keep"])
+    return "timer"
+
+
+class FleetAgent:
+    """Stream compact status updates from an engine to a fleet aggregator.
+
+    Runs on its own thread so a slow or absent aggregator never delays
+    sampling. Updates are one JSON line each and are only sent when the
+    compact status changed, or every HEARTBEAT_INTERVAL seconds. Lost
+    connections are retried with exponential backoff.
+    """
+
+    def __init__(self, engine, address, host=None, interval=DEFAULT_REPORT_INTERVAL):
+        self.engine = engine
+        self.address = address
+        self.host = host or socket.gethostname()
+        self.interval = interval
+        self.sent = 0
+        self._sock = None
+        self._stopped = threading.Event()
+        self._thread = None
+        self._retry_delay = interval
+        self._next_attempt = 0.0
+
+    def start(self):
+        logging.info(f"Reporting to fleet aggregator at {self.address} as {self.host}")
+        self._thread = threading.Thread(target=self.run, name="fleet-agent", daemon=True)
+        self._thread.start()
+
+    def run(self):
+        last_update, last_sent = None, 0.0
+        while True:
+            try:
+                update = compact_status(self.engine.status())
+                now = time.monotonic()
+                if update != last_update or now - last_sent >= HEARTBEAT_INTERVAL:
+                    if self._send(dict(update, host=self.host)):
+                        last_update, last_sent = update, now
+            except Exception as e:
+                logging.error(f"Error reporting to fleet aggregator: {e}")
+                logging.error(traceback.format_exc())
+            if self._stopped.wait(self.interval):
+                return
+
+    def _send(self, update):
+        """Send one update; returns False (and backs off) when the aggregator cannot be reached."""
+        now = time.monotonic()
+        if self._sock is None and now < self._next_attempt:
+            return False
+        try:
+            if self._sock is None:
+                family, target = parse_address(self.address)
+                self._sock = socket.socket(family, socket.SOCK_STREAM)
+                self._sock.settimeout(self.interval)
+                self._sock.connect(target)
+                logging.info(f"Connected to fleet aggregator at {self.address}")
+            self._sock.sendall(json.dumps(update, separators=(",", ":")).encode() + b"\n")
+        except OSError as e:
+            if self._retry_delay == self.interval:
+                logging.warning(f"Fleet aggregator unreachable at {self.address}: {e}")
+            self._close_socket()
+            self._next_attempt = now + self._retry_delay
+            self._retry_delay = min(self._retry_delay * 2, MAX_RECONNECT_DELAY)
+            return False
+        self._retry_delay = self.interval
+        self.sent += 1
+        return True
+
+    def _close_socket(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def close(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._close_socket()
+
+
+class FleetAggregator:
+    """Collect agent updates on one asyncio loop and keep the latest state per host.
+
+    Agents only write; a connection that sends {"cmd": "summary"} gets the
+    fleet summary back instead. Updates are appended to ``log_path`` as JSON
+    lines in one write every FLUSH_INTERVAL seconds rather than one per update.
+    """
+
+    def __init__(self, address, log_path=None, clock=time.time):
+        self.address = address
+        self.log_path = log_path
+        self.clock = clock
+        self.hosts = {}  # {host: latest update, with "seen" (receive time) and "connected"}
+        self.updates = 0
+        self.connections = 0
+        self._writers = {}  # {host: writer of its current connection}; an older one closing leaves it connected
+        self._buffer = []  # JSON lines waiting for the next batched write
+        self._log = None
+        self._server = None
+        self._started = clock()
+
+    async def start(self):
+        import asyncio
+
+        family, target = parse_address(self.address)
+        if family == socket.AF_UNIX:
+            if os.path.exists(target):
+                os.unlink(target)  # Stale socket from a previous run
+            self._server = await asyncio.start_unix_server(self._handle, target, backlog=LISTEN_BACKLOG)
+        else:
+            self._server = await asyncio.start_server(self._handle, target[0], target[1], backlog=LISTEN_BACKLOG)
+        if self.log_path:
+            self._log = open(self.log_path, "a", encoding="utf-8")
+        logging.info(f"Fleet aggregator listening on {self.address}")
+
+    async def serve(self, summary_interval=SUMMARY_INTERVAL):
+        """Run until cancelled, flushing the update log and logging a summary periodically."""
+        import asyncio
+
+        next_summary = self.clock() + summary_interval
+        try:
+            while True:
+                await asyncio.sleep(FLUSH_INTERVAL)
+                self.flush()
+                if self.clock() >= next_summary:
+                    next_summary += summary_interval
+                    logging.info(f"Fleet summary - {self.format_counts(self.summary())}")
+        finally:
+            self.close()
+
+    async def _handle(self, reader, writer):
+        host = None
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    logging.warning("Dropping fleet connection: update longer than the stream limit")
+                    break
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    logging.warning(f"Ignoring malformed fleet update: {line[:200]!r}")
+                    continue
+                if not isinstance(message, dict):
+                    logging.warning(f"Dropping fleet connection: update is not an object: {line[:200]!r}")
+                    break
+                if message.get("cmd") == "summary":
+                    writer.write(json.dumps(self.summary(message.get("hosts", False))).encode() + b"\n")
+                    await writer.drain()
+                    continue
+                if message.get("host"):
+                    if host is None:
+                        self.connections += 1  # Summary requests do not count as agents
+                    host = message["host"]
+                    self._writers[host] = writer
+                    self.record(host, message)
+        except (ConnectionError, OSError):
+            pass  # Agent went away; its last state stays until it reconnects or times out
+        finally:
+            if host is not None:
+                self.connections -= 1
+                if self._writers.get(host) is writer:  # Not already replaced by a reconnect
+                    del self._writers[host]
+                    self.hosts[host]["connected"] = False
+            writer.close()
+
+    def record(self, host, update):
+        now = self.clock()
+        update["seen"] = now
+        update["connected"] = True
+        self.hosts[host] = update
+        self.updates += 1
+        if self._log is not None:
+            self._buffer.append(json.dumps(dict(update, ts=round(now, 3)), separators=(",", ":")) + "\n")
+
+    def flush(self):
+        if self._buffer and self._log is not None:
+            self._log.write("".join(self._buffer))
+            self._log.flush()
+        self._buffer.clear()
+
+    def summary(self, include_hosts=False):
+        """Counts of hosts by why they are awake, plus optionally every host's latest update."""
+        now = self.clock()
+        reasons = {}
+        detail = {}
+        for host, update in self.hosts.items():
+            offline = not update["connected"] or now - update["seen"] > OFFLINE_AFTER
+            reason = "offline" if offline else awake_reason(update)
+            reasons[reason] = reasons.get(reason, 0) + 1
+            if include_hosts:
+                remaining = max(0, update["sleep_at"] - now) if update.get("sleep_at") is not None else None
+                detail[host] = dict(update, reason=reason, remaining=remaining, age=round(now - update["seen"], 1))
+        summary = {
+            "hosts": len(self.hosts),
+            "connections": self.connections,
+            "reasons": dict(sorted(reasons.items(), key=lambda item: -item[1])),
+            "updates": self.updates,
+            "updates_per_second": round(self.updates / max(now - self._started, 1e-9), 1),
+        }
+        if include_hosts:
+            summary["detail"] = detail
+        return summary
+
+    @staticmethod
+    def format_counts(summary):
+        reasons = ", ".join(f"{reason}: {count}" for reason, count in summary["reasons"].items())
+        return (f"{summary['hosts']} hosts, {summary['connections']} connected ({reasons or 'none'}); "
+                f"{summary['updates_per_second']} updates/s")
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+            family, target = parse_address(self.address)
+            if family == socket.AF_UNIX and os.path.exists(target):
+                os.unlink(target)
+            self._server = None
+        self.flush()
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+def raise_file_limit():
+    """Raise the open-file soft limit to the hard limit, since every agent holds a socket open."""
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows: no per-process descriptor limit to raise
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+            soft = hard
+        except (ValueError, OSError) as e:
+            logging.warning(f"Could not raise the open file limit above {soft}: {e}")
+    return soft
+
+
+def run_aggregator(address, log_path=None, summary_interval=SUMMARY_INTERVAL):
+    """Serve the aggregator on the current thread until interrupted."""
+    import asyncio
+
+    limit = raise_file_limit()
+    if limit is not None:
+        logging.info(f"Open file limit is {limit}; that many agents can connect at once")
+    aggregator = FleetAggregator(address, log_path)
+
+    async def main():
+        await aggregator.start()
+        serving = asyncio.current_task()
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, serving.cancel)
+        except NotImplementedError:
+            pass  # Windows event loops have no signal handlers; Ctrl+C still works
+        await aggregator.serve(summary_interval)
+
+    try:
+        asyncio.run(main())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    logging.info("Fleet aggregator stopped")
+
+
+def request_summary(address, include_hosts=False, timeout=5.0):
+    """Ask a running aggregator for its summary."""
+    family, target = parse_address(address)
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(target)
+        sock.sendall(json.dumps({"cmd": "summary", "hosts": include_hosts}).encode() + b"\n")
+        with sock.makefile("rb") as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError("Aggregator closed the connection")
+    return json.loads(line)
@@ -0,0 +1,714 @@
+import tkinter as tk
+from tkinter import ttk, messagebox
+import time
+import traceback
+import ttkbootstrap as tb
+import logging
+from engine import DEFAULT_SPEED_THRESHOLD, DEFAULT_INACTIVITY_LIMIT
+from sampler import DEFAULT_EXCLUDE_INTERFACES, parse_patterns
+from logs import LOG_FILE
+from logview import LogViewer
+from profiling import PROFILER
+
+# Constants
+TIMER_REFRESH_INTERVAL = 1000  # Longest GUI refresh interval while monitoring (in milliseconds)
+IDLE_REFRESH_INTERVAL = 2000  # GUI refresh interval while stopped, to follow a daemon (in milliseconds)
+PROGRESS_STEPS = 400  # Progress bars are redrawn only when they move by 1/PROGRESS_STEPS (about a pixel)
+RENDER_STATS_INTERVAL = 60  # Seconds between log lines with the GUI's Tk call rate
+INDICATOR_REFRESH_INTERVAL = 5000  # Longest tray indicator refresh interval (in milliseconds)
+WINDOW_GEOMETRY = "800x700"
+INDICATOR_GEOMETRY = "260x36"
+SETTING_ENTRIES = ("timer_entry", "download_threshold_entry", "upload_threshold_entry", "include_entry", "exclude_entry")
+INDICATOR_COLORS = {"monitoring": "#28a745", "sleeping": "#ffc107"}  # Any other state is shown in grey
+
+# GUI Class
+class NetworkMonitorGUI:
+    """The Sleep Sentinel window, or while minimized a one-line indicator.
+
+    Minimizing destroys the whole widget tree and leaves a single label
+    showing the state and the time until sleep; the engine keeps running.
+    Clicking the indicator rebuilds the window from the engine's current
+    state, with the settings as they were typed.
+    """
+
+    def __init__(self, root, engine, minimized=False):
+        logging.info("Initializing GUI")
+        self.root = root
+        self.engine = engine  # In-process MonitorEngine or a ControlClient for a running daemon
+        self.displayed_state = None
+        self._refresh_job = None
+        self._rendered = {}  # {(widget, option): value} as last sent to Tk
+        self.visible = True  # False while the window is iconified, withdrawn or fully covered
+        self.tk_calls = 0  # Widget updates and timer registrations sent to Tk
+        self._stats_since = time.monotonic()
+        self._stats_calls = 0
+        self.minimized = False
+        self.indicator = None
+        self.entry_texts = {}  # {entry attribute: text} kept while the window is torn down
+        self._window_widgets = ()  # Attributes holding the window's widgets, dropped when minimizing
+        self.root.title("Sleep Sentinel")
+        self.root.style.theme_use("superhero")  # Use a modern theme
+
+        # Pause refreshing while nobody can see the window
+        self.root.bind("<Map>", self.on_visibility_change, add="+")
+        self.root.bind("<Unmap>", self.on_visibility_change, add="+")
+        self.root.bind("<Visibility>", self.on_visibility_change, add="+")
+
+        if minimized:
+            self.show_indicator()
+        else:
+            self.build_window()
+        self.update_timer()
+
+    def build_window(self):
+        """Create the full widget tree; the attributes it adds are dropped again by ``minimize``."""
+        before = set(vars(self))
+        root = self.root
+        root.geometry(WINDOW_GEOMETRY)
+
+        # Create main container with padding
+        self.main_container = tb.Frame(root, padding=20)
+        self.main_container.pack(fill="both", expand=True)
+
+        # Header Section
+        self.header_frame = tb.Frame(self.main_container)
+        self.header_frame.pack(fill="x", pady=(0, 10))
+
+        self.title_label = tb.Label(
+            self.header_frame,
+            text="Sleep Sentinel",
+            font=("Arial", 28, "bold"),
+            bootstyle="primary"
+        )
+        self.title_label.pack(side="left")
+
+        # Define a style for the buttons
+        style = tb.Style()
+        style.configure('Custom.TButton', font=('Arial', 13))
+
+        # Ensure consistent button style across themes
+        self.root.style.configure('TButton', font=('Arial', 13))
+
+        # Help Button
+        self.help_button = tb.Button(
+            self.header_frame,
+            text="Help",
+            command=self.show_help,
+            bootstyle="info",
+            padding=(10, 5),
+            style='Custom.TButton'  # Apply custom style
+        )
+        self.help_button.pack(side="right", padx=10)
+
+        # View Logs Button
+        self.logs_button = tb.Button(
+            self.header_frame,
+            text="View Logs",
+            command=self.view_logs,
+            bootstyle="info",
+            padding=(10, 5),
+            style='Custom.TButton'  # Apply custom style
+        )
+        self.logs_button.pack(side="right", padx=10)
+
+        # Profiling Button: records thread CPU, hot-path timings and stacks to a file
+        self.profile_button = tb.Button(
+            self.header_frame,
+            text="Profile",
+            command=self.toggle_profiling,
+            bootstyle="secondary",
+            padding=(10, 5),
+            style='Custom.TButton'
+        )
+        self.profile_button.pack(side="right", padx=10)
+
+        # Minimize Button: swaps the window for a small indicator, freeing its widgets
+        self.minimize_button = tb.Button(
+            self.header_frame,
+            text="Minimize",
+            command=self.minimize,
+            bootstyle="secondary",
+            padding=(10, 5),
+            style='Custom.TButton'
+        )
+        self.minimize_button.pack(side="right", padx=10)
+
+        # Ensure consistent button style across themes
+        self.root.style.configure('Custom.TButton', font=('Arial', 10))  # Set font size for both buttons
+
+        # Dark/Light Mode Toggle
+        self.mode_toggle_frame = tb.Frame(self.header_frame)
+        self.mode_toggle_frame.pack(side="right", padx=10, pady=(10, 0))
+
+        self.mode_label = tb.Label(
+            self.mode_toggle_frame,
+            text="🌙 Dark Mode",
+            font=("Arial", 13)
+        )
+        self.mode_label.pack(side="left")
+
+        self.mode_toggle = tb.Checkbutton(
+            self.mode_toggle_frame,
+            bootstyle="round-toggle",
+            command=self.toggle_dark_mode
+        )
+        self.mode_toggle.pack(side="right")
+
+        # Settings Section
+        self.settings_frame = tb.LabelFrame(
+            self.main_container,
+            text="Settings",
+            padding=15,
+            bootstyle="primary"
+        )
+        self.settings_frame.pack(fill="x", pady=(0, 10))
+
+        # Timer Input
+        self.timer_frame = tb.Frame(self.settings_frame)
+        self.timer_frame.pack(fill="x", pady=5)
+
+        self.timer_input_label = tb.Label(
+            self.timer_frame,
+            text="Inactivity Timer (sec):",
+            font=("Arial", 12, "bold")
+        )
+        self.timer_input_label.pack(side="left")
+
+        self.timer_entry = tb.Entry(
+            self.timer_frame,
+            font=("Arial", 13),
+            width=10
+        )
+        self.timer_entry.insert(0, str(DEFAULT_INACTIVITY_LIMIT))
+        self.timer_entry.pack(side="right")
+
+        # Download Threshold
+        self.download_frame = tb.Frame(self.settings_frame)
+        self.download_frame.pack(fill="x", pady=5)
+
+        self.download_threshold_label = tb.Label(
+            self.download_frame,
+            text="Download Threshold (Mbps):",
+            font=("Arial", 12, "bold")
+        )
+        self.download_threshold_label.pack(side="left")
+
+        self.download_threshold_entry = tb.Entry(
+            self.download_frame,
+            font=("Arial", 13),
+            width=10
+        )
+        self.download_threshold_entry.insert(0, str(DEFAULT_SPEED_THRESHOLD))
+        self.download_threshold_entry.pack(side="right")
+
+        # Upload Threshold
+        self.upload_frame = tb.Frame(self.settings_frame)
+        self.upload_frame.pack(fill="x", pady=5)
+
+        self.upload_threshold_label = tb.Label(
+            self.upload_frame,
+            text="Upload Threshold (Mbps):",
+            font=("Arial", 12, "bold")
+        )
+        self.upload_threshold_label.pack(side="left")
+
+        self.upload_threshold_entry = tb.Entry(
+            self.upload_frame,
+            font=("Arial", 13),
+            width=10
+        )
+        self.upload_threshold_entry.insert(0, str(DEFAULT_SPEED_THRESHOLD))
+        self.upload_threshold_entry.pack(side="right")
+
+        # Interface Filters
+        self.include_frame = tb.Frame(self.settings_frame)
+        self.include_frame.pack(fill="x", pady=5)
+
+        self.include_label = tb.Label(
+            self.include_frame,
+            text="Include Interfaces (blank = all):",
+            font=("Arial", 12, "bold")
+        )
+        self.include_label.pack(side="left")
+
+        self.include_entry = tb.Entry(
+            self.include_frame,
+            font=("Arial", 13),
+            width=30
+        )
+        self.include_entry.pack(side="right")
+
+        self.exclude_frame = tb.Frame(self.settings_frame)
+        self.exclude_frame.pack(fill="x", pady=5)
+
+        self.exclude_label = tb.Label(
+            self.exclude_frame,
+            text="Exclude Interfaces:",
+            font=("Arial", 12, "bold")
+        )
+        self.exclude_label.pack(side="left")
+
+        self.exclude_entry = tb.Entry(
+            self.exclude_frame,
+            font=("Arial", 13),
+            width=30
+        )
+        self.exclude_entry.insert(0, ", ".join(DEFAULT_EXCLUDE_INTERFACES))
+        self.exclude_entry.pack(side="right")
+
+        # Status Section
+        self.status_frame = tb.LabelFrame(
+            self.main_container,
+            text="Monitoring Status",
+            padding=10,
+            bootstyle="primary"
+        )
+        self.status_frame.pack(fill="x", pady=(0, 5))
+
+        # Network Speed Meters
+        self.speed_frame = tb.Frame(self.status_frame)
+        self.speed_frame.pack(fill="x", pady=(0, 10))
+
+        # Download Speed Meter
+        self.download_meter_frame = tb.Frame(self.speed_frame)
+        self.download_meter_frame.pack(side="left", expand=True, fill="x", padx=5)
+
+        self.download_label = tb.Label(
+            self.download_meter_frame,
+            text="Download Speed",
+            font=("Arial", 12, "bold")
+        )
+        self.download_label.pack()
+
+        self.download_speed_label = tb.Label(
+            self.download_meter_frame,
+            text="0 Mbps",
+            font=("Arial", 16)
+        )
+        self.download_speed_label.pack()
+
+        self.download_meter = ttk.Progressbar(
+            self.download_meter_frame,
+            length=200,
+            mode="determinate",
+            style="success.Horizontal.TProgressbar"
+        )
+        self.download_meter.pack(pady=5)
+
+        # Upload Speed Meter
+        self.upload_meter_frame = tb.Frame(self.speed_frame)
+        self.upload_meter_frame.pack(side="right", expand=True, fill="x", padx=5)
+
+        self.upload_label = tb.Label(
+            self.upload_meter_frame,
+            text="Upload Speed",
+            font=("Arial", 12, "bold")
+        )
+        self.upload_label.pack()
+
+        self.upload_speed_label = tb.Label(
+            self.upload_meter_frame,
+            text="0 Mbps",
+            font=("Arial", 16)
+        )
+        self.upload_speed_label.pack()
+
+        self.upload_meter = ttk.Progressbar(
+            self.upload_meter_frame,
+            length=200,
+            mode="determinate",
+            style="info.Horizontal.TProgressbar"
+        )
+        self.upload_meter.pack(pady=5)
+
+        # Timer Section
+        self.timer_display_frame = tb.Frame(self.status_frame)
+        self.timer_display_frame.pack(fill="x", pady=10)
+
+        self.timer_label = tb.Label(
+            self.timer_display_frame,
+            text="Time Until Sleep",
+            font=("Arial", 12, "bold")
+        )
+        self.timer_label.pack()
+
+        self.time_remaining_label = tb.Label(
+            self.timer_display_frame,
+            text="--",
+            font=("Arial", 24, "bold")
+        )
+        self.time_remaining_label.pack()
+
+        self.timer_progress = ttk.Progressbar(
+            self.timer_display_frame,
+            orient="horizontal",
+            length=400,
+            mode="determinate",
+            style="primary.Horizontal.TProgressbar"
+        )
+        self.timer_progress.pack(pady=5)
+
+        self.sampling_label = tb.Label(
+            self.timer_display_frame,
+            text="Sampling: --",
+            font=("Arial", 10)
+        )
+        self.sampling_label.pack()
+
+        # Status Message
+        self.status_label = tb.Label(
+            self.status_frame,
+            text="Status: Waiting to start...",
+            font=("Arial", 13),
+            bootstyle="info"
+        )
+        self.status_label.pack(pady=10)
+
+        # Control Button
+        self.toggle_button = tk.Button(
+            self.main_container,
+            text="Start",
+            command=self.toggle_monitoring,
+            font=("Arial", 16),  # Match text size with 'Upload Speed'
+            bg="#28a745",  # Success color
+            fg="white",
+            relief="flat",
+            highlightthickness=0,
+            bd=0,
+            padx=20,
+            pady=10  # Add padding for rounded effect
+        )
+        self.toggle_button.pack(pady=10, side="bottom", anchor="center")
+        self.toggle_button.config(highlightbackground="#28a745", highlightcolor="#28a745")
+
+        # Set initial button color to green
+        self.toggle_button.config(bg="#28a745")
+
+        # Restore what was typed and the theme's toggle when rebuilt after minimizing
+        for name, text in self.entry_texts.items():
+            entry = getattr(self, name)
+            entry.delete(0, tk.END)
+            entry.insert(0, text)
+        if self.root.style.theme_use() != "superhero":
+            self.mode_label.config(text="☀️ Light Mode")
+            self.mode_toggle.state(["!alternate", "selected"])
+
+        self._window_widgets = tuple(set(vars(self)) - before)
+
+    def minimize(self):
+        """Tear down the window's widgets and show the indicator instead; the engine keeps running."""
+        if self.minimized:
+            return
+        self.entry_texts = {name: getattr(self, name).get() for name in SETTING_ENTRIES}
+        self.main_container.destroy()
+        for name in self._window_widgets:
+            delattr(self, name)
+        self._window_widgets = ()
+        self._rendered.clear()
+        self.show_indicator()
+        logging.info("Window minimized to the indicator; its widgets were destroyed")
+        self.refresh_now()
+
+    def show_indicator(self):
+        """Shrink the root window to a single label; clicking it restores the window."""
+        self.minimized = True
+        self.root.geometry(INDICATOR_GEOMETRY)
+        self.indicator = tk.Label(self.root, text="Sleep Sentinel", font=("Arial", 11), fg="white", bg="#6c757d",
+                                  cursor="hand2", anchor="w", padx=10)
+        self.indicator.pack(fill="both", expand=True)
+        self.indicator.bind("<Button-1>", self.restore)
+
+    def restore(self, event=None):
+        """Rebuild the window from the engine's current state."""
+        if not self.minimized:
+            return
+        started = time.perf_counter()
+        self.indicator.destroy()
+        self.indicator = None
+        self._rendered.clear()
+        self.minimized = False
+        shown, self.displayed_state = self.displayed_state, None
+        self.build_window()
+        if shown is not None:
+            self.show_state(shown)
+        self.refresh_now()
+        logging.info(f"Window rebuilt in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    def show_help(self):
+        """Display help information."""
+        messagebox.showinfo(
+            "Help",
+            "Sleep Sentinel monitors network activity and prevents your system from sleeping.\n\n"
+            "1. Set the inactivity timer (in seconds).\n"
+            "2. Set download/upload speed thresholds (in Mbps).\n"
+            "3. Start monitoring to keep your system awake during active network usage.\n\n"
+            "Note: The system will sleep if both network speeds are below the thresholds and the timer expires."
+        )
+
+    def view_logs(self):
+        """Open the log viewer, which loads only the part of the file on screen."""
+        try:
+            LogViewer(self.root, LOG_FILE)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to open logs: {e}")
+
+    def toggle_profiling(self):
+        """Start profiling the engine, or stop and say where the profile was written."""
+        try:
+            if self.engine.profile()["enabled"]:
+                result = self.engine.profile("stop")
+                messagebox.showinfo("Profile", "Profile written to:\n" + "\n".join(result.get("files", [])))
+            else:
+                self.engine.profile("start", stacks=True)
+        except Exception as e:
+            messagebox.showerror("Error", f"Profiling failed: {e}")
+        self.refresh_now()
+
+    def validate_inputs(self):
+        """Validate user inputs for inactivity timer and speed thresholds."""
+        try:
+            inactivity_limit = int(self.timer_entry.get())
+            download_threshold = float(self.download_threshold_entry.get())
+            upload_threshold = float(self.upload_threshold_entry.get())
+
+            if inactivity_limit <= 0 or download_threshold < 0 or upload_threshold < 0:
+                raise ValueError("Values must be positive.")
+
+            return True
+        except ValueError as e:
+            error_msg = f"Invalid input: {str(e)}"
+            logging.error(error_msg)
+            messagebox.showerror("Invalid Input", "Please enter valid positive numbers.")
+            return False
+
+
+
+
+
+
+
+
+    def toggle_monitoring(self):
+        """Toggle monitoring on and off."""
+        try:
+            if self.displayed_state in ("monitoring", "sleeping"):
+                self.engine.stop()
+                self.show_state("stopped")
+                self.refresh_now()
+                logging.info("Monitoring stopped by user")
+            else:
+                if not self.validate_inputs():
+                    return
+
+                self.engine.start(int(self.timer_entry.get()),
+                                  float(self.download_threshold_entry.get()),
+                                  float(self.upload_threshold_entry.get()),
+                                  parse_patterns(self.include_entry.get()),
+                                  parse_patterns(self.exclude_entry.get()))
+                self.show_state("monitoring")
+                self.refresh_now()
+        except ValueError as e:
+            error_msg = f"Invalid input values: {str(e)}"
+            logging.error(error_msg)
+            self.timer_entry.delete(0, tk.END)
+            self.timer_entry.insert(0, str(DEFAULT_INACTIVITY_LIMIT))
+            self.download_threshold_entry.delete(0, tk.END)
+            self.download_threshold_entry.insert(0, str(DEFAULT_SPEED_THRESHOLD))
+            self.upload_threshold_entry.delete(0, tk.END)
+            self.upload_threshold_entry.insert(0, str(DEFAULT_SPEED_THRESHOLD))
+            self.status_label.config(text="Invalid input! Using default values.", bootstyle="warning")
+            logging.info(f"Reset to default values - Inactivity limit: {DEFAULT_INACTIVITY_LIMIT}s, Download threshold: {DEFAULT_SPEED_THRESHOLD} Mbps, Upload threshold: {DEFAULT_SPEED_THRESHOLD} Mbps")
+        except Exception as e:
+            error_msg = f"Error in toggle_monitoring: {str(e)}"
+            logging.error(error_msg)
+            logging.error(traceback.format_exc())
+            self.status_label.config(text=f"Error: {str(e)}", bootstyle="danger")
+
+    def show_state(self, state):
+        """Update the control button and status line when the engine state changes."""
+        if state == self.displayed_state:
+            return
+        self.displayed_state = state
+        if state == "monitoring":
+            button, text, style = "Stop", "Status: Monitoring...", "info"
+        elif state == "sleeping":
+            button, text, style = "Stop", "Status: Timer expired. System going to sleep...", "warning"
+        elif state == "stopped":
+            button, text, style = "Start", "Status: Stopped.", "danger"
+        elif state == "sleep failed":
+            button, text, style = "Start", "Status: Could not put the system to sleep. See the logs.", "danger"
+        else:
+            button, text, style = "Start", f"Status: {state}", "danger"
+        self.set_widget(self.toggle_button, "text", button)
+        self.set_widget(self.toggle_button, "bg", "#dc3545" if button == "Stop" else "#28a745")
+        self.set_widget(self.status_label, "text", text)
+        self.set_widget(self.status_label, "bootstyle", style)
+
+    def set_widget(self, widget, option, value):
+        """Send ``option=value`` to Tk only if it differs from what the widget already shows."""
+        key = (widget, option)
+        if self._rendered.get(key) == value:
+            return
+        self._rendered[key] = value
+        widget.configure(**{option: value})
+        self.tk_calls += 1
+
+    def update_timer(self):
+        """Redraw from one engine snapshot and schedule the next refresh while visible."""
+        self._refresh_job = None
+        if not self.visible:
+            return  # Becoming visible again redraws and restarts the refresh
+        started = time.perf_counter()
+        try:
+            status = self.engine.status()
+        except Exception as e:
+            logging.error(f"Error reading engine status: {e}")
+            status = {"state": "Engine unavailable", "monitoring": False}
+        if self.minimized:
+            self.render_indicator(status)
+            delay = self.next_indicator_delay(status)
+        else:
+            if self.displayed_state is not None or status["state"] != "stopped":
+                self.show_state(status["state"])
+            self.render(status)
+            self.set_widget(self.profile_button, "text", "Stop Profiling" if status.get("profiling") else "Profile")
+            delay = self.next_refresh_delay(status)
+        self._refresh_job = self.root.after(delay, self.update_timer)
+        self.tk_calls += 1
+        metrics = getattr(self.engine, "metrics", None)  # Only an in-process engine has metrics
+        if metrics is not None:
+            metrics.gui_refresh_seconds.observe(time.perf_counter() - started)
+        PROFILER.end("update_timer", started)
+        self.log_render_stats()
+
+    def render(self, status):
+        """Map a status snapshot onto the countdown, speed and sampling widgets."""
+        set_widget = self.set_widget
+        if status["monitoring"]:
+            time_remaining = status["time_remaining"]
+            minutes = int(time_remaining) // 60
+            seconds = int(time_remaining) % 60
+            set_widget(self.time_remaining_label, "text", f"{minutes:02d}:{seconds:02d}")
+            progress = round(time_remaining / status["inactivity_limit"] * PROGRESS_STEPS)
+            set_widget(self.timer_progress, "value", progress * 100 / PROGRESS_STEPS)
+
+            # Dynamically scale progress bars based on observed speeds, at the labels' 0.1 Mbps resolution
+            download_speed = round(status["download_speed"], 1)
+            upload_speed = round(status["upload_speed"], 1)
+            max_speed = max(download_speed, upload_speed, 100)  # Ensure minimum range of 100 Mbps
+            set_widget(self.download_speed_label, "text", f"{download_speed:.1f} Mbps")
+            set_widget(self.upload_speed_label, "text", f"{upload_speed:.1f} Mbps")
+            set_widget(self.download_meter, "maximum", max_speed)
+            set_widget(self.upload_meter, "maximum", max_speed)
+            set_widget(self.download_meter, "value", download_speed)
+            set_widget(self.upload_meter, "value", upload_speed)
+            sample_interval = status.get("sample_interval")
+            if sample_interval:
+                set_widget(self.sampling_label, "text", f"Sampling every {sample_interval:.1f}s")
+        else:
+            set_widget(self.time_remaining_label, "text", "--:--")
+            set_widget(self.timer_progress, "value", 0)
+            set_widget(self.download_meter, "value", 0)
+            set_widget(self.upload_meter, "value", 0)
+            set_widget(self.download_speed_label, "text", "0 Mbps")
+            set_widget(self.upload_speed_label, "text", "0 Mbps")
+            set_widget(self.sampling_label, "text", "Sampling: --")
+
+    def render_indicator(self, status):
+        """One line for the minimized window: the state and, while monitoring, the time until sleep."""
+        state = status["state"]
+        if state == "monitoring":
+            remaining = int(status["time_remaining"])
+            awake = status.get("keep_awake")
+            if awake:
+                text = f"Awake: {', '.join(awake)}"
+            elif remaining >= 60:
+                text = f"Sleep in {remaining // 60} min"
+            else:
+                text = f"Sleep in {remaining} s"
+        else:
+            text = state.capitalize()
+        if self.displayed_state is not None or state != "stopped":
+            self.displayed_state = state  # Shown by the control button once the window is rebuilt
+        self.set_widget(self.indicator, "text", f"Sleep Sentinel - {text}")
+        self.set_widget(self.indicator, "bg", INDICATOR_COLORS.get(state, "#6c757d"))
+
+    def next_indicator_delay(self, status):
+        """Milliseconds until the indicator's text next needs to change; it counts whole minutes until the last one."""
+        if not status["monitoring"] or status.get("keep_awake"):
+            return INDICATOR_REFRESH_INTERVAL
+        remaining = status["time_remaining"]
+        until_change = remaining % 60 if remaining >= 60 else remaining % 1
+        return min(INDICATOR_REFRESH_INTERVAL, max(50, int(until_change * 1000) + 20))
+
+    def on_visibility_change(self, event):
+        """Track whether the window can be seen; refreshing stops while it cannot."""
+        if event.widget is not self.root:
+            return  # Child widgets report their own map events through the root's bindings
+        if event.type == tk.EventType.Unmap:
+            visible = False
+        elif event.type == tk.EventType.Visibility:
+            visible = event.state != "VisibilityFullyObscured"
+        else:
+            visible = True
+        if visible == self.visible:
+            return
+        self.visible = visible
+        logging.debug(f"Window {'visible' if visible else 'hidden'}; refresh {'resumed' if visible else 'paused'}")
+        if visible:
+            self.refresh_now()
+
+    def render_rate(self):
+        """Tk calls per second since the last stats line."""
+        elapsed = time.monotonic() - self._stats_since
+        return (self.tk_calls - self._stats_calls) / elapsed if elapsed > 0 else 0.0
+
+    def log_render_stats(self):
+        now = time.monotonic()
+        if now - self._stats_since < RENDER_STATS_INTERVAL:
+            return
+        logging.info(f"GUI rendering - {self.render_rate():.2f} Tk calls/s over the last {now - self._stats_since:.0f}s, {self.tk_calls} total")
+        self._stats_since = now
+        self._stats_calls = self.tk_calls
+
+    def next_refresh_delay(self, status):
+        """Milliseconds until the display next needs to change."""
+        if not status["monitoring"]:
+            return IDLE_REFRESH_INTERVAL
+        # Wake just after the countdown's next whole second, when the mm:ss label changes
+        fraction_ms = int((status["time_remaining"] % 1) * 1000)
+        return min(TIMER_REFRESH_INTERVAL, max(50, fraction_ms + 20))
+
+    def refresh_now(self):
+        """Redraw immediately after a user action instead of waiting for the next refresh."""
+        if self._refresh_job is not None:
+            self.root.after_cancel(self._refresh_job)
+            self._refresh_job = None
+        self.update_timer()
+
+    def toggle_dark_mode(self):
+        """Toggle between light and dark mode."""
+        if self.root.style.theme_use() == "superhero":
+            self.root.style.theme_use("flatly")
+            self.root.configure(bg="#7D8B92")  # Set light mode to a slightly grey background
+            self.mode_label.config(text="☀️ Light Mode")
+            if self.displayed_state in ("monitoring", "sleeping"):
+                self.toggle_button.config(bg="#dc3545")  # Ensure Stop button remains red when active
+            else:
+                self.toggle_button.config(bg="#28a745")  # Ensure Start button remains green when inactive
+        else:
+            self.root.style.theme_use("superhero")
+            self.root.configure(bg="#2b2b2b")  # Ensure dark mode has a dark background
+            self.mode_label.config(text="🌙 Dark Mode")
+            if self.displayed_state in ("monitoring", "sleeping"):
+                self.toggle_button.config(bg="#dc3545")  # Ensure Stop button remains red when active
+            else:
+                self.toggle_button.config(bg="#28a745")  # Ensure Start button remains green when inactive
+
+
+    def cleanup(self):
+        """Clean up resources and stop all threads."""
+        logging.info("Starting application cleanup.")
+        logging.info(f"GUI rendering - {self.tk_calls} Tk calls in total")
+        self.engine.shutdown()  # Stops an in-process engine; only disconnects from a daemon
+        logging.info("Application cleanup complete.")
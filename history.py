@@ -0,0 +1,177 @@
+import math
+import threading
+from array import array
+from bisect import bisect_right
+
+HISTORY_SECONDS = 3600  # How much speed history to keep (in seconds)
+EWMA_TIME_CONSTANT = 10  # Smoothing time constant for the exponentially weighted mean (in seconds)
+STATS_WINDOW = 60  # Default window for rolling statistics (in seconds)
+
+
+class RingBuffer:
+    """Fixed-capacity buffer of (timestamp, value) samples backed by two float arrays.
+
+    Appends are O(1) and overwrite the oldest sample once full, so memory is
+    set at construction and never grows. Window queries locate the window start
+    by binary search over the (time-ordered) samples and reduce it with C-level
+    builtins over array slices. Not thread-safe on its own; SpeedHistory locks.
+    """
+
+    def __init__(self, capacity, time_constant=EWMA_TIME_CONSTANT):
+        if capacity <= 0:
+            raise ValueError("Capacity must be positive.")
+        self.capacity = capacity
+        self.time_constant = time_constant
+        self._times = array('d', bytes(8 * capacity))
+        self._values = array('d', bytes(8 * capacity))
+        self._head = 0  # Next slot to write
+        self._count = 0
+        self.ewma = 0.0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, timestamp, value):
+        """Add one sample; timestamps must not go backwards."""
+        if self._count:
+            elapsed = timestamp - self._times[self._head - 1]
+            alpha = 1 - math.exp(-elapsed / self.time_constant) if elapsed > 0 else 0.0
+            self.ewma += alpha * (value - self.ewma)
+        else:
+            self.ewma = value
+        self._times[self._head] = timestamp
+        self._values[self._head] = value
+        self._head = (self._head + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+
+    @property
+    def last_time(self):
+        return self._times[self._head - 1] if self._count else None
+
+    @property
+    def last(self):
+        return self._values[self._head - 1] if self._count else 0.0
+
+    def _start(self):
+        """Physical index of the oldest sample."""
+        return (self._head - self._count) % self.capacity
+
+    def window(self, seconds, now=None):
+        """Values newer than ``now - seconds`` (``now`` defaults to the newest sample), oldest first."""
+        if not self._count:
+            return array('d')
+        if now is None:
+            now = self.last_time
+        cutoff = now - seconds
+        start = self._start()
+        times = self._times
+        capacity = self.capacity
+        # The buffer is two sorted runs: [start:capacity] then [0:head] once it has wrapped
+        if start + self._count <= capacity:
+            first = bisect_right(times, cutoff, start, start + self._count)
+            return self._values[first:start + self._count]
+        if times[capacity - 1] > cutoff:
+            first = bisect_right(times, cutoff, start, capacity)
+            return self._values[first:capacity] + self._values[0:self._head]
+        first = bisect_right(times, cutoff, 0, self._head)
+        return self._values[first:self._head]
+
+    def mean(self, seconds, now=None):
+        values = self.window(seconds, now)
+        return sum(values) / len(values) if values else 0.0
+
+    def max(self, seconds, now=None):
+        values = self.window(seconds, now)
+        return max(values) if values else 0.0
+
+    def percentile(self, seconds, q=95, now=None):
+        """Nearest-rank percentile of the window."""
+        values = self.window(seconds, now)
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        rank = max(0, math.ceil(q / 100 * len(ordered)) - 1)
+        return ordered[rank]
+
+    def stats(self, seconds, now=None):
+        """Mean, EWMA, p95, max and latest value over the window, in one pass over the data."""
+        values = self.window(seconds, now)
+        if not values:
+            return {"mean": 0.0, "ewma": self.ewma, "p95": 0.0, "max": 0.0, "last": 0.0}
+        ordered = sorted(values)
+        return {
+            "mean": sum(values) / len(values),
+            "ewma": self.ewma,
+            "p95": ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)],
+            "max": ordered[-1],
+            "last": values[-1],
+        }
+
+
+class SpeedHistory:
+    """Download/upload rate history in Mbps, for the total and for each interface.
+
+    Each series is a RingBuffer sized for ``horizon`` seconds at the sampler's
+    tick rate. Interfaces that stop reporting are dropped once their newest
+    sample falls out of the horizon, so container churn cannot grow memory.
+    """
+
+    def __init__(self, horizon=HISTORY_SECONDS, tick_interval=1):
+        self.horizon = horizon
+        self.capacity = max(1, math.ceil(horizon / tick_interval))
+        self.lock = threading.Lock()
+        self.download = RingBuffer(self.capacity)
+        self.upload = RingBuffer(self.capacity)
+        self._interfaces = {}  # {interface: (download RingBuffer, upload RingBuffer)}
+
+    def record(self, timestamp, download, upload, interfaces=None):
+        """Append one tick's total rates and the per-interface {name: (download, upload)} rates."""
+        with self.lock:
+            self.download.append(timestamp, download)
+            self.upload.append(timestamp, upload)
+            if interfaces is None:
+                return
+            series = self._interfaces
+            for name, (nic_download, nic_upload) in interfaces.items():
+                buffers = series.get(name)
+                if buffers is None:
+                    buffers = series[name] = (RingBuffer(self.capacity), RingBuffer(self.capacity))
+                buffers[0].append(timestamp, nic_download)
+                buffers[1].append(timestamp, nic_upload)
+            if len(series) > len(interfaces):
+                cutoff = timestamp - self.horizon
+                for name in [name for name, buffers in series.items()
+                             if name not in interfaces and buffers[0].last_time < cutoff]:
+                    del series[name]
+
+    def interfaces(self):
+        with self.lock:
+            return list(self._interfaces)
+
+    def window_max(self, seconds):
+        """Highest (download, upload) rates over the last ``seconds``."""
+        with self.lock:
+            return self.download.max(seconds), self.upload.max(seconds)
+
+    def window_mean(self, seconds):
+        """Mean (download, upload) rates over the last ``seconds``."""
+        with self.lock:
+            return self.download.mean(seconds), self.upload.mean(seconds)
+
+    def stats(self, seconds=STATS_WINDOW, interface=None):
+        """Rolling statistics for the total, or for one interface."""
+        with self.lock:
+            if interface is None:
+                download, upload = self.download, self.upload
+            else:
+                download, upload = self._interfaces[interface]
+            now = self.download.last_time
+            return {"download": download.stats(seconds, now), "upload": upload.stats(seconds, now)}
+
+    def interface_stats(self, seconds=STATS_WINDOW):
+        """Rolling statistics for every tracked interface."""
+        with self.lock:
+            now = self.download.last_time
+            return {name: {"download": download.stats(seconds, now), "upload": upload.stats(seconds, now)}
+                    for name, (download, upload) in self._interfaces.items()}
@@ -0,0 +1,289 @@
+import os
+import sys
+import time
+import logging
+import threading
+import subprocess
+
+from activity import ActivityRecorder, start_listeners, stop_listeners, DEFAULT_ACTIVITY_QUANTUM
+from metrics import timed_handler
+
+IDLE_BACKENDS = ("auto", "windows", "x11", "logind", "pynput", "none")  # Offered on the command line; tests also use "fake"
+DEFAULT_IDLE_POLL_INTERVAL = 0.5  # Minimum seconds between two queries of the OS idle timer
+IDLE_JITTER = 0.05  # Differences below this between two queries are clock-read noise, not input
+
+
+class IdleBackendUnavailable(Exception):
+    """The backend cannot run on this machine (missing library, display or session)."""
+
+
+class IdleBackend:
+    """Source of the user's last input time, in monotonic seconds.
+
+    OS backends ask the platform's idle timer only when ``last_activity`` is
+    called, at whatever rate the decision loop runs, and cache the answer for
+    ``poll_interval`` so several readers in the same tick share one query.
+    """
+
+    name = "base"
+    poll_interval = DEFAULT_IDLE_POLL_INTERVAL
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.polls = 0
+        self.histogram = None  # Optional metrics Histogram for the cost of each OS query
+        self._cached_at = None
+        self._cached = clock()
+
+    def start(self):
+        """Acquire whatever the backend needs; raises IdleBackendUnavailable."""
+
+    def stop(self):
+        """Release resources acquired by ``start``."""
+
+    def idle_seconds(self):
+        """Seconds since the last user input, as reported by the OS."""
+        raise NotImplementedError
+
+    def last_activity(self):
+        now = self.clock()
+        if self._cached_at is None or now - self._cached_at >= self.poll_interval:
+            self._cached_at = now
+            self.polls += 1
+            if self.histogram is None:
+                idle = self.idle_seconds()
+            else:
+                start = time.perf_counter()
+                idle = self.idle_seconds()
+                self.histogram.observe(time.perf_counter() - start)
+            # Input time only moves forward; earlier values mean input before we started
+            last_input = now - idle
+            if last_input > self._cached + IDLE_JITTER:
+                self._cached = last_input
+        return self._cached
+
+    def counters(self):
+        return {"backend": self.name, "polls": self.polls}
+
+
+class WindowsIdleBackend(IdleBackend):
+    """GetLastInputInfo: the session's last input tick, kept by Windows itself."""
+
+    name = "windows"
+
+    def start(self):
+        if os.name != 'nt':
+            raise IdleBackendUnavailable("GetLastInputInfo is only available on Windows")
+        import ctypes
+        from ctypes import wintypes
+
+        class LASTINPUTINFO(ctypes.Structure):
+            _fields_ = [("cbSize", wintypes.UINT), ("dwTime", wintypes.DWORD)]
+
+        self._info = LASTINPUTINFO()
+        self._info.cbSize = ctypes.sizeof(LASTINPUTINFO)
+        self._info_ref = ctypes.byref(self._info)
+        self._get_last_input_info = ctypes.windll.user32.GetLastInputInfo
+        self._get_tick_count = ctypes.windll.kernel32.GetTickCount
+        self._get_tick_count.restype = wintypes.DWORD
+
+    def idle_seconds(self):
+        if not self._get_last_input_info(self._info_ref):
+            return 0.0
+        # Both are 32-bit millisecond tick counts; the mask handles the 49.7-day wrap
+        return ((self._get_tick_count() - self._info.dwTime) & 0xFFFFFFFF) / 1000
+
+
+class X11IdleBackend(IdleBackend):
+    """The X screensaver extension's idle counter, read through libXss."""
+
+    name = "x11"
+
+    def start(self):
+        import ctypes
+        import ctypes.util
+
+        if not os.environ.get("DISPLAY"):
+            raise IdleBackendUnavailable("No X display (DISPLAY is not set)")
+        xlib_path = ctypes.util.find_library("X11")
+        xss_path = ctypes.util.find_library("Xss")
+        if not xlib_path or not xss_path:
+            raise IdleBackendUnavailable("libX11 or libXss not found")
+
+        class XScreenSaverInfo(ctypes.Structure):
+            _fields_ = [("window", ctypes.c_ulong), ("state", ctypes.c_int), ("kind", ctypes.c_int),
+                        ("til_or_since", ctypes.c_ulong), ("idle", ctypes.c_ulong),
+                        ("eventMask", ctypes.c_ulong)]
+
+        self._xlib = ctypes.cdll.LoadLibrary(xlib_path)
+        self._xss = ctypes.cdll.LoadLibrary(xss_path)
+        self._xlib.XOpenDisplay.restype = ctypes.c_void_p
+        self._xlib.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        self._xlib.XDefaultRootWindow.restype = ctypes.c_ulong
+        self._xlib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        self._xss.XScreenSaverAllocInfo.restype = ctypes.POINTER(XScreenSaverInfo)
+        self._xss.XScreenSaverQueryInfo.argtypes = [ctypes.c_void_p, ctypes.c_ulong,
+                                                     ctypes.POINTER(XScreenSaverInfo)]
+        self._xss.XScreenSaverQueryInfo.restype = ctypes.c_int
+        self._xlib.XFree.argtypes = [ctypes.c_void_p]
+        self._display = self._xlib.XOpenDisplay(None)
+        if not self._display:
+            raise IdleBackendUnavailable(f"Cannot open X display {os.environ['DISPLAY']}")
+        self._root = self._xlib.XDefaultRootWindow(self._display)
+        self._info = self._xss.XScreenSaverAllocInfo()
+        self._lock = threading.Lock()  # Xlib calls on one display must not interleave
+        if not self._xss.XScreenSaverQueryInfo(self._display, self._root, self._info):
+            self.stop()
+            raise IdleBackendUnavailable("X server lacks the MIT-SCREEN-SAVER extension")
+
+    def idle_seconds(self):
+        with self._lock:
+            self._xss.XScreenSaverQueryInfo(self._display, self._root, self._info)
+            return self._info.contents.idle / 1000
+
+    def stop(self):
+        if getattr(self, "_display", None):
+            self._xlib.XFree(self._info)
+            self._xlib.XCloseDisplay(self._display)
+            self._display = None
+
+
+class LogindIdleBackend(IdleBackend):
+    """systemd-logind's IdleHint/IdleSinceHintMonotonic for the current session.
+
+    The desktop sets the hint after its own idle delay, so this backend is
+    coarser than x11 but also works on Wayland and on text consoles.
+    """
+
+    name = "logind"
+    poll_interval = 5  # Each query runs loginctl; the hint changes rarely anyway
+
+    def start(self):
+        self._session = os.environ.get("XDG_SESSION_ID")
+        if not sys.platform.startswith("linux") or not self._session:
+            raise IdleBackendUnavailable("No logind session (XDG_SESSION_ID is not set)")
+        self._query()  # Fail now rather than on the first tick
+
+    def idle_seconds(self):
+        try:
+            return self._query()
+        except IdleBackendUnavailable as e:
+            logging.error(f"Treating the user as active: {e}")
+            return 0.0
+
+    def _query(self):
+        try:
+            result = subprocess.run(
+                ["loginctl", "show-session", self._session, "-p", "IdleHint", "-p", "IdleSinceHintMonotonic"],
+                capture_output=True, text=True, timeout=2, check=True)
+        except (OSError, subprocess.SubprocessError) as e:
+            raise IdleBackendUnavailable(f"loginctl failed: {e}")
+        properties = dict(line.split("=", 1) for line in result.stdout.splitlines() if "=" in line)
+        if properties.get("IdleHint") != "yes":
+            return 0.0
+        # CLOCK_MONOTONIC microseconds, the same clock as time.monotonic() on Linux
+        since = int(properties.get("IdleSinceHintMonotonic", "0")) / 1_000_000
+        return max(0.0, time.monotonic() - since)
+
+
+class PynputIdleBackend(IdleBackend):
+    """Global mouse/keyboard hooks feeding an ActivityRecorder; works wherever pynput does."""
+
+    name = "pynput"
+
+    def __init__(self, quantum=DEFAULT_ACTIVITY_QUANTUM, clock=time.monotonic):
+        super().__init__(clock)
+        self.recorder = ActivityRecorder(quantum, clock)
+
+    def start(self):
+        self._listeners = ()
+        if self.histogram is not None:
+            recorder = self.recorder
+            for name in ("on_move", "on_click", "on_scroll", "on_press"):
+                setattr(recorder, name, timed_handler(getattr(recorder, name), self.histogram))
+        try:
+            self._listeners = start_listeners(self.recorder)
+        except Exception as e:
+            # Headless boxes have no input devices to hook; keep monitoring the network only.
+            logging.error(f"Input listeners unavailable, continuing without them: {e}")
+
+    def stop(self):
+        if self._listeners:
+            stop_listeners(self._listeners, self.recorder)
+            self._listeners = ()
+
+    def last_activity(self):
+        return self.recorder.last_activity()
+
+    def counters(self):
+        return dict(self.recorder.counters(), backend=self.name)
+
+
+class FakeIdleBackend(IdleBackend):
+    """Idle time set by the caller, for tests and benchmarks."""
+
+    name = "fake"
+
+    def __init__(self, clock=time.monotonic):
+        super().__init__(clock)
+        self.poll_interval = 0
+        self.last_input = clock()
+
+    def touch(self, timestamp=None):
+        """Simulate user input at ``timestamp`` (default: now)."""
+        self.last_input = self.clock() if timestamp is None else timestamp
+
+    def idle_seconds(self):
+        return self.clock() - self.last_input
+
+
+class NullIdleBackend(IdleBackend):
+    """No input source: only network activity resets the timer."""
+
+    name = "none"
+
+    def __init__(self, clock=time.monotonic):
+        super().__init__(clock)
+        self._start = clock()
+
+    def last_activity(self):
+        return self._start
+
+
+_BACKEND_CLASSES = {
+    "windows": WindowsIdleBackend,
+    "x11": X11IdleBackend,
+    "logind": LogindIdleBackend,
+    "pynput": PynputIdleBackend,
+    "fake": FakeIdleBackend,
+    "none": NullIdleBackend,
+}
+
+
+def start_idle_backend(name, activity_quantum=DEFAULT_ACTIVITY_QUANTUM, histogram=None):
+    """Start the named backend; "auto" picks the cheapest available, pynput is the fallback.
+
+    ``histogram`` receives the time spent in input handlers or OS idle queries.
+    """
+    if name != "auto" and name not in _BACKEND_CLASSES:
+        raise ValueError(f"Unknown idle backend: {name}")
+    if name == "auto":
+        candidates = ["windows"] if os.name == 'nt' else ["x11", "logind"]
+    else:
+        candidates = [name]
+    if "pynput" not in candidates and name not in ("fake", "none"):
+        candidates.append("pynput")
+    for candidate in candidates:
+        if candidate == "pynput":
+            backend = PynputIdleBackend(activity_quantum)
+        else:
+            backend = _BACKEND_CLASSES[candidate]()
+        backend.histogram = histogram
+        try:
+            backend.start()
+        except (IdleBackendUnavailable, OSError, AttributeError) as e:
+            logging.info(f"Idle backend {candidate} unavailable: {e}")
+            continue
+        logging.info(f"Using idle backend: {candidate}")
+        return backend
+    raise IdleBackendUnavailable(f"No idle backend available for {name}")
@@ -0,0 +1,130 @@
+import atexit
+import gzip
+import json
+import logging
+import os
+import shutil
+import time
+
+LOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "log.txt")
+JSON_LOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "log.jsonl")
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+DEFAULT_LOG_MAX_BYTES = 5 * 1024 * 1024  # Rotate the log once it reaches this size
+DEFAULT_LOG_BACKUPS = 30  # Rotated files kept at most, so disk use stays under (backups + 1) * max bytes
+DEFAULT_LOG_RETENTION_DAYS = 28  # Rotated files older than this are deleted
+ROTATE_INTERVAL = 24 * 3600  # Also rotate daily, so each file covers at most one day (in seconds)
+
+_listener = None  # QueueListener writing records on its own thread
+_queue_handler = None  # The root logger's only handler while the listener runs
+
+
+class JsonFormatter(logging.Formatter):
+    """One compact JSON object per record, for log shippers and scripts."""
+
+    def format(self, record):
+        entry = {"ts": round(record.created, 3), "level": record.levelname, "thread": record.threadName,
+                 "msg": record.getMessage()}
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, separators=(",", ":"))
+
+
+def _make_rotating_handler(path, max_bytes, backups, retention_days, compress):
+    """File handler that appends, rotates by size or daily, and prunes old rotations."""
+    from logging.handlers import BaseRotatingHandler
+
+    class RotatingLogHandler(BaseRotatingHandler):
+        def __init__(self):
+            super().__init__(path, mode='a', encoding='utf-8', delay=True)
+            self.next_rollover = time.time() + ROTATE_INTERVAL
+            if compress:
+                self.namer = lambda name: name + ".gz"
+                self.rotator = _gzip_rotator
+
+        def shouldRollover(self, record):
+            if time.time() >= self.next_rollover:
+                return True
+            if self.stream is None:
+                self.stream = self._open()
+            return max_bytes > 0 and self.stream.tell() >= max_bytes
+
+        def doRollover(self):
+            if self.stream:
+                self.stream.close()
+                self.stream = None
+            self.next_rollover = time.time() + ROTATE_INTERVAL
+            if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename):
+                name = f"{self.baseFilename}.{time.strftime('%Y%m%d-%H%M%S')}"
+                destination, count = self.rotation_filename(name), 0
+                while os.path.exists(destination):  # Several size rotations within one second
+                    count += 1
+                    destination = self.rotation_filename(f"{name}-{count}")
+                self.rotate(self.baseFilename, destination)
+            _prune_rotations(self.baseFilename, backups, retention_days)
+
+    return RotatingLogHandler()
+
+
+def _gzip_rotator(source, destination):
+    with open(source, "rb") as f_in, gzip.open(destination, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def _prune_rotations(base, backups, retention_days):
+    """Delete rotated files beyond ``backups`` or older than ``retention_days``."""
+    directory, name = os.path.split(base)
+    rotated = sorted(((entry.stat().st_mtime, entry.path) for entry in os.scandir(directory or ".")
+                      if entry.name.startswith(name + ".") and entry.is_file()), reverse=True)
+    cutoff = time.time() - retention_days * 86400
+    for index, (modified, path) in enumerate(rotated):
+        try:
+            if index >= backups or modified < cutoff:
+                os.remove(path)
+        except OSError as e:
+            logging.getLogger(__name__).debug(f"Could not prune {path}: {e}")
+
+
+def setup_logging(log_file=LOG_FILE, max_bytes=DEFAULT_LOG_MAX_BYTES, backups=DEFAULT_LOG_BACKUPS,
+                  retention_days=DEFAULT_LOG_RETENTION_DAYS, json_file=None, compress=True):
+    """Log to ``log_file`` (and optionally JSON lines to ``json_file``) through a background writer.
+
+    Logging calls only put the record on a queue; a listener thread formats it
+    and does the file I/O, including rotation. Earlier runs' logs are kept.
+    """
+    global _listener, _queue_handler
+    import queue
+    from logging.handlers import QueueHandler, QueueListener
+
+    if _listener is not None:
+        return
+    handlers = []
+    text_handler = _make_rotating_handler(log_file, max_bytes, backups, retention_days, compress)
+    text_handler.setFormatter(logging.Formatter(LOG_FORMAT, LOG_DATE_FORMAT))
+    handlers.append(text_handler)
+    if json_file:
+        json_handler = _make_rotating_handler(json_file, max_bytes, backups, retention_days, compress)
+        json_handler.setFormatter(JsonFormatter())
+        handlers.append(json_handler)
+    records = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    _queue_handler = QueueHandler(records)
+    root.addHandler(_queue_handler)
+    _listener = QueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Write out queued records and stop the writer thread; safe to call more than once."""
+    global _listener, _queue_handler
+    listener, _listener = _listener, None
+    if listener is None:
+        return
+    logging.getLogger().removeHandler(_queue_handler)
+    _queue_handler = None
+    listener.stop()  # Drains the queue before returning
+    for handler in listener.handlers:
+        handler.close()
@@ -0,0 +1,303 @@
+import os
+import re
+import logging
+from collections import deque
+import tkinter as tk
+from tkinter import ttk
+
+CHUNK_SIZE = 64 * 1024  # Bytes read per step when paging through the log
+PAGE_LINES = 500  # Records loaded per page when opening, filtering or scrolling up
+MAX_VIEW_LINES = 5000  # Lines kept in the text widget; older ones are dropped while following
+FOLLOW_INTERVAL = 500  # How often follow mode checks the file for new lines (in milliseconds)
+LEVELS = ("ALL", "DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+
+# Matches the first line of a record as written by setup_logging
+RECORD_HEADER = re.compile(rb"^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d - ([A-Z]+) - ")
+
+
+class LogFilter:
+    """Minimum level plus a case-insensitive substring, applied to whole records."""
+
+    def __init__(self, level="ALL", text=""):
+        self.level = level
+        self.minimum = logging.getLevelName(level) if level != "ALL" else 0
+        self.text = text.lower()
+
+    def matches(self, record):
+        """``record`` is a list of lines; continuation lines (tracebacks) share the header's level."""
+        if self.minimum:
+            header = RECORD_HEADER.match(record[0].encode())
+            level = logging.getLevelName(header.group(1).decode()) if header else 0
+            if not isinstance(level, int) or level < self.minimum:
+                return False
+        return not self.text or any(self.text in line.lower() for line in record)
+
+
+class LogReader:
+    """Page through a log file from any record boundary, never reading it whole.
+
+    Records are a header line plus any continuation lines, so a traceback
+    stays with the message it belongs to. Offsets are byte positions at
+    record boundaries: ``older`` reads backwards from one in chunks, ``newer``
+    reads the complete lines written after one.
+    """
+
+    def __init__(self, path, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def end(self):
+        """Offset just past the last complete line; a line still being written is left for later."""
+        position = self.size()
+        with open(self.path, "rb") as f:
+            while position > 0:
+                start = max(0, position - self.chunk_size)
+                f.seek(start)
+                newline = f.read(position - start).rfind(b"\n")
+                if newline >= 0:
+                    return start + newline + 1
+                position = start
+        return 0
+
+    def _lines_before(self, f, offset):
+        """Yield (offset, line) for each line ending at or before ``offset``, newest first."""
+        position = offset
+        buffer = b""  # Always ends with a newline, at a line boundary
+        while position > 0:
+            start = max(0, position - self.chunk_size)
+            f.seek(start)
+            buffer = f.read(position - start) + buffer
+            position = start
+            lines = buffer.split(b"\n")
+            lines.pop()  # The empty piece after the final newline
+            # Unless this is the start of the file, the first piece continues into the previous chunk
+            head = lines.pop(0) if position > 0 else None
+            end = position + len(buffer)
+            for line in reversed(lines):
+                end -= len(line) + 1
+                yield end, line
+            buffer = head + b"\n" if head is not None else b""
+
+    def older(self, offset, count, log_filter):
+        """Up to ``count`` matching records before ``offset``, oldest first, and where the scan stopped.
+
+        Records are (offset, lines) pairs.
+        """
+        records = []
+        pending = []  # Lines of the record being assembled, newest first
+        with open(self.path, "rb") as f:
+            for start, line in self._lines_before(f, offset):
+                pending.append(line)
+                if not RECORD_HEADER.match(line) and start > 0:
+                    continue
+                record = [part.decode(errors="replace") for part in reversed(pending)]
+                pending = []
+                offset = start
+                if log_filter.matches(record):
+                    records.append((start, record))
+                    if len(records) >= count:
+                        break
+        records.reverse()
+        return records, offset
+
+    def newer(self, offset, count, log_filter):
+        """Up to ``count`` matching records written after ``offset``, and the offset to continue from."""
+        records = []
+        current = None  # (offset, lines) of the record being assembled
+        position = offset
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for line in iter(f.readline, b""):
+                if not line.endswith(b"\n"):
+                    break  # Still being written; read it whole on the next call
+                if current is None or RECORD_HEADER.match(line):
+                    if current is not None:
+                        if log_filter.matches(current[1]):
+                            records.append(current)
+                        if len(records) >= count:
+                            return records, position
+                    current = (position, [])
+                current[1].append(line[:-1].decode(errors="replace"))
+                position += len(line)
+        # Multi-line records are written in one call, so the last complete line ends its record
+        if current is not None and log_filter.matches(current[1]):
+            records.append(current)
+        return records, position
+
+
+class LogViewer:
+    """Log window that holds only a page of the file at a time.
+
+    Opening reads just the last page. Scrolling to the top or bottom loads
+    the neighbouring page and drops lines from the other end beyond
+    MAX_VIEW_LINES, and follow mode appends records as they are written.
+    Changing the filter pages backwards from the end again instead of
+    re-reading the file.
+    """
+
+    def __init__(self, root, path):
+        self.reader = LogReader(path)
+        self.filter = LogFilter()
+        self.shown = deque()  # (offset, line count) of each record in the text widget, oldest first
+        self.line_count = 0
+        self.start_offset = 0  # older() continues backwards from here
+        self.end_offset = 0  # newer() continues forwards from here
+        self._follow_job = None
+        self._loading = False
+
+        self.window = tk.Toplevel(root)
+        self.window.title("Logs")
+        self.window.geometry("750x500")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        toolbar = ttk.Frame(self.window)
+        toolbar.pack(fill="x", padx=10, pady=(10, 0))
+        ttk.Label(toolbar, text="Level:").pack(side="left")
+        self.level_var = tk.StringVar(value="ALL")
+        level_box = ttk.Combobox(toolbar, textvariable=self.level_var, values=LEVELS, width=10, state="readonly")
+        level_box.pack(side="left", padx=(5, 10))
+        level_box.bind("<<ComboboxSelected>>", lambda event: self.apply_filter())
+        ttk.Label(toolbar, text="Filter:").pack(side="left")
+        self.text_var = tk.StringVar()
+        text_entry = ttk.Entry(toolbar, textvariable=self.text_var, width=30)
+        text_entry.pack(side="left", padx=5)
+        text_entry.bind("<Return>", lambda event: self.apply_filter())
+        self.follow_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(toolbar, text="Follow", variable=self.follow_var,
+                        command=self.toggle_follow).pack(side="right")
+
+        frame = ttk.Frame(self.window)
+        frame.pack(fill="both", expand=True, padx=10, pady=10)
+        self.scrollbar = ttk.Scrollbar(frame, orient="vertical")
+        self.text = tk.Text(frame, wrap="word", font=("Arial", 10), yscrollcommand=self.on_scroll)
+        self.scrollbar.config(command=self.text.yview)
+        self.scrollbar.pack(side="right", fill="y")
+        self.text.pack(side="left", fill="both", expand=True)
+
+        self.load_tail()
+        self.poll()
+
+    def load_tail(self):
+        """Show the last page of matching records."""
+        self.end_offset = self.reader.end()
+        records, self.start_offset = self.reader.older(self.end_offset, PAGE_LINES, self.filter)
+        self.text.config(state="normal")
+        self.text.delete("1.0", "end")
+        self.shown.clear()
+        self.line_count = 0
+        self._insert(records, "end")
+        self.text.config(state="disabled")
+        self.text.see("end")
+
+    def load_older(self):
+        """Prepend the page before the oldest record shown, keeping the view in place."""
+        self._loading = False
+        if self.start_offset <= 0:
+            return
+        records, self.start_offset = self.reader.older(self.start_offset, PAGE_LINES, self.filter)
+        self.text.config(state="normal")
+        added = self._insert(records, "1.0")
+        if self._trim_newest():
+            self.follow_var.set(False)  # The tail is no longer loaded
+            self.toggle_follow()
+        self.text.config(state="disabled")
+        self.text.yview(f"{added + 1}.0")
+
+    def load_newer(self):
+        """Append the page after the newest record shown (when not following)."""
+        self._loading = False
+        records, self.end_offset = self.reader.newer(self.end_offset, PAGE_LINES, self.filter)
+        if records:
+            self.text.config(state="normal")
+            self._insert(records, "end")
+            self._trim_oldest()
+            self.text.config(state="disabled")
+
+    def poll(self):
+        """Append records written since the last poll, scrolling along if the view is at the bottom."""
+        self._follow_job = None
+        try:
+            if self.reader.size() < self.end_offset:
+                self.load_tail()  # Truncated or rotated: show the new file
+            at_bottom = self.text.yview()[1] >= 1.0
+            self.load_newer()
+            if at_bottom:
+                self.text.see("end")
+        except OSError as e:
+            logging.error(f"Error reading log file: {e}")
+        if self.follow_var.get():
+            self._follow_job = self.window.after(FOLLOW_INTERVAL, self.poll)
+
+    def _insert(self, records, index):
+        """Insert (offset, lines) records at "1.0" or "end"; returns the number of lines added."""
+        if not records:
+            return 0
+        lines = [line for _, record in records for line in record]
+        self.text.insert(index, "\n".join(lines) + "\n")
+        self.line_count += len(lines)
+        entries = [(offset, len(record)) for offset, record in records]
+        if index == "end":
+            self.shown.extend(entries)
+        else:
+            self.shown.extendleft(reversed(entries))
+        return len(lines)
+
+    def _trim_oldest(self):
+        """Drop the oldest records beyond MAX_VIEW_LINES; scrolling up reloads them."""
+        removed = 0
+        while self.line_count - removed > MAX_VIEW_LINES and len(self.shown) > 1:
+            removed += self.shown.popleft()[1]
+        if removed:
+            self.text.delete("1.0", f"{removed + 1}.0")
+            self.line_count -= removed
+            self.start_offset = self.shown[0][0]
+        return removed
+
+    def _trim_newest(self):
+        """Drop the newest records beyond MAX_VIEW_LINES; scrolling down reloads them."""
+        removed = 0
+        while self.line_count - removed > MAX_VIEW_LINES and len(self.shown) > 1:
+            offset, count = self.shown.pop()
+            removed += count
+            self.end_offset = offset
+        if removed:
+            self.text.delete(f"{self.line_count - removed + 1}.0", "end")
+            self.line_count -= removed
+        return removed
+
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if self._loading:
+            return
+        # Defer the load so the text does not change inside Tk's own scroll callback
+        if float(first) <= 0.0 and self.start_offset > 0:
+            self._loading = True
+            self.window.after_idle(self.load_older)
+        elif float(last) >= 1.0 and not self.follow_var.get() and self.end_offset < self.reader.size():
+            self._loading = True
+            self.window.after_idle(self.load_newer)
+
+    def apply_filter(self):
+        self.filter = LogFilter(self.level_var.get(), self.text_var.get())
+        self.load_tail()
+
+    def toggle_follow(self):
+        if self.follow_var.get():
+            if self._follow_job is None:
+                self.load_tail()
+                self.poll()
+        elif self._follow_job is not None:
+            self.window.after_cancel(self._follow_job)
+            self._follow_job = None
+
+    def close(self):
+        if self._follow_job is not None:
+            self.window.after_cancel(self._follow_job)
+            self._follow_job = None
+        self.window.destroy()
@@ -1,572 +1,229 @@
-import time
-import psutil
-import ctypes
-import threading
-import tkinter as tk
-from tkinter import ttk, messagebox
+import argparse
+import os
+import signal
 import traceback
-from pynput import mouse, keyboard
-import ttkbootstrap as tb
 import logging
-import os
-from datetime import datetime
-from PIL import Image, ImageDraw, ImageTk
-import math
-
-# Configure logging
-log_dir = os.path.dirname(os.path.abspath(__file__))
-log_file = os.path.join(log_dir, "log.txt")
-logging.basicConfig(
-    filename=log_file,
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
-
-# Clear the log file at the start of the application
-with open(log_file, 'w') as f:
-    f.truncate(0)
-
-# Log application start
-logging.info("=" * 50)
-logging.info("Application started")
-logging.info("=" * 50)
-
-# Windows API for sleep prevention
-ES_CONTINUOUS = 0x80000000
-ES_SYSTEM_REQUIRED = 0x00000001
-SetThreadExecutionState = ctypes.windll.kernel32.SetThreadExecutionState
-
-# Constants
-CHECK_INTERVAL = 1  # Interval to check network speed (in seconds)
-TIMER_REFRESH_INTERVAL = 500  # GUI timer refresh interval (in milliseconds)
-DEFAULT_SPEED_THRESHOLD = 10  # Default threshold in Mbps
-DEFAULT_INACTIVITY_LIMIT = 60  # Default inactivity time in seconds (1 minutes)
-
-# Global Variables
-last_activity_time = time.time()
-download_speed = 0  # Network speed in Mbps
-upload_speed = 0  # Upload speed in Mbps
-monitoring_active = False  # Flag to control monitoring
-lock = threading.Lock()  # Thread lock to prevent race conditions
-stop_event = threading.Event()  # Event to signal threads to stop
-
-# Log configuration settings
-logging.info(f"Configuration: CHECK_INTERVAL={CHECK_INTERVAL}s, DEFAULT_SPEED_THRESHOLD={DEFAULT_SPEED_THRESHOLD}Mbps, DEFAULT_INACTIVITY_LIMIT={DEFAULT_INACTIVITY_LIMIT}s")
-
-def get_network_speed():
-    """Measure download and upload speed in Mbps."""
-    global download_speed, upload_speed
-    logging.info("Network speed monitoring thread started")
-    while not stop_event.is_set():
-        try:
-            old_bytes_down = psutil.net_io_counters().bytes_recv
-            old_bytes_up = psutil.net_io_counters().bytes_sent
-            time.sleep(CHECK_INTERVAL)
-            new_bytes_down = psutil.net_io_counters().bytes_recv
-            new_bytes_up = psutil.net_io_counters().bytes_sent
-            with lock:
-                download_speed = ((new_bytes_down - old_bytes_down) * 8) / (CHECK_INTERVAL * 1_000_000)  # Convert to Mbps
-                upload_speed = ((new_bytes_up - old_bytes_up) * 8) / (CHECK_INTERVAL * 1_000_000)  # Convert to Mbps
-                logging.debug(f"Current speeds - Download: {download_speed:.2f} Mbps, Upload: {upload_speed:.2f} Mbps")
-        except Exception as e:
-            error_msg = f"Error in get_network_speed: {e}"
-            logging.error(error_msg)
-            logging.error(traceback.format_exc())
-
-def on_activity(event=None):
-    """Reset inactivity timer on mouse/keyboard activity."""
-    global last_activity_time
-    with lock:
-        last_activity_time = time.time()
-        logging.debug(f"User activity detected, reset timer at {datetime.fromtimestamp(last_activity_time).strftime('%H:%M:%S')}")
-
-def start_listeners():
-    """Start mouse and keyboard listeners in a separate thread."""
-    logging.info("Starting mouse and keyboard listeners")
-    mouse_listener = mouse.Listener(on_move=on_activity, on_click=on_activity, on_scroll=on_activity)
-    keyboard_listener = keyboard.Listener(on_press=on_activity)
-    mouse_listener.start()
-    keyboard_listener.start()
-    while not stop_event.is_set():
-        time.sleep(1)  # Keep the thread alive
-    logging.info("Stopping mouse and keyboard listeners")
-    mouse_listener.stop()
-    keyboard_listener.stop()
-    logging.info("Mouse and keyboard listeners stopped")
-
-def force_system_sleep():
-    """Force the system to go to sleep and stop the application."""
-    global monitoring_active
-    logging.info("Forcing system to sleep and stopping the application.")
-
+from engine import (CHECK_INTERVAL, DEFAULT_SPEED_THRESHOLD, DEFAULT_INACTIVITY_LIMIT, DEFAULT_EXCLUDE_INTERFACES,
+                    DEFAULT_MAX_SAMPLE_INTERVAL, DEFAULT_EXPIRY_ACCURACY)
+from activity import DEFAULT_ACTIVITY_QUANTUM
+from idle import IDLE_BACKENDS
+from power import POWER_BACKENDS
+from decision import DEFAULT_DECISION_WINDOW, DEFAULT_RELEASE_RATIO, DEFAULT_ENGAGE_HOLD, DEFAULT_RELEASE_HOLD
+from metrics import DEFAULT_METRICS_ADDRESS, DEFAULT_TEXTFILE_INTERVAL
+from logs import (setup_logging, JSON_LOG_FILE, DEFAULT_LOG_MAX_BYTES, DEFAULT_LOG_BACKUPS,
+                  DEFAULT_LOG_RETENTION_DAYS)
+
+# Heavy and platform-specific modules (tkinter/ttkbootstrap, psutil, pynput, ctypes)
+# are imported by the mode that needs them, so `ctl` and `--help` start instantly.
+
+
+def add_interface_arguments(parser, default_exclude):
+    """Add the repeatable --include-iface/--exclude-iface pattern options."""
+    parser.add_argument("--include-iface", action="append", metavar="PATTERN", dest="include_interfaces",
+                        help="Only count interfaces matching this shell pattern (repeatable; default: all)")
+    parser.add_argument("--exclude-iface", action="append", metavar="PATTERN", dest="exclude_interfaces",
+                        help="Ignore interfaces matching this shell pattern (repeatable; replaces the default "
+                             f"list{': ' + ' '.join(default_exclude) if default_exclude else ''})")
+
+
+def add_metrics_arguments(parser):
+    """Add the Prometheus endpoint and textfile options."""
+    parser.add_argument("--metrics-port", type=int,
+                        help="Serve Prometheus metrics on http://ADDRESS:PORT/metrics")
+    parser.add_argument("--metrics-address", default=DEFAULT_METRICS_ADDRESS,
+                        help="Address the metrics endpoint listens on (default: %(default)s)")
+    parser.add_argument("--metrics-textfile", metavar="PATH",
+                        help="Also write the metrics to PATH for node-exporter's textfile collector")
+    parser.add_argument("--metrics-interval", type=float, default=DEFAULT_TEXTFILE_INTERVAL,
+                        help="Seconds between textfile rewrites (default: %(default)s)")
+
+
+def start_metrics(engine, args):
+    """Serve or write ``engine``'s metrics as the options ask; returns the MetricsServer, if any."""
+    metrics_server = None
+    if getattr(args, "metrics_port", None) is not None:
+        from metrics import MetricsServer
+        metrics_server = MetricsServer(engine, args.metrics_port, args.metrics_address)
+        metrics_server.start()
+    if getattr(args, "metrics_textfile", None):
+        from metrics import write_textfile
+        engine.scheduler.every(args.metrics_interval,
+                               lambda now: write_textfile(engine, args.metrics_textfile), "textfile")
+    return metrics_server
+
+
+def process_traffic_rule(text):
+    """Parse a PATTERN=MBPS --process-traffic value."""
+    pattern, _, threshold = text.rpartition("=")
     try:
-        # Stop monitoring and cleanup resources
-        monitoring_active = False
-        stop_event.set()
-        SetThreadExecutionState(ES_CONTINUOUS)  # Reset system execution state
-
-        # Force the system to sleep
-        if os.name == 'nt':  # Windows
-            os.system('rundll32.exe powrprof.dll,SetSuspendState 0,1,0')
-        else:  # Linux/Unix
-            os.system('systemctl suspend')
-
-        # Exit the application
-        logging.info("Application is stopping.")
-        os._exit(0)  # Forcefully exit the application
-    except Exception as e:
-        logging.error(f"Error forcing sleep: {e}")
-        logging.error(traceback.format_exc())
-
-# GUI Class
-class NetworkMonitorGUI:
-    def __init__(self, root):
-        logging.info("Initializing GUI")
-        self.root = root
-        self.root.title("Sleep Sentinel")
-        self.root.geometry("800x620")
-        self.root.style.theme_use("superhero")  # Use a modern theme
-
-        # Create main container with padding
-        self.main_container = tb.Frame(root, padding=20)
-        self.main_container.pack(fill="both", expand=True)
-
-        # Header Section
-        self.header_frame = tb.Frame(self.main_container)
-        self.header_frame.pack(fill="x", pady=(0, 10))
-
-        self.title_label = tb.Label(
-            self.header_frame,
-            text="Sleep Sentinel",
-            font=("Arial", 28, "bold"),
-            bootstyle="primary"
-        )
-        self.title_label.pack(side="left")
-
-        # Define a style for the buttons
-        style = tb.Style()
-        style.configure('Custom.TButton', font=('Arial', 13))
-
-        # Ensure consistent button style across themes
-        self.root.style.configure('TButton', font=('Arial', 13))
-
-        # Help Button
-        self.help_button = tb.Button(
-            self.header_frame,
-            text="Help",
-            command=self.show_help,
-            bootstyle="info",
-            padding=(10, 5),
-            style='Custom.TButton'  # Apply custom style
-        )
-        self.help_button.pack(side="right", padx=10)
-
-        # View Logs Button
-        self.logs_button = tb.Button(
-            self.header_frame,
-            text="View Logs",
-            command=self.view_logs,
-            bootstyle="info",
-            padding=(10, 5),
-            style='Custom.TButton'  # Apply custom style
-        )
-        self.logs_button.pack(side="right", padx=10)
-
-        # Ensure consistent button style across themes
-        self.root.style.configure('Custom.TButton', font=('Arial', 10))  # Set font size for both buttons
-
-        # Dark/Light Mode Toggle
-        self.mode_toggle_frame = tb.Frame(self.header_frame)
-        self.mode_toggle_frame.pack(side="right", padx=10, pady=(10, 0))
-
-        self.mode_label = tb.Label(
-            self.mode_toggle_frame,
-            text="🌙 Dark Mode",
-            font=("Arial", 13)
-        )
-        self.mode_label.pack(side="left")
-
-        self.mode_toggle = tb.Checkbutton(
-            self.mode_toggle_frame,
-            bootstyle="round-toggle",
-            command=self.toggle_dark_mode
-        )
-        self.mode_toggle.pack(side="right")
-
-        # Settings Section
-        self.settings_frame = tb.LabelFrame(
-            self.main_container,
-            text="Settings",
-            padding=15,
-            bootstyle="primary"
-        )
-        self.settings_frame.pack(fill="x", pady=(0, 10))
-
-        # Timer Input
-        self.timer_frame = tb.Frame(self.settings_frame)
-        self.timer_frame.pack(fill="x", pady=5)
-
-        self.timer_input_label = tb.Label(
-            self.timer_frame,
-            text="Inactivity Timer (sec):",
-            font=("Arial", 12, "bold")
-        )
-        self.timer_input_label.pack(side="left")
-
-        self.timer_entry = tb.Entry(
-            self.timer_frame,
-            font=("Arial", 13),
-            width=10
-        )
-        self.timer_entry.insert(0, str(DEFAULT_INACTIVITY_LIMIT))
-        self.timer_entry.pack(side="right")
-
-        # Download Threshold
-        self.download_frame = tb.Frame(self.settings_frame)
-        self.download_frame.pack(fill="x", pady=5)
-
-        self.download_threshold_label = tb.Label(
-            self.download_frame,
-            text="Download Threshold (Mbps):",
-            font=("Arial", 12, "bold")
-        )
-        self.download_threshold_label.pack(side="left")
-
-        self.download_threshold_entry = tb.Entry(
-            self.download_frame,
-            font=("Arial", 13),
-            width=10
-        )
-        self.download_threshold_entry.insert(0, str(DEFAULT_SPEED_THRESHOLD))
-        self.download_threshold_entry.pack(side="right")
-
-        # Upload Threshold
-        self.upload_frame = tb.Frame(self.settings_frame)
-        self.upload_frame.pack(fill="x", pady=5)
-
-        self.upload_threshold_label = tb.Label(
-            self.upload_frame,
-            text="Upload Threshold (Mbps):",
-            font=("Arial", 12, "bold")
-        )
-        self.upload_threshold_label.pack(side="left")
-
-        self.upload_threshold_entry = tb.Entry(
-            self.upload_frame,
-            font=("Arial", 13),
-            width=10
-        )
-        self.upload_threshold_entry.insert(0, str(DEFAULT_SPEED_THRESHOLD))
-        self.upload_threshold_entry.pack(side="right")
-
-        # Status Section
-        self.status_frame = tb.LabelFrame(
-            self.main_container,
-            text="Monitoring Status",
-            padding=10,
-            bootstyle="primary"
-        )
-        self.status_frame.pack(fill="x", pady=(0, 5))
-
-        # Network Speed Meters
-        self.speed_frame = tb.Frame(self.status_frame)
-        self.speed_frame.pack(fill="x", pady=(0, 10))
-
-        # Download Speed Meter
-        self.download_meter_frame = tb.Frame(self.speed_frame)
-        self.download_meter_frame.pack(side="left", expand=True, fill="x", padx=5)
-
-        self.download_label = tb.Label(
-            self.download_meter_frame,
-            text="Download Speed",
-            font=("Arial", 12, "bold")
-        )
-        self.download_label.pack()
-
-        self.download_speed_label = tb.Label(
-            self.download_meter_frame,
-            text="0 Mbps",
-            font=("Arial", 16)
-        )
-        self.download_speed_label.pack()
-
-        self.download_meter = ttk.Progressbar(
-            self.download_meter_frame,
-            length=200,
-            mode="determinate",
-            style="success.Horizontal.TProgressbar"
-        )
-        self.download_meter.pack(pady=5)
-
-        # Upload Speed Meter
-        self.upload_meter_frame = tb.Frame(self.speed_frame)
-        self.upload_meter_frame.pack(side="right", expand=True, fill="x", padx=5)
-
-        self.upload_label = tb.Label(
-            self.upload_meter_frame,
-            text="Upload Speed",
-            font=("Arial", 12, "bold")
-        )
-        self.upload_label.pack()
-
-        self.upload_speed_label = tb.Label(
-            self.upload_meter_frame,
-            text="0 Mbps",
-            font=("Arial", 16)
-        )
-        self.upload_speed_label.pack()
-
-        self.upload_meter = ttk.Progressbar(
-            self.upload_meter_frame,
-            length=200,
-            mode="determinate",
-            style="info.Horizontal.TProgressbar"
-        )
-        self.upload_meter.pack(pady=5)
-
-        # Timer Section
-        self.timer_display_frame = tb.Frame(self.status_frame)
-        self.timer_display_frame.pack(fill="x", pady=10)
-
-        self.timer_label = tb.Label(
-            self.timer_display_frame,
-            text="Time Until Sleep",
-            font=("Arial", 12, "bold")
-        )
-        self.timer_label.pack()
-
-        self.time_remaining_label = tb.Label(
-            self.timer_display_frame,
-            text="--",
-            font=("Arial", 24, "bold")
-        )
-        self.time_remaining_label.pack()
-
-        self.timer_progress = ttk.Progressbar(
-            self.timer_display_frame,
-            orient="horizontal",
-            length=400,
-            mode="determinate",
-            style="primary.Horizontal.TProgressbar"
-        )
-        self.timer_progress.pack(pady=5)
-
-        # Status Message
-        self.status_label = tb.Label(
-            self.status_frame,
-            text="Status: Waiting to start...",
-            font=("Arial", 13),
-            bootstyle="info"
-        )
-        self.status_label.pack(pady=10)
-
-        # Control Button
-        self.toggle_button = tk.Button(
-            self.main_container,
-            text="Start",
-            command=self.toggle_monitoring,
-            font=("Arial", 16),  # Match text size with 'Upload Speed'
-            bg="#28a745",  # Success color
-            fg="white",
-            relief="flat",
-            highlightthickness=0,
-            bd=0,
-            padx=20,
-            pady=10  # Add padding for rounded effect
-        )
-        self.toggle_button.pack(pady=10, side="bottom", anchor="center")
-        self.toggle_button.config(highlightbackground="#28a745", highlightcolor="#28a745")
-
-        # Set initial button color to green
-        self.toggle_button.config(bg="#28a745")
-
-        # Start background processes
-        threading.Thread(target=get_network_speed, daemon=True).start()
-        threading.Thread(target=start_listeners, daemon=True).start()
-        self.update_timer()
-
-    def show_help(self):
-        """Display help information."""
-        messagebox.showinfo(
-            "Help",
-            "Sleep Sentinel monitors network activity and prevents your system from sleeping.\n\n"
-            "1. Set the inactivity timer (in seconds).\n"
-            "2. Set download/upload speed thresholds (in Mbps).\n"
-            "3. Start monitoring to keep your system awake during active network usage.\n\n"
-            "Note: The system will sleep if both network speeds are below the thresholds and the timer expires."
-        )
-
-    def view_logs(self):
-        """Open the log file in a new window."""
-        try:
-            with open(log_file, "r") as f:
-                logs = f.read()
-            log_window = tk.Toplevel(self.root)
-            log_window.title("Logs")
-            log_window.geometry("750x500")  # Set window size to 800x600
-            log_text = tk.Text(log_window, wrap="word", font=("Arial", 10))
-            log_text.insert("1.0", logs)
-            log_text.config(state="disabled")
-            log_text.pack(fill="both", expand=True, padx=10, pady=10)
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to open logs: {e}")
-
-    def monitor_network(self):
-        """Monitor network speed and inactivity, preventing sleep if conditions are met."""
-        global monitoring_active, last_activity_time
-        logging.info(f"Network monitoring thread started with thresholds - Download: {self.download_threshold} Mbps, Upload: {self.upload_threshold} Mbps")
-        while monitoring_active and not stop_event.is_set():
-            with lock:
-                inactivity_duration = time.time() - last_activity_time
-                # Reset timer if either download or upload speed exceeds threshold
-                if download_speed >= self.download_threshold or upload_speed >= self.upload_threshold:
-                    last_activity_time = time.time()
-                    logging.info(f"Timer reset due to high network activity - Download: {download_speed:.2f} Mbps, Upload: {upload_speed:.2f} Mbps")
-                
-                # Check if timer has run out and both speeds are below thresholds
-                if (inactivity_duration >= self.inactivity_limit and 
-                    download_speed < self.download_threshold and 
-                    upload_speed < self.upload_threshold):
-                    logging.info(f"Timer expired - Inactivity: {inactivity_duration:.1f}s, Download: {download_speed:.2f} Mbps, Upload: {upload_speed:.2f} Mbps")
-                    self.status_label.config(text="Status: Timer expired. System going to sleep...", bootstyle="warning")
-                    self.root.update()
-                    time.sleep(2)
-                    force_system_sleep()
-                    break
-            
-            time.sleep(1)
-        logging.info("Network monitoring thread stopped")
-
-    def validate_inputs(self):
-        """Validate user inputs for inactivity timer and speed thresholds."""
-        try:
-            inactivity_limit = int(self.timer_entry.get())
-            download_threshold = float(self.download_threshold_entry.get())
-            upload_threshold = float(self.upload_threshold_entry.get())
-
-            if inactivity_limit <= 0 or download_threshold < 0 or upload_threshold < 0:
-                raise ValueError("Values must be positive.")
-
-            return True
-        except ValueError as e:
-            error_msg = f"Invalid input: {str(e)}"
-            logging.error(error_msg)
-            messagebox.showerror("Invalid Input", "Please enter valid positive numbers.")
-            return False
-
-
-
-
-
-
-
-
-    def toggle_monitoring(self):
-        """Toggle monitoring on and off."""
-        global monitoring_active, last_activity_time
-        try:
-            if monitoring_active:
-                monitoring_active = False
-                SetThreadExecutionState(ES_CONTINUOUS)  # Reset execution state
-                self.toggle_button.config(text="Start", bg="#28a745")
-                self.status_label.config(text="Status: Stopped.", bootstyle="danger")
-                logging.info("Monitoring stopped by user")
-            else:
-                if not self.validate_inputs():
-                    return
-
-                self.inactivity_limit = int(self.timer_entry.get())
-                self.download_threshold = float(self.download_threshold_entry.get())
-                self.upload_threshold = float(self.upload_threshold_entry.get())
-                logging.info(f"Starting monitoring with settings - Inactivity: {self.inactivity_limit}s, "
-                           f"Download threshold: {self.download_threshold} Mbps, "
-                           f"Upload threshold: {self.upload_threshold} Mbps")
-                monitoring_active = True
-                with lock:
-                    last_activity_time = time.time()
-                    logging.info(f"Reset activity timer to {datetime.fromtimestamp(last_activity_time).strftime('%Y-%m-%d %H:%M:%S')}")
-                self.toggle_button.config(text="Stop", bg="#dc3545")
-                self.status_label.config(text="Status: Monitoring...", bootstyle="info")
-                threading.Thread(target=self.monitor_network, daemon=True).start()
-        except ValueError as e:
-            error_msg = f"Invalid input values: {str(e)}"
-            logging.error(error_msg)
-            self.timer_entry.delete(0, tk.END)
-            self.timer_entry.insert(0, str(DEFAULT_INACTIVITY_LIMIT))
-            self.download_threshold_entry.delete(0, tk.END)
-            self.download_threshold_entry.insert(0, str(DEFAULT_SPEED_THRESHOLD))
-            self.upload_threshold_entry.delete(0, tk.END)
-            self.upload_threshold_entry.insert(0, str(DEFAULT_SPEED_THRESHOLD))
-            self.status_label.config(text="Invalid input! Using default values.", bootstyle="warning")
-            logging.info(f"Reset to default values - Inactivity limit: {DEFAULT_INACTIVITY_LIMIT}s, Download threshold: {DEFAULT_SPEED_THRESHOLD} Mbps, Upload threshold: {DEFAULT_SPEED_THRESHOLD} Mbps")
-        except Exception as e:
-            error_msg = f"Error in toggle_monitoring: {str(e)}"
-            logging.error(error_msg)
-            logging.error(traceback.format_exc())
-            self.status_label.config(text=f"Error: {str(e)}", bootstyle="danger")
-
-    def update_timer(self):
-        """Update the countdown timer and speed meters in real-time."""
-        if monitoring_active:
-            with lock:
-                inactivity_duration = time.time() - last_activity_time
-            time_remaining = max(0, self.inactivity_limit - inactivity_duration)
-            minutes = int(time_remaining) // 60
-            seconds = int(time_remaining) % 60
-            self.time_remaining_label.config(text=f"{minutes:02d}:{seconds:02d}")
-            self.timer_progress["value"] = (time_remaining / self.inactivity_limit) * 100
-
-            # Dynamically scale progress bars based on observed speeds
-            max_speed = max(download_speed, upload_speed, 100)  # Ensure minimum range of 100 Mbps
-            self.download_speed_label.config(text=f"{download_speed:.1f} Mbps")
-            self.upload_speed_label.config(text=f"{upload_speed:.1f} Mbps")
-            self.download_meter["maximum"] = max_speed
-            self.upload_meter["maximum"] = max_speed
-            self.download_meter["value"] = download_speed
-            self.upload_meter["value"] = upload_speed
-        else:
-            self.time_remaining_label.config(text="--:--")
-            self.timer_progress["value"] = 0
-            self.download_meter["value"] = 0
-            self.upload_meter["value"] = 0
-            self.download_speed_label.config(text="0 Mbps")
-            self.upload_speed_label.config(text="0 Mbps")
-        self.root.after(TIMER_REFRESH_INTERVAL, self.update_timer)
-
-    def toggle_dark_mode(self):
-        """Toggle between light and dark mode."""
-        if self.root.style.theme_use() == "superhero":
-            self.root.style.theme_use("flatly")
-            self.root.configure(bg="#7D8B92")  # Set light mode to a slightly grey background
-            self.mode_label.config(text="☀️ Light Mode")
-            if monitoring_active:
-                self.toggle_button.config(bg="#dc3545")  # Ensure Stop button remains red when active
-            else:
-                self.toggle_button.config(bg="#28a745")  # Ensure Start button remains green when inactive
-        else:
-            self.root.style.theme_use("superhero")
-            self.root.configure(bg="#2b2b2b")  # Ensure dark mode has a dark background
-            self.mode_label.config(text="🌙 Dark Mode")
-            if monitoring_active:
-                self.toggle_button.config(bg="#dc3545")  # Ensure Stop button remains red when active
-            else:
-                self.toggle_button.config(bg="#28a745")  # Ensure Start button remains green when inactive
-
-
-    def cleanup(self):
-        """Clean up resources and stop all threads."""
-        global monitoring_active
-        logging.info("Starting application cleanup.")
-        monitoring_active = False  # Stop the monitoring thread
-        stop_event.set()  # Signal all threads to stop
-        SetThreadExecutionState(ES_CONTINUOUS)  # Reset system execution state
-        logging.info("Application cleanup complete.")
-
-# Start GUI
-if __name__ == "__main__":
+        threshold = float(threshold)
+    except ValueError:
+        threshold = None
+    if not pattern or threshold is None or threshold <= 0:
+        raise argparse.ArgumentTypeError(f"expected PATTERN=MBPS with a positive rate, got {text!r}")
+    return pattern, threshold
+
+
+def parse_args(argv=None):
+    """Parse the command line; without a subcommand the GUI is started."""
+    parser = argparse.ArgumentParser(description="Keep the system awake while it is in use and put it to sleep when idle.")
+    parser.add_argument("--socket",
+                        help="Control socket path or host:port (default: a per-user socket in $XDG_RUNTIME_DIR, 127.0.0.1:47800 on Windows)")
+    parser.add_argument("--log-max-bytes", type=int, default=DEFAULT_LOG_MAX_BYTES,
+                        help="Rotate log.txt when it reaches this size; it is also rotated daily (default: %(default)s)")
+    parser.add_argument("--log-backups", type=int, default=DEFAULT_LOG_BACKUPS,
+                        help="Number of rotated (gzipped) logs to keep (default: %(default)s)")
+    parser.add_argument("--log-retention-days", type=float, default=DEFAULT_LOG_RETENTION_DAYS,
+                        help="Delete rotated logs older than this many days (default: %(default)s)")
+    parser.add_argument("--log-json", nargs="?", const=JSON_LOG_FILE, metavar="PATH",
+                        help=f"Also write JSON lines, to PATH or {os.path.basename(JSON_LOG_FILE)}")
+    subparsers = parser.add_subparsers(dest="command")
+
+    gui_parser = subparsers.add_parser("gui", help="Open the window (default)")
+    gui_parser.add_argument("--connect", action="store_true",
+                            help="Attach to a running daemon instead of starting an engine in-process")
+    gui_parser.add_argument("--tray", action="store_true",
+                            help="Start as the small indicator; click it to open the window")
+    add_metrics_arguments(gui_parser)  # In-process engine only; with --connect, ask the daemon instead
+
+    daemon_parser = subparsers.add_parser("daemon", help="Run the engine headless with a control socket")
+    daemon_parser.add_argument("--inactivity", type=int, default=DEFAULT_INACTIVITY_LIMIT,
+                               help="Inactivity limit in seconds (default: %(default)s)")
+    daemon_parser.add_argument("--download-threshold", type=float, default=DEFAULT_SPEED_THRESHOLD,
+                               help="Download threshold in Mbps (default: %(default)s)")
+    daemon_parser.add_argument("--upload-threshold", type=float, default=DEFAULT_SPEED_THRESHOLD,
+                               help="Upload threshold in Mbps (default: %(default)s)")
+    add_interface_arguments(daemon_parser, DEFAULT_EXCLUDE_INTERFACES)
+    daemon_parser.add_argument("--activity-quantum", type=float, default=DEFAULT_ACTIVITY_QUANTUM,
+                               help="Record mouse/keyboard activity at most once per this many seconds (default: %(default)s)")
+    daemon_parser.add_argument("--burst-interval", type=float,
+                               help="Also sample every this many seconds (e.g. 0.25) to catch short bursts")
+    daemon_parser.add_argument("--max-sample-interval", type=float, default=DEFAULT_MAX_SAMPLE_INTERVAL,
+                               help="Slowest sampling interval while traffic is far below the thresholds and the "
+                                    "timer far from expiry; use the tick interval to disable back-off (default: %(default)s)")
+    daemon_parser.add_argument("--expiry-accuracy", type=float, default=DEFAULT_EXPIRY_ACCURACY,
+                               help="Maximum age in seconds of the network sample the sleep decision uses (default: %(default)s)")
+    daemon_parser.add_argument("--window", type=float, default=DEFAULT_DECISION_WINDOW,
+                               help="Seconds of samples averaged before comparing with a threshold (default: %(default)s)")
+    daemon_parser.add_argument("--release-ratio", type=float, default=DEFAULT_RELEASE_RATIO,
+                               help="Release threshold as a fraction of the threshold (default: %(default)s)")
+    daemon_parser.add_argument("--engage-hold", type=float, default=DEFAULT_ENGAGE_HOLD,
+                               help="Seconds above the threshold before network activity keeps the system awake (default: %(default)s)")
+    daemon_parser.add_argument("--release-hold", type=float, default=DEFAULT_RELEASE_HOLD,
+                               help="Seconds below the release threshold before it stops doing so (default: %(default)s)")
+    add_metrics_arguments(daemon_parser)
+    daemon_parser.add_argument("--trace", metavar="PATH",
+                               help="Append raw counters, input times and decisions to a binary trace for replay")
+    daemon_parser.add_argument("--cpu-threshold", type=float, metavar="PERCENT",
+                               help="Stay awake while system CPU use averages at least this (default: off)")
+    daemon_parser.add_argument("--disk-threshold", type=float, metavar="MBPS",
+                               help="Stay awake while disk reads plus writes average at least this many MB/s (default: off)")
+    daemon_parser.add_argument("--keep-awake-process", action="append", metavar="PATTERN", dest="keep_awake_processes",
+                               help="Stay awake while a process whose name matches this shell pattern runs (repeatable)")
+    daemon_parser.add_argument("--process-traffic", action="append", type=process_traffic_rule, metavar="PATTERN=MBPS",
+                               help="Stay awake while processes whose name matches PATTERN move at least MBPS "
+                                    "over TCP, download plus upload (repeatable; Linux)")
+    daemon_parser.add_argument("--report-to", metavar="ADDRESS",
+                               help="Stream status updates to a fleet aggregator (host:port or Unix socket path)")
+    daemon_parser.add_argument("--report-interval", type=float,
+                               help="Seconds between status checks for the aggregator (default: 5)")
+    daemon_parser.add_argument("--report-host", help="Name to report this host as (default: the hostname)")
+    daemon_parser.add_argument("--start", action="store_true", help="Begin monitoring immediately")
+    daemon_parser.add_argument("--idle-backend", choices=IDLE_BACKENDS, default="auto",
+                               help="Where user idle time comes from: the OS idle timer (windows, x11, logind) "
+                                    "or global input hooks (pynput); auto tries the OS first (default: %(default)s)")
+    daemon_parser.add_argument("--power-backend", choices=POWER_BACKENDS, default="auto",
+                               help="How sleep is inhibited while active and started when idle: a logind inhibitor "
+                                    "and Suspend call, a Windows power request and SetSuspendState, or none to only "
+                                    "log decisions; auto picks the platform's own (default: %(default)s)")
+    daemon_parser.add_argument("--no-input", action="store_const", const="none", dest="idle_backend",
+                               help="Ignore user input entirely (network activity only); same as --idle-backend none")
+
+    ctl_parser = subparsers.add_parser("ctl", help="Send a command to a running daemon")
+    ctl_parser.add_argument("action", choices=("start", "stop", "status", "profile-start", "profile-stop",
+                                               "profile-status"))
+    ctl_parser.add_argument("--inactivity", type=int)
+    ctl_parser.add_argument("--download-threshold", type=float)
+    ctl_parser.add_argument("--upload-threshold", type=float)
+    add_interface_arguments(ctl_parser, None)
+    ctl_parser.add_argument("--stacks", action="store_true", help="With profile-start, also sample thread stacks")
+    ctl_parser.add_argument("--output", metavar="PATH",
+                            help="With profile-start, where the daemon writes the profile (default: its working directory)")
+
+    replay_parser = subparsers.add_parser("replay", help="Replay a trace in virtual time and report when sleep fires")
+    replay_parser.add_argument("trace", help="Trace file written by daemon --trace")
+    replay_parser.add_argument("--inactivity", type=int, help="Override the recorded inactivity limit")
+    replay_parser.add_argument("--download-threshold", type=float, help="Override the recorded download threshold")
+    replay_parser.add_argument("--upload-threshold", type=float, help="Override the recorded upload threshold")
+    replay_parser.add_argument("--window", type=float, help="Override the recorded decision window")
+    replay_parser.add_argument("--release-ratio", type=float, help="Override the recorded release ratio")
+    replay_parser.add_argument("--engage-hold", type=float, help="Override the recorded engage hold")
+    replay_parser.add_argument("--release-hold", type=float, help="Override the recorded release hold")
+    replay_parser.add_argument("--json", action="store_true", help="Print the sleep events as JSON")
+
+    aggregator_parser = subparsers.add_parser("aggregator", help="Collect status updates from many daemons")
+    aggregator_parser.add_argument("--listen",
+                                   help="host:port or Unix socket path to accept agents on (default: 127.0.0.1:47801)")
+    aggregator_parser.add_argument("--update-log", metavar="PATH", help="Append every update to this JSON lines file")
+    aggregator_parser.add_argument("--summary-interval", type=float,
+                                   help="Seconds between fleet summaries in the log (default: 60)")
+
+    fleet_parser = subparsers.add_parser("fleet", help="Show which hosts a running aggregator sees awake, and why")
+    fleet_parser.add_argument("--address", help="Aggregator address (default: 127.0.0.1:47801)")
+    fleet_parser.add_argument("--hosts", action="store_true", help="List every host's latest update")
+    fleet_parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+
+    sweep_parser = subparsers.add_parser("sweep", help="Score a grid of thresholds and timers against recorded traces")
+    sweep_parser.add_argument("traces", nargs="+", help="Trace files, or directories searched for *.trace")
+    sweep_parser.add_argument("--download-threshold", type=float, nargs="+", metavar="MBPS",
+                              help="Download thresholds to try (default: 1 2 5 10 20 50)")
+    sweep_parser.add_argument("--upload-threshold", type=float, nargs="+", metavar="MBPS",
+                              help="Upload thresholds to try (default: 1 5 10 20)")
+    sweep_parser.add_argument("--inactivity", type=float, nargs="+", metavar="SECONDS",
+                              help="Inactivity limits to try (default: 60 300 600 1800 3600)")
+    sweep_parser.add_argument("--window", type=float, nargs="+", default=[DEFAULT_DECISION_WINDOW], metavar="SECONDS",
+                              help="Decision windows to try (default: %(default)s)")
+    sweep_parser.add_argument("--release-ratio", type=float, help="Override the recorded release ratio")
+    sweep_parser.add_argument("--engage-hold", type=float, help="Override the recorded engage hold")
+    sweep_parser.add_argument("--release-hold", type=float, help="Override the recorded release hold")
+    sweep_parser.add_argument("--workers", type=int, help="Worker processes (default: one per CPU)")
+    sweep_parser.add_argument("--top", type=int, default=20, help="Configurations to print (default: %(default)s)")
+    sweep_parser.add_argument("--json", action="store_true", help="Print every configuration's results as JSON")
+    return parser.parse_args(argv)
+
+
+def log_startup(args):
+    """Configure logging and record the start of a monitoring process."""
+    setup_logging(max_bytes=args.log_max_bytes, backups=args.log_backups,
+                  retention_days=args.log_retention_days, json_file=args.log_json)
+    logging.info("=" * 50)
+    logging.info("Application started")
+    logging.info("=" * 50)
+    logging.info(f"Configuration: CHECK_INTERVAL={CHECK_INTERVAL}s, DEFAULT_SPEED_THRESHOLD={DEFAULT_SPEED_THRESHOLD}Mbps, DEFAULT_INACTIVITY_LIMIT={DEFAULT_INACTIVITY_LIMIT}s")
+
+
+def run_gui(args):
+    """Open the window, driving an in-process engine or a daemon over its socket."""
+    from tkinter import messagebox
+    import ttkbootstrap as tb
+    from engine import MonitorEngine
+    from control import ControlClient
+    from gui import NetworkMonitorGUI
+
+    log_startup(args)
+    metrics_server = None
+    if getattr(args, "connect", False):
+        engine = ControlClient(args.socket)
+        if args.metrics_port is not None or args.metrics_textfile:
+            logging.warning("Ignoring the metrics options with --connect; the daemon serves its own metrics")
+    else:
+        from profiling import install_signal_toggle
+        engine = MonitorEngine()
+        engine.run()
+        install_signal_toggle()
+        metrics_server = start_metrics(engine, args)
     root = tb.Window(themename="flatly")
-    app = NetworkMonitorGUI(root)
+    app = NetworkMonitorGUI(root, engine, minimized=getattr(args, "tray", False))
     try:
         logging.info("Entering main event loop")
         root.mainloop()
@@ -577,8 +234,180 @@ if __name__ == "__main__":
         messagebox.showerror("Critical Error", f"An unhandled error occurred: {str(e)}\nSee log.txt for details.")
     finally:
         logging.info("Application shutting down")
+        if metrics_server is not None:
+            metrics_server.close()
         app.cleanup()  # Call cleanup to stop threads and reset system state
-        stop_event.set()
-        SetThreadExecutionState(ES_CONTINUOUS)
         logging.info("Reset system execution state")
-        logging.info("=" * 50)
\ No newline at end of file
+        logging.info("=" * 50)
+
+
+def run_daemon(args):
+    """Run the engine without any window until SIGTERM/SIGINT."""
+    from engine import MonitorEngine
+    from control import ControlServer
+    from profiling import install_signal_toggle
+
+    log_startup(args)
+    engine = MonitorEngine(args.inactivity, args.download_threshold, args.upload_threshold,
+                           args.include_interfaces or (), args.exclude_interfaces or DEFAULT_EXCLUDE_INTERFACES,
+                           idle_backend=args.idle_backend, burst_interval=args.burst_interval,
+                           decision_window=args.window, release_ratio=args.release_ratio,
+                           engage_hold=args.engage_hold, release_hold=args.release_hold,
+                           activity_quantum=args.activity_quantum,
+                           max_sample_interval=args.max_sample_interval, expiry_accuracy=args.expiry_accuracy,
+                           cpu_threshold=args.cpu_threshold, disk_threshold=args.disk_threshold,
+                           keep_awake_processes=args.keep_awake_processes or (),
+                           process_traffic=args.process_traffic or (), power_backend=args.power_backend,
+                           trace_path=args.trace)
+    engine.configure()  # Validate the command-line settings before anything starts
+    server = ControlServer(engine, args.socket)
+    metrics_server = start_metrics(engine, args)
+    agent = None
+    if args.report_to:
+        from fleet import FleetAgent, DEFAULT_REPORT_INTERVAL
+        agent = FleetAgent(engine, args.report_to, args.report_host, args.report_interval or DEFAULT_REPORT_INTERVAL)
+    signal.signal(signal.SIGTERM, lambda signum, frame: engine.scheduler.stop())
+    if install_signal_toggle():
+        logging.info(f"Send SIGUSR2 (kill -USR2 {os.getpid()}) to start or stop profiling")
+    server.start()
+    if args.start:
+        engine.start()
+    if agent is not None:
+        agent.start()
+    try:
+        engine.run_forever()  # The scheduler runs on the main thread; it returns on SIGTERM
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logging.info("Daemon shutting down")
+        server.close()
+        if metrics_server is not None:
+            metrics_server.close()
+        if agent is not None:
+            agent.close()
+        engine.shutdown()
+        logging.info("=" * 50)
+
+
+def run_ctl(args):
+    """Send one command to a running daemon and print the resulting status."""
+    from control import ControlClient
+
+    client = ControlClient(args.socket)
+    try:
+        if args.action == "start":
+            status = client.start(args.inactivity, args.download_threshold, args.upload_threshold,
+                                  args.include_interfaces, args.exclude_interfaces)
+        elif args.action == "stop":
+            status = client.stop()
+        elif args.action.startswith("profile-"):
+            status = client.profile(args.action[len("profile-"):], args.stacks, args.output and os.path.abspath(args.output))
+        else:
+            status = client.status()
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return 1
+    finally:
+        client.close()
+    for key, value in status.items():
+        print(f"{key}: {value}")
+    return 0
+
+
+def run_aggregator(args):
+    """Serve the fleet aggregator until SIGTERM/SIGINT."""
+    from fleet import run_aggregator as serve, DEFAULT_FLEET_ADDRESS, SUMMARY_INTERVAL
+
+    log_startup(args)
+    serve(args.listen or DEFAULT_FLEET_ADDRESS, args.update_log, args.summary_interval or SUMMARY_INTERVAL)
+    return 0
+
+
+def run_fleet(args):
+    """Print a running aggregator's view of the fleet."""
+    import json
+    from fleet import request_summary, FleetAggregator, DEFAULT_FLEET_ADDRESS
+
+    address = args.address or DEFAULT_FLEET_ADDRESS
+    try:
+        summary = request_summary(address, args.hosts)
+    except (OSError, ValueError) as e:
+        print(f"Error: could not reach the aggregator at {address}: {e}")
+        return 1
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return 0
+    print(FleetAggregator.format_counts(summary))
+    for host, update in sorted(summary.get("detail", {}).items()):
+        remaining = f"{update['remaining']:.0f}s left" if update.get("remaining") is not None else ""
+        print(f"{host:30s} {update['reason']:16s} {update['down']:8.1f} down {update['up']:8.1f} up  "
+              f"{remaining}  (seen {update['age']:.0f}s ago)")
+    return 0
+
+
+def run_replay(args):
+    """Replay a recorded trace and print when and why sleep would have fired."""
+    import json
+    import time
+    from tracefile import Replay, format_report
+
+    replay = Replay({"inactivity_limit": args.inactivity, "download_threshold": args.download_threshold,
+                     "upload_threshold": args.upload_threshold, "decision_window": args.window,
+                     "release_ratio": args.release_ratio, "engage_hold": args.engage_hold,
+                     "release_hold": args.release_hold})
+    start = time.perf_counter()
+    try:
+        replay.run(args.trace)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return 1
+    elapsed = time.perf_counter() - start
+    if args.json:
+        print(json.dumps({"sleeps": replay.sleeps, "recorded_sleeps": replay.recorded_sleeps,
+                          "records": replay.records, "samples": replay.samples, "seconds": elapsed}, indent=2))
+    else:
+        print(format_report(replay, elapsed))
+    return 0
+
+
+def run_sweep(args):
+    """Evaluate a configuration grid over recorded traces and print the best configurations."""
+    import json
+    import time
+    from sweep import sweep, format_table, DEFAULT_DOWNLOAD_GRID, DEFAULT_UPLOAD_GRID, DEFAULT_INACTIVITY_GRID
+
+    start = time.perf_counter()
+    try:
+        rows = sweep(args.traces, args.download_threshold or DEFAULT_DOWNLOAD_GRID,
+                     args.upload_threshold or DEFAULT_UPLOAD_GRID, args.inactivity or DEFAULT_INACTIVITY_GRID,
+                     args.window, args.release_ratio, args.engage_hold, args.release_hold, args.workers)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return 1
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print(format_table(rows, args.top))
+        print(f"{len(rows)} configurations in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "daemon":
+        return run_daemon(args)
+    if args.command == "ctl":
+        return run_ctl(args)
+    if args.command == "aggregator":
+        return run_aggregator(args)
+    if args.command == "fleet":
+        return run_fleet(args)
+    if args.command == "replay":
+        return run_replay(args)
+    if args.command == "sweep":
+        return run_sweep(args)
+    return run_gui(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,219 @@
+import os
+import time
+import logging
+import threading
+import traceback
+from bisect import bisect_left
+
+from history import STATS_WINDOW
+from profiling import PROFILER
+
+DEFAULT_METRICS_ADDRESS = "127.0.0.1"  # Scrapes stay local unless an address is given
+DEFAULT_TEXTFILE_INTERVAL = 15  # Seconds between node-exporter textfile rewrites
+ACTIVITY_TIMING_EVERY = 64  # Time one input event in this many, so the hooks stay cheap
+
+# Bucket upper bounds in seconds
+LOOP_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+HANDLER_BUCKETS = (0.000001, 0.0000025, 0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.001, 0.01)
+
+
+class Histogram:
+    """Prometheus-style histogram; ``observe`` is a bisect and three increments.
+
+    Updates are not locked: each histogram has one writer thread, and a scrape
+    that races an update is off by at most that one observation.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # The last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, help_text):
+        lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum {self.sum:.9g}")
+        lines.append(f"{name}_count {self.count}")
+        return lines
+
+
+class Metrics:
+    """Counters and histograms the engine updates as it runs; gauges come from ``status`` at scrape time."""
+
+    def __init__(self):
+        self.resets = {"input": 0, "network": 0}  # {cause: count} of inactivity timer resets
+        self.sleep_events = 0
+        self.sample_seconds = Histogram(LOOP_BUCKETS)
+        self.activity_seconds = Histogram(HANDLER_BUCKETS)
+        self.gui_refresh_seconds = Histogram(LOOP_BUCKETS)
+
+    def count_reset(self, cause):
+        self.resets[cause] = self.resets.get(cause, 0) + 1
+
+
+def timed_handler(handler, histogram, every=ACTIVITY_TIMING_EVERY):
+    """Wrap an input handler so that one call in ``every`` is timed into ``histogram``."""
+    clock = time.perf_counter
+    calls = 0
+
+    def wrapper(*args):
+        nonlocal calls
+        calls += 1
+        if calls % every:
+            return handler(*args)
+        start = clock()
+        result = handler(*args)
+        histogram.observe(clock() - start)
+        PROFILER.end("on_activity", start)
+        return result
+
+    return wrapper
+
+
+def _gauge(lines, name, help_text, samples):
+    """Append a gauge with (labels, value) samples; ``labels`` is a {name: value} dict."""
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} gauge")
+    for labels, value in samples:
+        label_text = ",".join(f'{key}="{_escape(str(val))}"' for key, val in labels.items())
+        lines.append(f"{name}{{{label_text}}} {value:.9g}" if label_text else f"{name} {value:.9g}")
+
+
+def _counter(lines, name, help_text, samples):
+    """Append a counter with (labels, value) samples, like ``_gauge``."""
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} counter")
+    for labels, value in samples:
+        label_text = ",".join(f'{key}="{_escape(str(val))}"' for key, val in labels.items())
+        lines.append(f"{name}{{{label_text}}} {value:.9g}" if label_text else f"{name} {value:.9g}")
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_metrics(engine):
+    """The engine's state in the Prometheus text exposition format."""
+    status = engine.status()
+    metrics = engine.metrics
+    lines = []
+    _gauge(lines, "sleepsentinel_monitoring", "1 while monitoring is active.",
+           [({}, 1 if status["monitoring"] else 0)])
+    _gauge(lines, "sleepsentinel_time_until_sleep_seconds", "Seconds left on the inactivity timer (-1 when stopped).",
+           [({}, status["time_remaining"] if status["time_remaining"] is not None else -1)])
+    engaged = set(status["keep_awake"])
+    _gauge(lines, "sleepsentinel_keep_awake", "1 while a rule keeps the system awake, 0 otherwise.",
+           [({"rule": rule}, 1 if rule in engaged else 0) for rule in status["rules"]])
+    _gauge(lines, "sleepsentinel_rate_mbps", "Current total rate over the last sample interval.",
+           [({"direction": "download"}, status["download_speed"]),
+            ({"direction": "upload"}, status["upload_speed"])])
+    _gauge(lines, "sleepsentinel_window_rate_mbps", f"Total rate statistics over the last {STATS_WINDOW}s.",
+           [({"direction": direction, "stat": stat}, value)
+            for direction, stats in status["stats"].items() for stat, value in stats.items()])
+    _gauge(lines, "sleepsentinel_interface_rate_mbps", "Current rate per interface.",
+           [({"interface": name, "direction": direction}, rate)
+            for name, rates in status["interfaces"].items()
+            for direction, rate in zip(("download", "upload"), rates)])
+    _gauge(lines, "sleepsentinel_interface_window_rate_mbps", f"Mean rate per interface over the last {STATS_WINDOW}s.",
+           [({"interface": name, "direction": direction}, stats[direction]["mean"])
+            for name, stats in engine.sampler.history.interface_stats(STATS_WINDOW).items()
+            for direction in ("download", "upload")])
+    _gauge(lines, "sleepsentinel_sample_interval_seconds", "Current adaptive sampling interval (0 when stopped).",
+           [({}, status["sample_interval"] or 0)])
+    _gauge(lines, "sleepsentinel_signal_value",
+           "Last reading of each activity signal source (CPU %, disk MB/s, process count, process traffic Mbps).",
+           [({"signal": name, "source": source}, value) for name, signal in status["signals"].items()
+            for source, value in signal["values"].items()])
+    _gauge(lines, "sleepsentinel_signal_interval_seconds",
+           "Current read interval of each activity signal, at least what its cost allows.",
+           [({"signal": name}, signal["period"] or signal["interval"]) for name, signal in status["signals"].items()])
+    _gauge(lines, "sleepsentinel_signal_cost_seconds", "Running estimate of the time one read of each signal takes.",
+           [({"signal": name}, signal["cost_us"] / 1e6) for name, signal in status["signals"].items()])
+    _counter(lines, "sleepsentinel_signal_reads_total", "Reads of each activity signal.",
+             [({"signal": name}, signal["reads"]) for name, signal in status["signals"].items()])
+    _counter(lines, "sleepsentinel_signal_read_seconds_total",
+             "Time spent reading each activity signal; its rate is the signal's share of a core.",
+             [({"signal": name}, signal["read_seconds"]) for name, signal in status["signals"].items()])
+    for name, signal in status["signals"].items():
+        if "attribution" in signal:
+            attribution = signal["attribution"]
+            _gauge(lines, "sleepsentinel_attribution_tracked",
+                   "Processes and sockets the per-process traffic signal tracked at its last read.",
+                   [({"kind": kind}, attribution[kind]) for kind in ("processes", "sockets", "fds")])
+            _counter(lines, "sleepsentinel_attribution_fd_lookups_total",
+                     "File descriptor links read to map sockets to processes; low once the caches are warm.",
+                     [({}, attribution["fd_lookups"])])
+    _gauge(lines, "sleepsentinel_scheduler_wakeups_per_minute", "Scheduler thread wake-ups per minute since start.",
+           [({}, status["scheduler"]["wakeups_per_minute"])])
+    lines.append("# HELP sleepsentinel_timer_resets_total Inactivity timer resets by cause.")
+    lines.append("# TYPE sleepsentinel_timer_resets_total counter")
+    for cause, count in sorted(metrics.resets.items()):
+        lines.append(f'sleepsentinel_timer_resets_total{{cause="{_escape(cause)}"}} {count}')
+    lines.append("# HELP sleepsentinel_sleep_events_total Times the timer expired and sleep was started.")
+    lines.append("# TYPE sleepsentinel_sleep_events_total counter")
+    lines.append(f"sleepsentinel_sleep_events_total {metrics.sleep_events}")
+    lines += metrics.sample_seconds.render("sleepsentinel_sample_seconds",
+                                           "Time per sampler tick, including the decision update.")
+    lines += metrics.activity_seconds.render("sleepsentinel_activity_handler_seconds",
+                                             "Input hook handler time (1 in 64 events) or OS idle query time.")
+    lines += metrics.gui_refresh_seconds.render("sleepsentinel_gui_refresh_seconds",
+                                                "Time per GUI refresh; only an in-process GUI observes it.")
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(engine, path):
+    """Write the metrics for node-exporter's textfile collector; the rename makes it atomic."""
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, "w") as f:
+            f.write(render_metrics(engine))
+        os.replace(temporary, path)
+    except Exception as e:
+        logging.error(f"Error writing metrics textfile {path}: {e}")
+        logging.error(traceback.format_exc())
+
+
+class MetricsServer:
+    """Serve ``/metrics`` over HTTP on its own thread."""
+
+    def __init__(self, engine, port, address=DEFAULT_METRICS_ADDRESS):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = render_metrics(engine).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # One line per scrape would swamp log.txt
+
+        self.server = ThreadingHTTPServer((address, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    def start(self):
+        host, port = self.server.server_address[:2]
+        logging.info(f"Serving metrics on http://{host}:{port}/metrics")
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
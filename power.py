@@ -0,0 +1,524 @@
+import os
+import sys
+import struct
+import logging
+import threading
+
+# socket is imported where a bus connection is made, so importing this module stays cheap
+
+POWER_BACKENDS = ("auto", "logind", "windows", "none")  # Offered on the command line; tests also use "fake"
+INHIBIT_WHO = "SleepSentinel"
+LOGIND_INHIBIT_WHAT = "sleep:idle"  # Blocks both explicit suspends and the desktop's idle action
+DEFAULT_SYSTEM_BUS = "unix:path=/run/dbus/system_bus_socket"
+DBUS_TIMEOUT = 5  # Seconds to wait for the bus or logind before giving up on a call
+MAX_UNIX_FDS = 16  # File descriptors accepted with one D-Bus message
+
+LOGIND_SERVICE = "org.freedesktop.login1"
+LOGIND_PATH = "/org/freedesktop/login1"
+LOGIND_MANAGER = "org.freedesktop.login1.Manager"
+
+# D-Bus message types and header fields (D-Bus specification, "Message Format")
+METHOD_CALL, METHOD_RETURN, ERROR, SIGNAL = 1, 2, 3, 4
+FIELD_PATH, FIELD_INTERFACE, FIELD_MEMBER, FIELD_ERROR_NAME = 1, 2, 3, 4
+FIELD_REPLY_SERIAL, FIELD_DESTINATION, FIELD_SENDER, FIELD_SIGNATURE, FIELD_UNIX_FDS = 5, 6, 7, 8, 9
+_FIELD_TYPES = {FIELD_PATH: "o", FIELD_INTERFACE: "s", FIELD_MEMBER: "s", FIELD_ERROR_NAME: "s",
+                FIELD_REPLY_SERIAL: "u", FIELD_DESTINATION: "s", FIELD_SENDER: "s", FIELD_SIGNATURE: "g",
+                FIELD_UNIX_FDS: "u"}
+
+
+class PowerBackendUnavailable(Exception):
+    """The backend cannot run on this machine (wrong platform, no bus or no logind)."""
+
+
+class DBusError(Exception):
+    """An error reply from the bus or a service, or a malformed message."""
+
+    def __init__(self, name, message=""):
+        super().__init__(f"{name}: {message}" if message else name)
+        self.name = name
+
+
+def _pad(buffer, alignment):
+    buffer.extend(b"\0" * (-len(buffer) % alignment))
+
+
+def _marshal(buffer, signature, values):
+    """Append ``values`` of the basic-type ``signature`` to ``buffer``; a variant is a (signature, value) pair."""
+    for code, value in zip(signature, values):
+        if code in "so":
+            data = value.encode()
+            _pad(buffer, 4)
+            buffer += struct.pack("<I", len(data)) + data + b"\0"
+        elif code == "g":
+            buffer += bytes([len(value)]) + value.encode() + b"\0"
+        elif code in "ubh":
+            _pad(buffer, 4)
+            buffer += struct.pack("<I", int(value))
+        elif code == "i":
+            _pad(buffer, 4)
+            buffer += struct.pack("<i", value)
+        elif code == "y":
+            buffer.append(value)
+        elif code == "v":
+            _marshal(buffer, "g", [value[0]])
+            _marshal(buffer, value[0], [value[1]])
+        else:
+            raise DBusError("Unsupported", f"cannot write D-Bus type {code!r}")
+
+
+def _unmarshal(data, offset, signature, endian):
+    """Read values of the basic-type ``signature`` from ``data``; returns (values, next offset)."""
+    values = []
+    for code in signature:
+        if code in "so":
+            offset += -offset % 4
+            length, = struct.unpack_from(endian + "I", data, offset)
+            values.append(bytes(data[offset + 4:offset + 4 + length]).decode())
+            offset += 4 + length + 1
+        elif code == "g":
+            length = data[offset]
+            values.append(bytes(data[offset + 1:offset + 1 + length]).decode())
+            offset += 1 + length + 1
+        elif code in "ubhi":
+            offset += -offset % 4
+            values.append(struct.unpack_from(endian + ("i" if code == "i" else "I"), data, offset)[0])
+            offset += 4
+        elif code == "y":
+            values.append(data[offset])
+            offset += 1
+        elif code == "v":
+            (inner,), offset = _unmarshal(data, offset, "g", endian)
+            (value,), offset = _unmarshal(data, offset, inner, endian)
+            values.append(value)
+        else:
+            raise DBusError("Unsupported", f"cannot read D-Bus type {code!r}")
+    return values, offset
+
+
+def encode_message(kind, serial, fields, signature="", body=(), flags=0):
+    """One little-endian D-Bus message; ``fields`` is a {header field code: value} dict."""
+    fields = dict(fields)
+    if signature:
+        fields[FIELD_SIGNATURE] = signature
+    payload = bytearray()
+    _marshal(payload, signature, body)
+    message = bytearray(b"l" + bytes([kind, flags, 1]) + struct.pack("<III", len(payload), serial, 0))
+    for code, value in fields.items():
+        _pad(message, 8)
+        message.append(code)
+        _marshal(message, "v", [(_FIELD_TYPES[code], value)])
+    struct.pack_into("<I", message, 12, len(message) - 16)
+    _pad(message, 8)
+    return bytes(message + payload)
+
+
+class Message:
+    """A decoded D-Bus message with the file descriptors that came with it."""
+
+    def __init__(self, kind, serial, fields, body, fds):
+        self.kind = kind
+        self.serial = serial
+        self.fields = fields
+        self.body = body
+        self.fds = fds
+
+    def close_fds(self):
+        for fd in self.fds:
+            os.close(fd)
+        self.fds = []
+
+
+class MessageStream:
+    """Split the bytes and file descriptors received on a D-Bus socket into messages."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self._buffer = bytearray()
+        self._fds = []
+
+    def receive(self):
+        """Read once from the socket; returns False once the peer has closed it."""
+        import socket
+
+        data, ancillary, _, _ = self.sock.recvmsg(1 << 16, socket.CMSG_SPACE(MAX_UNIX_FDS * 4))
+        for level, kind, payload in ancillary:
+            if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+                usable = len(payload) - len(payload) % 4
+                self._fds += struct.unpack(f"{usable // 4}i", payload[:usable])
+        self._buffer += data
+        return bool(data)
+
+    def read_line(self):
+        """The next CRLF-terminated line of the authentication exchange, or None until it has arrived."""
+        end = self._buffer.find(b"\r\n")
+        if end < 0:
+            return None
+        line = bytes(self._buffer[:end])
+        del self._buffer[:end + 2]
+        return line
+
+    def next_message(self):
+        """The next complete message, or None until more data arrives."""
+        data = self._buffer
+        if len(data) < 16:
+            return None
+        endian = "<" if data[0] == ord("l") else ">"
+        body_length, serial, fields_length = struct.unpack_from(endian + "III", data, 4)
+        header_end = 16 + fields_length + (-fields_length % 8)
+        if len(data) < header_end + body_length:
+            return None
+        fields, offset = {}, 16
+        while offset < 16 + fields_length:
+            offset += -offset % 8
+            code = data[offset]
+            (value,), offset = _unmarshal(data, offset + 1, "v", endian)
+            fields[code] = value
+        body, _ = _unmarshal(data[header_end:header_end + body_length], 0, fields.get(FIELD_SIGNATURE, ""), endian)
+        count = fields.get(FIELD_UNIX_FDS, 0)
+        fds, self._fds = self._fds[:count], self._fds[count:]
+        message = Message(data[1], serial, fields, body, fds)
+        del data[:header_end + body_length]
+        return message
+
+
+def bus_socket_path(address):
+    """The socket path of the first Unix transport in a D-Bus address ("unix:path=..." or "unix:abstract=...")."""
+    for transport in address.split(";"):
+        kind, _, options = transport.partition(":")
+        if kind != "unix":
+            continue
+        options = dict(option.split("=", 1) for option in options.split(",") if "=" in option)
+        if "path" in options:
+            return options["path"]
+        if "abstract" in options:
+            return "\0" + options["abstract"]
+    raise PowerBackendUnavailable(f"No Unix socket in D-Bus address {address!r}")
+
+
+class DBusConnection:
+    """Just enough of a D-Bus client to call methods with basic-type arguments and receive file descriptors.
+
+    Authenticates with EXTERNAL (the socket's own credentials), negotiates
+    Unix fd passing and registers with Hello. Calls block until their reply
+    arrives or DBUS_TIMEOUT passes; signals received meanwhile are dropped.
+    Calls from different threads run one at a time, so no thread reads a
+    reply meant for another.
+    """
+
+    def __init__(self, address, timeout=DBUS_TIMEOUT):
+        import socket
+
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self._lock = threading.Lock()  # Held from sending a call until its reply is read
+        try:
+            self.sock.connect(bus_socket_path(address))
+            self.stream = MessageStream(self.sock)
+            self._serial = 0
+            self._authenticate()
+            self.unique_name = self.call("org.freedesktop.DBus", "/org/freedesktop/DBus", "org.freedesktop.DBus",
+                                         "Hello")[0]
+        except BaseException:
+            self.sock.close()
+            raise
+
+    def _line(self):
+        line = self.stream.read_line()
+        while line is None:
+            if not self.stream.receive():
+                raise DBusError("Disconnected", "bus closed the connection during authentication")
+            line = self.stream.read_line()
+        return line
+
+    def _authenticate(self):
+        uid = str(os.getuid()).encode().hex().encode()
+        self.sock.sendall(b"\0AUTH EXTERNAL " + uid + b"\r\n")
+        line = self._line()
+        if not line.startswith(b"OK"):
+            raise DBusError("AuthFailed", line.decode(errors="replace"))
+        self.sock.sendall(b"NEGOTIATE_UNIX_FD\r\n")
+        if not self._line().startswith(b"AGREE_UNIX_FD"):
+            raise DBusError("AuthFailed", "bus does not pass file descriptors")
+        self.sock.sendall(b"BEGIN\r\n")
+
+    def call(self, destination, path, interface, member, signature="", args=()):
+        """Call a method and return its reply's values; "h" values come back as open file descriptors."""
+        with self._lock:
+            return self._call(destination, path, interface, member, signature, args)
+
+    def _call(self, destination, path, interface, member, signature, args):
+        self._serial += 1
+        serial = self._serial
+        fields = {FIELD_PATH: path, FIELD_INTERFACE: interface, FIELD_MEMBER: member,
+                  FIELD_DESTINATION: destination}
+        self.sock.sendall(encode_message(METHOD_CALL, serial, fields, signature, args))
+        while True:
+            message = self.stream.next_message()
+            if message is None:
+                if not self.stream.receive():
+                    raise DBusError("Disconnected", "bus closed the connection")
+                continue
+            if message.fields.get(FIELD_REPLY_SERIAL) != serial:
+                message.close_fds()  # A signal such as NameAcquired
+                continue
+            if message.kind == ERROR:
+                message.close_fds()
+                raise DBusError(message.fields.get(FIELD_ERROR_NAME, "Error"),
+                                message.body[0] if message.body else "")
+            result = []
+            for code, value in zip(message.fields.get(FIELD_SIGNATURE, ""), message.body):
+                result.append(message.fds[value] if code == "h" else value)
+            for fd in set(message.fds) - set(result):
+                os.close(fd)
+            return result
+
+    def close(self):
+        self.sock.close()
+
+
+class PowerBackend:
+    """Keeps the system awake while told to, and suspends it.
+
+    The engine calls ``set_awake`` whenever its keep-awake rules may have
+    changed; the backend only touches the OS when the state actually flips,
+    so one inhibitor is taken when activity starts and dropped when it ends,
+    whatever the sampling rate. ``set_awake`` and ``suspend`` may be called
+    from any thread; they run one at a time.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self.holding = False
+        self.transitions = 0
+        self.reason = None  # Why the hold was taken, while holding
+        self.lock = threading.RLock()  # Serializes holds, releases and suspends across threads
+
+    def start(self):
+        """Acquire whatever the backend needs; raises PowerBackendUnavailable."""
+
+    def stop(self):
+        """Drop any hold and release resources acquired by ``start``."""
+        self.set_awake(False)
+
+    def set_awake(self, awake, reason=""):
+        """Hold or release the inhibitor; returns True when the state changed."""
+        with self.lock:
+            if awake == self.holding:
+                return False
+            if awake:
+                self.hold(reason)
+                logging.info(f"Inhibiting sleep ({self.name}): {reason}")
+            else:
+                self.release()
+                logging.info(f"Allowing sleep ({self.name})")
+            self.holding = awake
+            self.reason = reason if awake else None
+            self.transitions += 1
+            return True
+
+    def hold(self, reason):
+        raise NotImplementedError
+
+    def release(self):
+        raise NotImplementedError
+
+    def suspend(self):
+        """Suspend the system now, releasing any hold first; returns False when this backend cannot suspend."""
+        with self.lock:
+            self.set_awake(False)  # Our own inhibitor would otherwise veto the suspend
+            return self.request_suspend()
+
+    def request_suspend(self):
+        raise NotImplementedError
+
+    def counters(self):
+        return {"backend": self.name, "holding": self.holding, "reason": self.reason, "transitions": self.transitions}
+
+
+class LogindPowerBackend(PowerBackend):
+    """systemd-logind over the system bus: a block inhibitor fd while awake, Manager.Suspend to sleep.
+
+    logind keeps the inhibitor for as long as the fd it returned is open,
+    so holding is one Inhibit call and releasing is closing the fd. The bus
+    address comes from DBUS_SYSTEM_BUS_ADDRESS, so a fake logind can stand in.
+    """
+
+    name = "logind"
+
+    def __init__(self, address=None):
+        super().__init__()
+        self.address = address or os.environ.get("DBUS_SYSTEM_BUS_ADDRESS", DEFAULT_SYSTEM_BUS)
+        self._bus = None
+        self._fd = None
+
+    def start(self):
+        if not sys.platform.startswith("linux"):
+            raise PowerBackendUnavailable("logind is only available on Linux")
+        try:
+            self._connect()
+            self._manager("CanSuspend")  # Fail now if logind itself is missing
+        except (OSError, DBusError) as e:
+            self._disconnect()
+            raise PowerBackendUnavailable(f"No logind on {self.address}: {e}")
+
+    def _connect(self):
+        if self._bus is None:
+            self._bus = DBusConnection(self.address)
+
+    def _disconnect(self):
+        if self._bus is not None:
+            self._bus.close()
+            self._bus = None
+
+    def _manager(self, member, signature="", args=()):
+        """Call a logind Manager method, reconnecting once if the bus went away (e.g. dbus restarted)."""
+        for attempt in (1, 2):
+            try:
+                self._connect()
+                return self._bus.call(LOGIND_SERVICE, LOGIND_PATH, LOGIND_MANAGER, member, signature, args)
+            except (OSError, DBusError) as e:
+                if attempt == 2 or (isinstance(e, DBusError) and e.name != "Disconnected"):
+                    raise
+                self._disconnect()
+
+    def hold(self, reason):
+        self._fd, = self._manager("Inhibit", "ssss", (LOGIND_INHIBIT_WHAT, INHIBIT_WHO, reason, "block"))
+
+    def release(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def request_suspend(self):
+        self._manager("Suspend", "b", (False,))
+        return True
+
+    def stop(self):
+        super().stop()
+        self._disconnect()
+
+
+class WindowsPowerBackend(PowerBackend):
+    """A system-required power request while awake, SetSuspendState to sleep.
+
+    A power request is a handle, not per-thread state like
+    SetThreadExecutionState, so any thread may set or clear it and it shows
+    up in `powercfg /requests`.
+    """
+
+    name = "windows"
+    POWER_REQUEST_SYSTEM_REQUIRED = 1
+
+    def __init__(self):
+        super().__init__()
+        self._request = None
+
+    def start(self):
+        if os.name != 'nt':
+            raise PowerBackendUnavailable("Power requests are only available on Windows")
+        import ctypes
+        from ctypes import wintypes
+
+        class REASON_CONTEXT(ctypes.Structure):
+            _fields_ = [("Version", wintypes.ULONG), ("Flags", wintypes.DWORD),
+                        ("SimpleReasonString", wintypes.LPWSTR)]
+
+        self._ctypes = ctypes
+        self._kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        self._kernel32.PowerCreateRequest.restype = wintypes.HANDLE
+        self._kernel32.PowerCreateRequest.argtypes = [ctypes.POINTER(REASON_CONTEXT)]
+        self._kernel32.PowerSetRequest.argtypes = [wintypes.HANDLE, ctypes.c_int]
+        self._kernel32.PowerClearRequest.argtypes = [wintypes.HANDLE, ctypes.c_int]
+        self._kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+        self._reason = REASON_CONTEXT(0, 1, f"{INHIBIT_WHO}: activity in progress")  # POWER_REQUEST_CONTEXT_SIMPLE_STRING
+        request = self._kernel32.PowerCreateRequest(ctypes.byref(self._reason))
+        if not request or request == wintypes.HANDLE(-1).value:
+            raise PowerBackendUnavailable(f"PowerCreateRequest failed: {ctypes.get_last_error()}")
+        self._request = request
+        self._powrprof = ctypes.WinDLL("powrprof", use_last_error=True)
+
+    def hold(self, reason):
+        if not self._kernel32.PowerSetRequest(self._request, self.POWER_REQUEST_SYSTEM_REQUIRED):
+            raise OSError(f"PowerSetRequest failed: {self._ctypes.get_last_error()}")
+
+    def release(self):
+        if not self._kernel32.PowerClearRequest(self._request, self.POWER_REQUEST_SYSTEM_REQUIRED):
+            raise OSError(f"PowerClearRequest failed: {self._ctypes.get_last_error()}")
+
+    def request_suspend(self):
+        # Sleep rather than hibernate, forced, with wake events left enabled
+        if not self._powrprof.SetSuspendState(False, True, False):
+            raise OSError(f"SetSuspendState failed: {self._ctypes.get_last_error()}")
+        return True
+
+    def stop(self):
+        super().stop()
+        if self._request is not None:
+            self._kernel32.CloseHandle(self._request)
+            self._request = None
+
+
+class FakePowerBackend(PowerBackend):
+    """Records holds, releases and suspends instead of making them, for tests and benchmarks."""
+
+    name = "fake"
+
+    def __init__(self):
+        super().__init__()
+        self.events = []  # ("hold", reason), ("release",) and ("suspend",) in order
+
+    def hold(self, reason):
+        self.events.append(("hold", reason))
+
+    def release(self):
+        self.events.append(("release",))
+
+    def request_suspend(self):
+        self.events.append(("suspend",))
+        return True
+
+
+class NullPowerBackend(PowerBackend):
+    """Never inhibits sleep and cannot suspend; the engine only reports what it would do."""
+
+    name = "none"
+
+    def hold(self, reason):
+        pass
+
+    def release(self):
+        pass
+
+    def request_suspend(self):
+        logging.error("No power backend: cannot suspend the system")
+        return False
+
+
+_BACKEND_CLASSES = {
+    "logind": LogindPowerBackend,
+    "windows": WindowsPowerBackend,
+    "fake": FakePowerBackend,
+    "none": NullPowerBackend,
+}
+
+
+def start_power_backend(name):
+    """Start the named backend; "auto" picks the platform's own and falls back to "none"."""
+    if name != "auto" and name not in _BACKEND_CLASSES:
+        raise ValueError(f"Unknown power backend: {name}")
+    if name == "auto":
+        candidates = ["windows"] if os.name == 'nt' else ["logind"]
+    else:
+        candidates = [name]
+    for candidate in candidates:
+        backend = _BACKEND_CLASSES[candidate]()
+        try:
+            backend.start()
+        except (PowerBackendUnavailable, OSError, AttributeError) as e:
+            logging.error(f"Power backend {candidate} unavailable: {e}")
+            continue
+        logging.info(f"Using power backend: {candidate}")
+        return backend
+    logging.error("Sleep will neither be inhibited nor started; continuing without a power backend")
+    return NullPowerBackend()
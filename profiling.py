@@ -0,0 +1,225 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from collections import deque, Counter
+from datetime import datetime
+
+PROFILE_ACTIONS = ("start", "stop", "status")
+DEFAULT_STACK_INTERVAL = 0.01  # Seconds between stack samples while sampling is on (100 Hz)
+MAX_SPANS = 200_000  # Span timings kept per session; the oldest are dropped beyond this
+MAX_STACK_DEPTH = 64  # Frames kept per sampled stack, innermost first
+
+
+class Profiler:
+    """Runtime profiler for one process: per-thread CPU, hot-path spans and optional sampled stacks.
+
+    Hot paths bracket their work with ``begin``/``end``. While the profiler
+    is off, ``begin`` only checks a flag and returns None, and ``end`` returns
+    at once on None, so instrumented code pays one attribute read. Paths that
+    already time themselves pass their start to ``end`` directly. Sessions
+    are written as Chrome trace JSON (chrome://tracing, Perfetto, speedscope),
+    plus a folded-stacks file (flamegraph.pl, speedscope) when sampling.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.path = None  # Where the current session will be written
+        self._spans = deque(maxlen=MAX_SPANS)  # (name, thread ident, start, duration) in perf_counter seconds
+        self._stacks = Counter()  # {folded stack: samples}
+        self._stack_samples = 0
+        self._sampler = None
+        self._sampler_id = None
+        self._sampler_cpu = None  # CPU seconds the stack sampler used, once it has stopped
+        self._sampling = threading.Event()
+        self._started = None  # (perf_counter, wall clock) at start
+        self._cpu_start = {}  # {native thread id: CPU seconds} at start
+        self._lock = threading.Lock()
+
+    def begin(self):
+        """Start time of a span, or None while profiling is off."""
+        return time.perf_counter() if self.enabled else None
+
+    def end(self, name, started):
+        """Record a span that began at ``started`` (a ``begin`` result or any perf_counter time)."""
+        if started is None or not self.enabled:
+            return
+        self._spans.append((name, threading.get_ident(), started, time.perf_counter() - started))
+
+    def start(self, stacks=False, path=None, interval=DEFAULT_STACK_INTERVAL):
+        """Begin a session; returns its status. Starting a running session only reports it."""
+        with self._lock:
+            if self.enabled:
+                return self.status()
+            self._spans.clear()
+            self._stacks.clear()
+            self._stack_samples = 0
+            self._sampler_cpu = None
+            self.path = path or default_profile_path()
+            self._started = (time.perf_counter(), time.time())
+            self._cpu_start = {tid: cpu for tid, (_, cpu) in thread_cpu_times().items()}
+            self.enabled = True
+            if stacks:
+                self._sampling.clear()
+                self._sampler = threading.Thread(target=self._sample_stacks, args=(interval,), name="profiler",
+                                                 daemon=True)
+                self._sampler.start()
+        logging.info(f"Profiling started{' with stack sampling' if stacks else ''}; will write {self.path}")
+        return self.status()
+
+    def stop(self):
+        """End the session and write its files; returns the status with the paths written."""
+        with self._lock:
+            if not self.enabled:
+                return self.status()
+            self.enabled = False
+            if self._sampler is not None:
+                self._sampling.set()
+                self._sampler.join()
+                self._sampler = None
+            written = self._write()
+        logging.info(f"Profiling stopped; wrote {', '.join(written)}")
+        for line in self.summary_lines():
+            logging.info(f"Profile - {line}")
+        return dict(self.status(), files=written)
+
+    def toggle(self, stacks=False):
+        return self.stop() if self.enabled else self.start(stacks)
+
+    def status(self):
+        return {"enabled": self.enabled, "path": self.path, "spans": len(self._spans),
+                "stack_samples": self._stack_samples,
+                "seconds": time.perf_counter() - self._started[0] if self.enabled else None}
+
+    def _sample_stacks(self, interval):
+        """Fold every other thread's current stack into ``_stacks`` until the session stops."""
+        own = threading.get_ident()
+        self._sampler_id = threading.get_native_id()
+        while not self._sampling.wait(interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                calls = []
+                while frame is not None and len(calls) < MAX_STACK_DEPTH:
+                    code = frame.f_code
+                    calls.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                calls.append(names.get(ident, f"thread-{ident}"))
+                self._stacks[";".join(reversed(calls))] += 1
+            self._stack_samples += 1
+        self._sampler_cpu = time.thread_time()
+
+    def thread_cpu(self):
+        """CPU seconds each thread used since the session started: {name: seconds}, busiest first.
+
+        Threads that exited during the session are missing; the stack sampler
+        reports its own cost, since it has exited by the time this is written.
+        """
+        usage = {f"{name} ({tid})": cpu - self._cpu_start.get(tid, 0.0)
+                 for tid, (name, cpu) in thread_cpu_times().items() if tid != self._sampler_id}
+        if self._sampler_cpu is not None:
+            usage["profiler (stack sampler)"] = self._sampler_cpu
+        return dict(sorted(usage.items(), key=lambda item: -item[1]))
+
+    def span_totals(self):
+        """{span name: (count, total seconds, longest seconds)} over the kept spans."""
+        totals = {}
+        for name, _, _, duration in list(self._spans):
+            count, total, longest = totals.get(name, (0, 0.0, 0.0))
+            totals[name] = (count + 1, total + duration, max(longest, duration))
+        return totals
+
+    def summary_lines(self):
+        elapsed = max(time.perf_counter() - self._started[0], 1e-9)
+        lines = [f"thread {name}: {cpu:.3f}s CPU ({cpu / elapsed:.2%} of a core)"
+                 for name, cpu in self.thread_cpu().items()]
+        lines += [f"span {name}: {count} calls, {total / count * 1e6:.1f} us mean, {longest * 1e6:.1f} us max"
+                  for name, (count, total, longest) in sorted(self.span_totals().items())]
+        return lines
+
+    def _write(self):
+        """Write the Chrome trace (and folded stacks); returns the paths written."""
+        origin, wall = self._started
+        pid = os.getpid()
+        natives = {thread.ident: thread.native_id for thread in threading.enumerate()}
+        events = [{"ph": "M", "name": "process_name", "pid": pid, "args": {"name": "Sleep Sentinel"}}]
+        for tid, name in thread_names().items():
+            events.append({"ph": "M", "name": "thread_name", "pid": pid, "tid": tid, "args": {"name": name}})
+        for name, ident, started, duration in list(self._spans):
+            events.append({"ph": "X", "name": name, "cat": "span", "pid": pid, "tid": natives.get(ident, ident),
+                           "ts": round((started - origin) * 1e6, 3), "dur": round(duration * 1e6, 3)})
+        trace = {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"started": datetime.fromtimestamp(wall).isoformat(timespec="seconds"),
+                          "seconds": time.perf_counter() - origin, "thread_cpu_seconds": self.thread_cpu(),
+                          "dropped_spans": len(self._spans) == MAX_SPANS},
+        }
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(trace, f)
+        written = [self.path]
+        if self._stacks:
+            folded = os.path.splitext(self.path)[0] + ".folded"
+            with open(folded, "w", encoding="utf-8") as f:
+                f.writelines(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+            written.append(folded)
+        return written
+
+
+def default_profile_path():
+    return os.path.abspath(f"sleepsentinel-profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+
+
+def thread_name(thread):
+    """A thread's name; unnamed subclasses such as pynput's listeners are named by their class."""
+    if thread.name.startswith("Thread-") and type(thread).__name__ != "Thread":
+        return f"{type(thread).__module__}.{type(thread).__name__}"
+    return thread.name
+
+
+def thread_names():
+    """{native thread id: name} of the live Python threads."""
+    return {thread.native_id: thread_name(thread) for thread in threading.enumerate()}
+
+
+def thread_cpu_times():
+    """{native thread id: (name, CPU seconds)} of the live Python threads.
+
+    Uses each thread's own CPU clock where POSIX provides one (nanosecond
+    resolution); elsewhere psutil's per-thread times, which tick more coarsely.
+    """
+    cpu_clock = getattr(time, "pthread_getcpuclockid", None)
+    coarse = None
+    times = {}
+    for thread in threading.enumerate():
+        cpu = None
+        if cpu_clock is not None:
+            try:
+                cpu = time.clock_gettime(cpu_clock(thread.ident))
+            except (OSError, OverflowError, TypeError):
+                pass  # The thread exited meanwhile
+        if cpu is None:
+            if coarse is None:
+                import psutil
+                coarse = {t.id: t.user_time + t.system_time for t in psutil.Process().threads()}
+            cpu = coarse.get(thread.native_id)
+        if cpu is not None:
+            times[thread.native_id] = (thread_name(thread), cpu)
+    return times
+
+
+PROFILER = Profiler()  # Process-wide; instrumented code calls PROFILER.begin() and PROFILER.end()
+
+
+def install_signal_toggle():
+    """Toggle profiling (with stack sampling) on SIGUSR2 where the platform has it."""
+    import signal
+
+    if not hasattr(signal, "SIGUSR2"):
+        return False
+    signal.signal(signal.SIGUSR2, lambda signum, frame: threading.Thread(
+        target=PROFILER.toggle, kwargs={"stacks": True}, name="profile-toggle", daemon=True).start())
+    return True
@@ -0,0 +1,217 @@
+import time
+import threading
+import logging
+import traceback
+from collections import namedtuple
+from fnmatch import fnmatchcase
+from history import SpeedHistory
+
+CHECK_INTERVAL = 1  # Interval to check network speed (in seconds)
+COUNTER_WRAP = 2 ** 32  # Some platforms (32-bit Windows/BSD) expose 32-bit byte counters
+
+DEFAULT_MAX_SAMPLE_INTERVAL = 10  # Slowest adaptive sampling interval (in seconds)
+DEFAULT_EXPIRY_ACCURACY = 1  # Newest sample is at most this old when the inactivity timer expires (in seconds)
+
+# The fields of psutil's snetio that the sampler reads; traces and fakes rebuild readings as these
+NicCounters = namedtuple("NicCounters", "bytes_sent bytes_recv")
+
+# Interfaces that only mirror traffic already counted on a physical NIC (loopback,
+# container bridges and veth pairs, hypervisor networks, VPN tunnels)
+DEFAULT_EXCLUDE_INTERFACES = (
+    "lo", "lo0", "Loopback*", "docker*", "br-*", "veth*", "virbr*", "vmnet*", "vboxnet*",
+    "cni*", "flannel*", "cali*", "vEthernet*", "tun*", "tap*", "utun*", "wg*", "tailscale*",
+)
+
+
+def counter_delta(old, new):
+    """Bytes transferred between two readings of a monotonically increasing counter.
+
+    A smaller ``new`` value is either a 32-bit wrap (the old value was close to
+    the limit) or a reset (interface re-created, driver reloaded); a reset
+    contributes nothing rather than a huge negative or bogus rate.
+    """
+    if new >= old:
+        return new - old
+    if old < COUNTER_WRAP and old - new > COUNTER_WRAP // 2:
+        return new + COUNTER_WRAP - old
+    return 0
+
+
+def read_pernic_counters():
+    """Return {interface: counters} for every NIC in one read."""
+    import psutil  # Deferred so control clients never pay for it
+
+    # nowrap=False: wraps and resets are handled by counter_delta, which skips psutil's bookkeeping
+    return psutil.net_io_counters(pernic=True, nowrap=False)
+
+
+def parse_patterns(text):
+    """Split a comma/space separated pattern list as typed in the settings panel."""
+    return tuple(part for part in text.replace(",", " ").split() if part)
+
+
+class InterfaceFilter:
+    """Select interfaces by shell-style include/exclude patterns.
+
+    An empty include list means every interface. Matching is only redone when
+    the set of interface names changes, so hosts with hundreds of container
+    interfaces pay for a set comparison per tick, not for pattern matching.
+    """
+
+    def __init__(self, include=(), exclude=DEFAULT_EXCLUDE_INTERFACES):
+        self.include = tuple(include)
+        self.exclude = tuple(exclude)
+        self._known = frozenset()
+        self._selected = ()
+
+    def matches(self, name):
+        if self.include and not any(fnmatchcase(name, pattern) for pattern in self.include):
+            return False
+        return not any(fnmatchcase(name, pattern) for pattern in self.exclude)
+
+    def select(self, names):
+        """Return the selected names out of ``names`` (a dict or keys view)."""
+        if len(names) != len(self._known) or names.keys() != self._known:
+            self._known = frozenset(names)
+            self._selected = tuple(sorted(name for name in self._known if self.matches(name)))
+            logging.info(f"Network interfaces rescanned - monitoring {list(self._selected)} of {len(self._known)}")
+        return self._selected
+
+
+class NetworkSampler:
+    """Measure download and upload speed in Mbps from one counter snapshot per tick.
+
+    Each tick compares the new snapshot with the previous tick's instead of
+    taking two reads around a sleep, and divides by the measured monotonic
+    time between them. With ``burst_interval`` set below ``interval`` the
+    sampler ticks faster and also reports the peak sub-second rate inside the
+    averaging window, so short transfers are not smoothed away. Every tick is
+    recorded in ``history``, which all the rate queries read from.
+    """
+
+    def __init__(self, interval=CHECK_INTERVAL, burst_interval=None,
+                 interface_filter=None, history=None, read_counters=read_pernic_counters,
+                 clock=time.monotonic):
+        if burst_interval is not None and not 0 < burst_interval <= interval:
+            raise ValueError("Burst interval must be positive and no longer than the sample interval.")
+        self.interval = interval
+        self.tick_interval = burst_interval or interval
+        self.interface_filter = interface_filter or InterfaceFilter()
+        self.read_counters = read_counters
+        self.clock = clock
+        self.history = history or SpeedHistory(tick_interval=self.tick_interval)
+        # Half a tick short of the interval, so scheduling jitter never pulls in an extra tick
+        self.rate_window = interval - self.tick_interval / 2
+        self.lock = threading.Lock()
+        self.interface_speeds = {}  # {interface: (download, upload)} for the last tick, in Mbps
+        self.on_sample = None  # Called as on_sample(timestamp, download, upload, interface_speeds) every tick
+        self.on_counters = None  # Called as on_counters(timestamp, counters) with the selected interfaces' readings
+        self._previous = None  # Timestamp of the last tick
+        self._previous_counters = {}  # {interface: (bytes_recv, bytes_sent)} of the last tick
+
+    def speeds(self):
+        """Return the average (download, upload) pair over the last interval, in Mbps."""
+        return self.history.window_mean(self.rate_window)
+
+    def peaks(self):
+        """Return the peak single-tick (download, upload) rates over the last interval, in Mbps."""
+        return self.history.window_max(self.rate_window)
+
+    def interfaces(self):
+        """Return a copy of the per-interface (download, upload) rates in Mbps."""
+        with self.lock:
+            return dict(self.interface_speeds)
+
+    @property
+    def last_tick(self):
+        """Monotonic time of the last snapshot, or None before the first."""
+        return self._previous
+
+    def set_filter(self, interface_filter):
+        """Swap the interface filter; takes effect on the next tick."""
+        self.interface_filter = interface_filter
+
+    def reset(self):
+        """Forget the previous snapshot, e.g. after a pause; the next tick only sets a baseline."""
+        self._previous = None
+        self._previous_counters = {}
+
+    def tick(self, now=None):
+        """Take one counter snapshot and update the rates; returns False on the first tick.
+
+        Called by the engine's scheduler, at most every ``tick_interval`` seconds
+        and less often while AdaptiveInterval lets sampling back off. ``now``
+        defaults to the sampler's clock; replays pass the recorded time.
+        """
+        now = self.clock() if now is None else now
+        counters = self.read_counters()
+        selected = self.interface_filter.select(counters)
+        if self.on_counters is not None:
+            try:
+                self.on_counters(now, {name: counters[name] for name in selected})
+            except Exception as e:
+                # A broken trace must not stop monitoring
+                logging.error(f"Error recording counters, tracing disabled: {e}")
+                logging.error(traceback.format_exc())
+                self.on_counters = None
+        previous = self._previous
+        previous_counters = self._previous_counters
+        current_counters = {}
+        for name in selected:
+            nic = counters[name]
+            current_counters[name] = (nic.bytes_recv, nic.bytes_sent)
+        self._previous = now
+        self._previous_counters = current_counters
+        if previous is None:
+            return False
+        elapsed = now - previous
+        if elapsed <= 0:
+            return False
+        down_bytes = up_bytes = 0
+        interface_speeds = {}
+        scale = 8 / (elapsed * 1_000_000)  # Bytes per tick to Mbps
+        for name, (bytes_recv, bytes_sent) in current_counters.items():
+            old = previous_counters.get(name)
+            if old is None:
+                continue  # Interface appeared (or was selected) this tick; no baseline yet
+            nic_down = counter_delta(old[0], bytes_recv)
+            nic_up = counter_delta(old[1], bytes_sent)
+            down_bytes += nic_down
+            up_bytes += nic_up
+            interface_speeds[name] = (nic_down * scale, nic_up * scale)
+        download_speed = down_bytes * scale
+        upload_speed = up_bytes * scale
+        self.history.record(now, download_speed, upload_speed, interface_speeds)
+        with self.lock:
+            self.interface_speeds = interface_speeds
+        logging.debug(f"Current speeds - Download: {download_speed:.2f} Mbps, Upload: {upload_speed:.2f} Mbps")
+        if self.on_sample is not None:
+            self.on_sample(now, download_speed, upload_speed, interface_speeds)
+        return True
+
+
+class AdaptiveInterval:
+    """Choose the next sampling interval from how soon the outcome could change.
+
+    ``closeness`` runs from 0 (every signal far from its threshold) to 1 (a
+    signal at its threshold); sampling is at full speed from halfway there and
+    backs off linearly to ``max_interval`` below that. The interval also
+    shrinks with the time left on the inactivity timer, and never exceeds
+    ``expiry_accuracy`` near expiry, so the data the sleep decision uses is at
+    most that old. ``min_interval`` (the sampler's tick) is the floor.
+    """
+
+    def __init__(self, min_interval, max_interval=DEFAULT_MAX_SAMPLE_INTERVAL,
+                 expiry_accuracy=DEFAULT_EXPIRY_ACCURACY):
+        if max_interval < min_interval or expiry_accuracy <= 0:
+            raise ValueError("Max sample interval must be at least the tick interval, and expiry accuracy positive.")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.expiry_accuracy = expiry_accuracy
+
+    def next_interval(self, closeness, time_remaining=None):
+        span = self.max_interval - self.min_interval
+        interval = self.max_interval - span * min(1.0, 2 * closeness)
+        if time_remaining is not None:
+            interval = min(interval, max(self.expiry_accuracy, time_remaining / 2))
+        return max(self.min_interval, interval)
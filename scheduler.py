@@ -0,0 +1,141 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+import traceback
+
+
+class VirtualClock:
+    """Monotonic clock that only moves when told to; pass it wherever a ``clock`` is accepted."""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+        return self.now
+
+
+class Task:
+    """A scheduled callable; ``fn(now)`` returns its next deadline, or None when done."""
+
+    __slots__ = ("name", "fn", "deadline", "cancelled", "runs")
+
+    def __init__(self, name, fn, deadline):
+        self.name = name
+        self.fn = fn
+        self.deadline = deadline
+        self.cancelled = False
+        self.runs = 0
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Scheduler:
+    """Run every periodic job of the engine from one thread, off a deadline heap.
+
+    The thread sleeps until the earliest deadline, runs whatever is due and
+    goes back to sleep, so an idle engine wakes only when a task actually has
+    work (the next sample, the inactivity expiry) rather than on fixed polls.
+    Tasks may be added or cancelled from any thread.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._heap = []  # (deadline, sequence, task)
+        self._sequence = itertools.count()  # Tie-breaker so tasks never get compared
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self.started_at = None
+        self.wakeups = 0
+
+    def call_at(self, deadline, fn, name=None):
+        """Run ``fn(now)`` at ``deadline``; it returns its next deadline or None."""
+        task = Task(name or getattr(fn, "__name__", "task"), fn, deadline)
+        with self._lock:
+            heapq.heappush(self._heap, (deadline, next(self._sequence), task))
+            earliest = self._heap[0][2] is task
+        if earliest:
+            self._wakeup.set()  # The sleeping thread must shorten its wait
+        return task
+
+    def call_later(self, delay, fn, name=None):
+        return self.call_at(self.clock() + delay, fn, name)
+
+    def every(self, interval, fn, name=None, first_delay=0):
+        """Run ``fn(now)`` at a fixed rate; late runs are skipped rather than queued up."""
+        name = name or getattr(fn, "__name__", "task")
+        deadline = self.clock() + first_delay
+
+        def periodic(now):
+            nonlocal deadline
+            try:
+                fn(now)
+            except Exception as e:
+                # A failing tick must not end the series
+                logging.error(f"Error in scheduled task {name}: {e}")
+                logging.error(traceback.format_exc())
+            # Step along the ideal timeline so a late wake-up does not drift later runs
+            deadline += interval
+            if deadline <= now:
+                deadline = now + interval
+            return deadline
+
+        return self.call_at(deadline, periodic, name)
+
+    def stop(self):
+        """Make ``run`` return after the task in progress, if any."""
+        self._stopped = True
+        self._wakeup.set()
+
+    def pending(self):
+        with self._lock:
+            return sorted((task.deadline, task.name) for _, _, task in self._heap if not task.cancelled)
+
+    def stats(self):
+        elapsed = self.clock() - self.started_at if self.started_at is not None else 0
+        return {
+            "wakeups": self.wakeups,
+            "wakeups_per_minute": round(self.wakeups * 60 / elapsed, 2) if elapsed > 0 else 0.0,
+            "pending": [name for _, name in self.pending()],
+        }
+
+    def run(self):
+        """Run due tasks and sleep until the next deadline, until ``stop`` is called."""
+        self.started_at = self.clock()
+        while not self._stopped:
+            now = self.clock()
+            due = []
+            with self._lock:
+                heap = self._heap
+                while heap and (heap[0][2].cancelled or heap[0][0] <= now):
+                    _, _, task = heapq.heappop(heap)
+                    if not task.cancelled:
+                        due.append(task)
+                timeout = heap[0][0] - now if heap else None
+            for task in due:
+                self._run_task(task, now)
+            if due:
+                continue  # Tasks may have rescheduled themselves sooner than `timeout`
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+            self.wakeups += 1
+
+    def _run_task(self, task, now):
+        try:
+            task.runs += 1
+            deadline = task.fn(now)
+        except Exception as e:
+            logging.error(f"Error in scheduled task {task.name}: {e}")
+            logging.error(traceback.format_exc())
+            return
+        if deadline is not None and not task.cancelled and not self._stopped:
+            task.deadline = deadline
+            with self._lock:
+                heapq.heappush(self._heap, (deadline, next(self._sequence), task))
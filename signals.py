@@ -0,0 +1,244 @@
+import time
+import logging
+from fnmatch import fnmatch
+
+from decision import HysteresisRule
+
+SIGNAL_CPU_BUDGET = 0.001  # Fraction of one core a signal may spend reading itself; sets its interval from its cost
+MIN_SIGNAL_INTERVAL = 1  # Cheapest signals are still read at most this often (in seconds)
+MAX_SIGNAL_INTERVAL = 30  # Most expensive signals are still read at least this often (in seconds)
+COST_SMOOTHING = 0.2  # Weight of each measured read time in the running cost estimate
+PROCESS_RESCAN_INTERVAL = 600  # Re-read every process name this often, in case a PID was reused unseen (in seconds)
+
+
+class ActivitySignal:
+    """A source of activity besides input and network traffic, read on the engine's scheduler.
+
+    Subclasses set ``name`` and ``cost``, the expected seconds one ``read``
+    takes, and implement ``read``. Each signal may spend SIGNAL_CPU_BUDGET of
+    a core, so its interval is its cost divided by the budget: a process scan
+    is read less often than a CPU counter. Once measured read times exceed
+    the declared cost, the measurement is used instead. The interval is a
+    floor; the engine stretches it like the network sampling interval while
+    the signal's rules are far from flipping.
+    """
+
+    name = None
+    cost = 0.0
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.values = {}  # {rule source: value} from the last read
+        self.measured_cost = None  # Running estimate of the seconds per read
+        self.reads = 0
+        self.read_seconds = 0.0  # Total time spent reading, for the overhead metrics
+        self.period = None  # Seconds until the next read, as last scheduled by the engine
+
+    @property
+    def interval(self):
+        """Seconds between reads for this signal's cost."""
+        cost = max(self.cost, self.measured_cost or 0.0)
+        return min(max(cost / SIGNAL_CPU_BUDGET, MIN_SIGNAL_INTERVAL), MAX_SIGNAL_INTERVAL)
+
+    def sample(self, now):
+        """Read the signal and time the read; returns {rule source: value}, empty while there is no baseline."""
+        start = time.perf_counter()
+        values = self.read_values(now)
+        elapsed = time.perf_counter() - start
+        if not self.reads:
+            pass  # The first read fills cold caches; it says little about the steady cost
+        elif self.measured_cost is None:
+            self.measured_cost = elapsed
+        else:
+            self.measured_cost += COST_SMOOTHING * (elapsed - self.measured_cost)
+        self.reads += 1
+        self.read_seconds += elapsed
+        self.values = values
+        return values
+
+    def read_values(self, now):
+        """The values of every rule source this signal feeds; single-valued signals implement ``read``."""
+        value = self.read(now)
+        return {} if value is None else {self.name: value}
+
+    def read(self, now):
+        raise NotImplementedError
+
+    def reset(self):
+        """Forget any baseline, e.g. when monitoring restarts."""
+        self.values = {}
+
+    def rules(self, window, release_ratio, engage_hold, release_hold):
+        """The keep-awake rules this signal feeds."""
+        return [HysteresisRule(self.name, self.name, self.threshold, self.threshold * release_ratio,
+                               window, engage_hold, release_hold)]
+
+    def status(self):
+        return {"values": dict(self.values), "threshold": self.threshold, "interval": self.interval,
+                "period": self.period,
+                "cost_us": round((self.measured_cost or self.cost) * 1e6, 1), "reads": self.reads,
+                "read_seconds": self.read_seconds}
+
+
+class CpuSignal(ActivitySignal):
+    """System-wide CPU use in percent since the previous read; keeps compiles and renders awake."""
+
+    name = "cpu"
+    cost = 0.0001
+
+    def __init__(self, threshold):
+        super().__init__(threshold)
+        self._primed = False
+
+    def read(self, now):
+        import psutil
+
+        percent = psutil.cpu_percent(interval=None)
+        if not self._primed:
+            self._primed = True  # The first call only starts psutil's measurement
+            return None
+        return percent
+
+    def reset(self):
+        super().reset()
+        self._primed = False
+
+
+class DiskSignal(ActivitySignal):
+    """Disk read plus write rate in MB/s across all disks; keeps backups and copies awake."""
+
+    name = "disk"
+    cost = 0.0003
+
+    def __init__(self, threshold):
+        super().__init__(threshold)
+        self._previous = None  # (timestamp, total bytes) of the last read
+
+    def read(self, now):
+        import psutil
+
+        counters = psutil.disk_io_counters()
+        if counters is None:
+            return None  # No disks visible (some containers)
+        total = counters.read_bytes + counters.write_bytes
+        previous, self._previous = self._previous, (now, total)
+        if previous is None or now <= previous[0]:
+            return None
+        return max(0, total - previous[1]) / (now - previous[0]) / 1_000_000
+
+    def reset(self):
+        super().reset()
+        self._previous = None
+
+
+class ProcessTable:
+    """Running processes whose name matches one of ``patterns``, found without walking every process.
+
+    Names are cached per PID. Each refresh lists the PIDs, which is one
+    directory read on Linux, and only looks up the names of new ones.
+    Matching processes are kept as psutil handles, whose create time also
+    catches a PID reused by another program.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = tuple(patterns)
+        self.names = {}  # {pid: process name} for every PID seen
+        self.matches = {}  # {pid: psutil.Process} of the matching ones
+        self._next_rescan = 0.0
+
+    def _lookup(self, psutil, pid):
+        try:
+            process = psutil.Process(pid)
+            name = process.name()
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            return ""
+        if any(fnmatch(name, pattern) for pattern in self.patterns) and not _is_zombie(psutil, process):
+            self.matches[pid] = process
+        return name
+
+    def refresh(self, now):
+        """Update the cache; returns the {pid: psutil.Process} of the matching processes."""
+        import psutil
+
+        if now >= self._next_rescan:
+            self._next_rescan = now + PROCESS_RESCAN_INTERVAL
+            self.names.clear()
+            self.matches.clear()
+        names = self.names
+        pids = set(psutil.pids())
+        for pid in names.keys() - pids:
+            del names[pid]
+            self.matches.pop(pid, None)
+        for pid in pids - names.keys():
+            names[pid] = self._lookup(psutil, pid)
+        for pid, process in list(self.matches.items()):
+            running = process.is_running()  # False once the PID belongs to another process
+            if running and not _is_zombie(psutil, process):
+                continue
+            del self.matches[pid]  # A zombie has exited; only its parent has not collected it
+            if not running and pid in pids:
+                names[pid] = self._lookup(psutil, pid)
+        return self.matches
+
+    def matching(self, pid, patterns=None):
+        """The patterns (of ``patterns``, default all) that the process ``pid`` matches."""
+        name = self.names.get(pid, "")
+        return [pattern for pattern in patterns or self.patterns if fnmatch(name, pattern)]
+
+    def reset(self):
+        self._next_rescan = 0.0
+
+
+class ProcessSignal(ActivitySignal):
+    """Number of running processes whose name matches one of ``patterns``; see ProcessTable."""
+
+    name = "process"
+    cost = 0.003
+
+    def __init__(self, patterns):
+        super().__init__(1)  # Engaged while at least one matching process runs
+        self.table = ProcessTable(patterns)
+        self.running = ()  # Names of the matching processes at the last read
+
+    def read(self, now):
+        matches = self.table.refresh(now)
+        self.running = tuple(sorted({self.table.names[pid] for pid in matches}))
+        return len(matches)
+
+    def reset(self):
+        super().reset()
+        self.table.reset()
+
+    def rules(self, window, release_ratio, engage_hold, release_hold):
+        # Count-based: engage at one process, release at none. The window only holds the latest read.
+        return [HysteresisRule(self.name, self.name, 1, 1, MIN_SIGNAL_INTERVAL / 2, engage_hold, release_hold)]
+
+    def status(self):
+        return dict(super().status(), patterns=list(self.table.patterns), running=list(self.running))
+
+
+def _is_zombie(psutil, process):
+    try:
+        return process.status() == psutil.STATUS_ZOMBIE
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return False
+
+
+def build_signals(cpu_threshold=None, disk_threshold=None, processes=(), process_traffic=()):
+    """The signals enabled by the given settings; None or empty disables one.
+
+    ``process_traffic`` is a list of (process name pattern, Mbps threshold) pairs.
+    """
+    signals = []
+    if cpu_threshold is not None:
+        signals.append(CpuSignal(cpu_threshold))
+    if disk_threshold is not None:
+        signals.append(DiskSignal(disk_threshold))
+    if processes:
+        signals.append(ProcessSignal(processes))
+    if process_traffic:
+        from attribution import ProcessTrafficSignal
+        signals.append(ProcessTrafficSignal(process_traffic))
+    for signal in signals:
+        logging.debug(f"Activity signal {signal.name}: threshold {signal.threshold}, every {signal.interval:g}s")
+    return signals
@@ -0,0 +1,365 @@
+import os
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from decision import DEFAULT_DECISION_WINDOW, DEFAULT_RELEASE_RATIO, DEFAULT_ENGAGE_HOLD, DEFAULT_RELEASE_HOLD
+from sampler import InterfaceFilter, counter_delta, DEFAULT_EXCLUDE_INTERFACES
+from signals import build_signals
+from tracefile import read_trace, SETTINGS, COUNTERS, GONE, ACTIVITY, STOP, SIGNAL
+
+TRACE_SUFFIX = ".trace"  # Files picked up when a directory is given
+TRANSFER_FLOOR = 1.0  # Mbps in either direction that counts as a transfer in progress
+TRANSFER_GAP = 30  # Seconds below the floor that still belong to the same transfer
+TRANSFER_MIN_DURATION = 30  # Shorter bursts are not counted as transfers (in seconds)
+
+# Grid searched when the command line names no values
+DEFAULT_DOWNLOAD_GRID = (1, 2, 5, 10, 20, 50)  # Mbps
+DEFAULT_UPLOAD_GRID = (1, 5, 10, 20)  # Mbps
+DEFAULT_INACTIVITY_GRID = (60, 300, 600, 1800, 3600)  # Seconds
+
+# Per-configuration results, in this order along the last axis of the result array
+RESULT_FIELDS = ("hours_slept", "sleeps", "transfers_interrupted", "false_keeps")
+
+
+class Session:
+    """One monitoring session of a trace as arrays: tick times, total rates, input times and signal readings."""
+
+    def __init__(self, start, end, times, download, upload, inputs, settings, signals=None, stopped=False):
+        self.start = start
+        self.end = end
+        self.stopped = stopped  # Ended by a STOP record rather than by the trace or a new session
+        self.times = np.asarray(times, dtype=np.float64)
+        self.download = np.asarray(download, dtype=np.float64)
+        self.upload = np.asarray(upload, dtype=np.float64)
+        self.inputs = np.unique(np.asarray(inputs, dtype=np.float64))
+        self.settings = settings
+        # {rule source: (times, values)} of the cpu, disk, process and traffic readings
+        self.signals = {source: (np.asarray(times, dtype=np.float64), np.asarray(values, dtype=np.float64))
+                        for source, (times, values) in (signals or {}).items()}
+
+
+def load_sessions(path):
+    """Split a trace into Sessions, computing rates the way NetworkSampler.tick does.
+
+    Only changed counters are recorded, so an interface missing from a
+    COUNTERS record moved no bytes and only the recorded ones are summed.
+    """
+    sessions = []
+    state = None
+
+    def finish(end, stopped=False):
+        if state is not None and state["times"]:
+            sessions.append(Session(state["start"], end, state["times"], state["download"], state["upload"],
+                                    state["inputs"], state["settings"], state["signals"], stopped))
+
+    last = None
+    for kind, timestamp, data in read_trace(path):
+        if kind == SETTINGS:
+            finish(last)
+            interface_filter = InterfaceFilter(data.get("include_interfaces", ()),
+                                               data.get("exclude_interfaces", DEFAULT_EXCLUDE_INTERFACES))
+            state = {"start": timestamp, "settings": data, "matches": {}, "filter": interface_filter,
+                     "counters": None, "previous": None, "times": [], "download": [], "upload": [], "inputs": [],
+                     "signals": {}}
+        elif state is None:
+            continue  # Records of a session whose start was cut off
+        elif kind == COUNTERS:
+            matches = state["matches"]
+            counters = state["counters"]
+            if counters is None:
+                # The first reading of a session has every interface; it only sets the baseline
+                state["counters"] = {name: (nic.bytes_recv, nic.bytes_sent) for name, nic in data.items()}
+            else:
+                down_bytes = up_bytes = 0
+                for name, nic in data.items():
+                    selected = matches.get(name)
+                    if selected is None:
+                        selected = matches[name] = state["filter"].matches(name)
+                    old = counters.get(name)
+                    counters[name] = (nic.bytes_recv, nic.bytes_sent)
+                    if selected and old is not None:
+                        down_bytes += counter_delta(old[0], nic.bytes_recv)
+                        up_bytes += counter_delta(old[1], nic.bytes_sent)
+                elapsed = timestamp - state["previous"]
+                if elapsed > 0:
+                    scale = 8 / (elapsed * 1_000_000)
+                    state["times"].append(timestamp)
+                    state["download"].append(down_bytes * scale)
+                    state["upload"].append(up_bytes * scale)
+            state["previous"] = timestamp
+        elif kind == GONE and state["counters"] is not None:
+            for name in data:
+                state["counters"].pop(name, None)
+        elif kind == ACTIVITY:
+            state["inputs"].append(data)
+        elif kind == SIGNAL:
+            times, values = state["signals"].setdefault(data[0], ([], []))
+            times.append(timestamp)
+            values.append(data[1])
+        elif kind == STOP:
+            finish(timestamp, stopped=True)
+            state = None
+        last = timestamp
+    finish(last)
+    return sessions
+
+
+def windowed_mean(times, values, window):
+    """WindowedMean.add over a whole session at once: the mean of each sample's last ``window`` seconds."""
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    first = np.searchsorted(times, times - window, side="right")
+    last = np.arange(1, len(times) + 1)
+    return np.maximum(0.0, (sums[last] - sums[first]) / (last - first))
+
+
+def _hold_met(times, crossing, hold):
+    """Samples where ``crossing`` has held for ``hold`` seconds since its run began."""
+    index = np.arange(len(times))
+    run_starts = crossing & ~np.concatenate(([False], crossing[:-1]))
+    run_start = np.maximum.accumulate(np.where(run_starts, index, 0))
+    return crossing & (times - times[run_start] >= hold)
+
+
+def engaged_states(times, mean, engage, release, engage_hold, release_hold):
+    """HysteresisRule.engaged after each sample, without a Python loop.
+
+    Runs above ``engage`` and below ``release`` never overlap, so a run can
+    only be in progress while the rule is in the state it would leave. The
+    rule is therefore engaged exactly when its latest engage event is later
+    than its latest release event.
+    """
+    index = np.arange(len(times))
+    engage_at = _hold_met(times, mean >= engage, engage_hold)
+    release_at = _hold_met(times, mean < release, release_hold)
+    last_engage = np.maximum.accumulate(np.where(engage_at, index, -1))
+    last_release = np.maximum.accumulate(np.where(release_at, index, -1))
+    return last_engage > last_release
+
+
+def _state_at(times, states, at):
+    """Each rule's state as of its last sample at or before each of ``at``; False before its first."""
+    index = np.searchsorted(times, at, side="right") - 1
+    return (index >= 0) & states[np.maximum(index, 0)]
+
+
+def signal_states(session, window, release_ratio, engage_hold, release_hold):
+    """(times, engaged) of each activity signal rule of the session, built as tracefile replay builds them."""
+    settings = session.settings
+    states = []
+    for signal in build_signals(settings.get("cpu_threshold"), settings.get("disk_threshold"),
+                                settings.get("keep_awake_processes", ()), settings.get("process_traffic", ())):
+        for rule in signal.rules(window, release_ratio, engage_hold, release_hold):
+            readings = session.signals.get(rule.source)
+            if readings is None or not len(readings[0]):
+                continue
+            times, values = readings
+            mean = windowed_mean(times, values, rule.mean.window)
+            states.append((times, engaged_states(times, mean, rule.engage, rule.release,
+                                                 rule.engage_hold, rule.release_hold)))
+    return states
+
+
+def transfers(session):
+    """(starts, ends) of the transfers in a session, independent of any configuration."""
+    active = session.times[np.maximum(session.download, session.upload) >= TRANSFER_FLOOR]
+    if not len(active):
+        return active, active
+    breaks = np.flatnonzero(np.diff(active) > TRANSFER_GAP)
+    starts = active[np.concatenate(([0], breaks + 1))]
+    ends = active[np.concatenate((breaks, [len(active) - 1]))]
+    long_enough = ends - starts >= TRANSFER_MIN_DURATION
+    return starts[long_enough], ends[long_enough]
+
+
+def _runs(mask):
+    """(first, last) indices of each run of True in ``mask``."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) - 1
+
+
+def _overlaps(starts, ends, transfer_starts, transfer_ends):
+    """Whether each [start, end] interval overlaps any transfer."""
+    begun = np.searchsorted(transfer_starts, ends, side="right")
+    finished = np.searchsorted(transfer_ends, starts, side="left")
+    return begun > finished
+
+
+def _configurations(session, window, download_thresholds, upload_thresholds, release_ratio, engage_hold,
+                    release_hold):
+    """Yield (d, u, engaged, anchors) for every (download, upload) threshold pair of one session.
+
+    ``engaged`` is whether a network rule is engaged after each sample, and
+    ``anchors`` the sorted times at which the inactivity timer restarts.
+    """
+    settings = session.settings
+    release_ratio = settings.get("release_ratio", DEFAULT_RELEASE_RATIO) if release_ratio is None else release_ratio
+    engage_hold = settings.get("engage_hold", DEFAULT_ENGAGE_HOLD) if engage_hold is None else engage_hold
+    release_hold = settings.get("release_hold", DEFAULT_RELEASE_HOLD) if release_hold is None else release_hold
+    times, inputs = session.times, session.inputs
+    download_mean = windowed_mean(times, session.download, window)
+    upload_mean = windowed_mean(times, session.upload, window)
+    download_states = [engaged_states(times, download_mean, threshold, threshold * release_ratio,
+                                      engage_hold, release_hold) for threshold in download_thresholds]
+    upload_states = [engaged_states(times, upload_mean, threshold, threshold * release_ratio,
+                                    engage_hold, release_hold) for threshold in upload_thresholds]
+    # Input from before monitoring started counts as the start, as in SleepPolicy.observe_activity
+    input_anchors = np.concatenate(([session.start], inputs[inputs > session.start]))
+    # Signal rules do not depend on the grid: their states at every sample, network or signal, and their releases
+    signals = signal_states(session, window, release_ratio, engage_hold, release_hold)
+    signal_times = np.unique(np.concatenate([rule_times for rule_times, _ in signals] + [np.empty(0)]))
+    signal_engaged = np.zeros(len(signal_times), dtype=bool)
+    signal_engaged_at_ticks = np.zeros(len(times), dtype=bool)
+    signal_releases = [np.empty(0)]
+    for rule_times, rule_engaged in signals:
+        signal_engaged |= _state_at(rule_times, rule_engaged, signal_times)
+        signal_engaged_at_ticks |= _state_at(rule_times, rule_engaged, times)
+        signal_releases.append(rule_times[1:][rule_engaged[:-1] & ~rule_engaged[1:]])
+    signal_releases = np.concatenate(signal_releases)
+    for (d, download_engaged), (u, upload_engaged) in itertools.product(enumerate(download_states),
+                                                                        enumerate(upload_states)):
+        engaged = download_engaged | upload_engaged
+        # Any engaged rule resets the timer at every sample, and a rule also on the sample it releases
+        resets = engaged | signal_engaged_at_ticks | np.concatenate(([False], engaged[:-1]))
+        signal_resets = signal_times[signal_engaged | _state_at(times, engaged, signal_times)]
+        anchors = np.sort(np.concatenate((input_anchors, times[resets], signal_resets, signal_releases)),
+                          kind="stable")
+        yield d, u, engaged, anchors
+
+
+def _sleeps(session, anchors, limit):
+    """(sleeps, wakes): when the machine sleeps with timer restarts at ``anchors``, and the input that wakes it.
+
+    A machine that is asleep ignores later expiries, and wakes at the next
+    recorded input after its sleep, or at the end of the session.
+    """
+    gaps = np.diff(np.concatenate((anchors, [session.end])))
+    # Sleep needs inactivity >= limit, as in SleepPolicy.should_sleep. But the live check samples
+    # before deciding, so a reset landing exactly at the expiry still counts, and a stopped
+    # session never sleeps at its stop. Only the open end of a session sleeps at the expiry itself.
+    expired = gaps > limit
+    if not session.stopped:
+        expired[-1] = gaps[-1] >= limit
+    sleeps = anchors[expired] + limit
+    inputs = session.inputs
+    wake_index = np.searchsorted(inputs, sleeps, side="right")
+    if len(sleeps):
+        # Later expiries before the same wake-up happen while already asleep
+        first_sleep = np.concatenate(([True], wake_index[1:] != wake_index[:-1]))
+        sleeps, wake_index = sleeps[first_sleep], wake_index[first_sleep]
+    return sleeps, np.concatenate((inputs, [session.end]))[wake_index]
+
+
+def sleep_times(session, window, download_threshold, upload_threshold, limit,
+                release_ratio=None, engage_hold=None, release_hold=None):
+    """The times one configuration would put the machine to sleep in one session, as tracefile.Replay does."""
+    if len(session.times) == 0:
+        return []
+    (_, _, _, anchors), = _configurations(session, window, [download_threshold], [upload_threshold],
+                                          release_ratio, engage_hold, release_hold)
+    return _sleeps(session, anchors, limit)[0].tolist()
+
+
+def evaluate_session(session, window, download_thresholds, upload_thresholds, limits,
+                     release_ratio=None, engage_hold=None, release_hold=None):
+    """Results for every (download, upload, limit) combination on one session and window.
+
+    Returns an array of shape (downloads, uploads, limits, len(RESULT_FIELDS)).
+    Sleep is modelled as in SleepPolicy: the timer restarts on input and on
+    every sample, network or activity signal, at which any rule is engaged or
+    one just released, and sleep fires once it runs for ``limit`` seconds.
+    Signal rules use the session's own thresholds; only the network ones
+    are swept. A sleep lasts until the next recorded input (or the end of the
+    session), which restarts the timer; tracefile.Replay uses the same model,
+    so both find the same sleeps. A transfer is interrupted when a sleep falls
+    inside it. A keep is a run of engaged network rules that outlasted the
+    limit since the last input; it is false when no transfer overlaps it.
+    """
+    times, inputs = session.times, session.inputs
+    results = np.zeros((len(download_thresholds), len(upload_thresholds), len(limits), len(RESULT_FIELDS)))
+    if len(times) == 0:
+        return results
+    transfer_starts, transfer_ends = transfers(session)
+    input_anchors = np.concatenate(([session.start], inputs[inputs > session.start]))
+    for d, u, engaged, anchors in _configurations(session, window, download_thresholds, upload_thresholds,
+                                                  release_ratio, engage_hold, release_hold):
+        first, last = _runs(engaged)
+        keep_starts, keep_ends = times[first], times[last]
+        since_input = keep_ends - input_anchors[np.searchsorted(input_anchors, keep_ends, side="right") - 1]
+        false_keep = ~_overlaps(keep_starts, keep_ends, transfer_starts, transfer_ends)
+        for k, limit in enumerate(limits):
+            sleeps, wakes = _sleeps(session, anchors, limit)
+            interrupted = 0
+            if len(transfer_starts):
+                inside = np.searchsorted(transfer_starts, sleeps, side="right") - 1
+                hit = (inside >= 0) & (sleeps < transfer_ends[np.maximum(inside, 0)])
+                interrupted = len(np.unique(inside[hit]))
+            asleep = np.searchsorted(sleeps, keep_starts, side="right") - 1
+            awake = (asleep < 0) | (keep_starts >= np.concatenate((wakes, [0.0]))[asleep])
+            results[d, u, k] = (np.sum(wakes - sleeps) / 3600, len(sleeps), interrupted,
+                                np.count_nonzero((since_input >= limit) & false_keep & awake))
+    return results
+
+
+def _evaluate_trace(path, window, download_thresholds, upload_thresholds, limits, holds):
+    """Worker task: the summed results of every session of one trace, for one window."""
+    total = np.zeros((len(download_thresholds), len(upload_thresholds), len(limits), len(RESULT_FIELDS)))
+    for session in load_sessions(path):
+        total += evaluate_session(session, window, download_thresholds, upload_thresholds, limits, *holds)
+    return total
+
+
+def trace_paths(paths):
+    """Expand directories to the trace files inside them, recursively."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, names in os.walk(path):
+                found += sorted(os.path.join(directory, name) for name in names if name.endswith(TRACE_SUFFIX))
+        else:
+            found.append(path)
+    return found
+
+
+def sweep(paths, download_thresholds, upload_thresholds, limits, windows=(DEFAULT_DECISION_WINDOW,),
+          release_ratio=None, engage_hold=None, release_hold=None, workers=None):
+    """Evaluate the configuration grid over every trace in ``paths`` on a process pool.
+
+    Each (trace, window) pair is one task, so months of traces from many
+    hosts spread over all cores. Returns a list of dicts, one per
+    configuration, with the results summed over all traces.
+    """
+    paths = trace_paths(paths)
+    holds = (release_ratio, engage_hold, release_hold)
+    shape = (len(download_thresholds), len(upload_thresholds), len(limits), len(RESULT_FIELDS))
+    totals = {window: np.zeros(shape) for window in windows}
+    tasks = [(path, window) for path in paths for window in windows]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_evaluate_trace, path, window, download_thresholds, upload_thresholds, limits, holds)
+                   for path, window in tasks]
+        for (path, window), future in zip(tasks, futures):
+            totals[window] += future.result()
+    rows = []
+    for window, total in totals.items():
+        for (d, download), (u, upload), (k, limit) in itertools.product(
+                enumerate(download_thresholds), enumerate(upload_thresholds), enumerate(limits)):
+            row = {"download_threshold": download, "upload_threshold": upload, "inactivity_limit": limit,
+                   "window": window}
+            hours, sleeps, interrupted, false_keeps = total[d, u, k].tolist()
+            row.update(hours_slept=hours, sleeps=int(sleeps), transfers_interrupted=int(interrupted),
+                       false_keeps=int(false_keeps))
+            rows.append(row)
+    return rows
+
+
+def format_table(rows, top=None):
+    """Configurations ranked by interrupted transfers, then false keeps, then most hours slept."""
+    ranked = sorted(rows, key=lambda r: (r["transfers_interrupted"], r["false_keeps"], -r["hours_slept"]))
+    lines = [f"{'down':>7} {'up':>7} {'limit':>7} {'window':>7} {'hours slept':>12} {'sleeps':>7} "
+             f"{'interrupted':>12} {'false keeps':>12}"]
+    for row in ranked[:top]:
+        lines.append(f"{row['download_threshold']:7g} {row['upload_threshold']:7g} {row['inactivity_limit']:7g} "
+                     f"{row['window']:7g} {row['hours_slept']:12.1f} {row['sleeps']:7.0f} "
+                     f"{row['transfers_interrupted']:12.0f} {row['false_keeps']:12.0f}")
+    return "\n".join(lines)
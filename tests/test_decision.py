@@ -0,0 +1,55 @@
+import pytest
+
+from decision import HysteresisRule, DecisionEngine, SleepPolicy, network_rules, reset_cause
+
+
+def test_rule_engages_after_hold_and_releases_below_release_threshold():
+    rule = HysteresisRule("download", "download", engage=10, release=5, window=1, engage_hold=2, release_hold=3)
+    assert not rule.update(0, 20)
+    assert not rule.update(1, 20)
+    assert rule.update(2, 20) and rule.engaged
+    assert not rule.update(3, 7)  # Between the thresholds: stays engaged
+    assert not rule.update(4, 1)
+    assert not rule.update(6, 1)
+    assert rule.update(7, 1) and not rule.engaged
+
+
+def test_rule_rejects_release_above_engage():
+    with pytest.raises(ValueError):
+        HysteresisRule("download", "download", engage=5, release=10)
+
+
+def test_policy_sleeps_after_the_limit_without_activity():
+    policy = SleepPolicy(DecisionEngine(network_rules(10, 10, window=1, release_hold=0)), 60, now=0)
+    assert policy.time_remaining(30) == 30
+    assert not policy.should_sleep(59.9)
+    assert policy.should_sleep(60)
+    policy.observe_activity(50)
+    assert not policy.should_sleep(60)
+    assert policy.time_remaining(60, last_activity=55) == 55  # Unobserved input counts without being recorded
+    assert policy.last_activity == 50
+
+
+@pytest.mark.parametrize("source, cause", [
+    ("download", "network"), ("upload", "network"), ("cpu", "cpu"), ("disk", "disk"), ("process", "process"),
+    ("traffic:rsync", "traffic"),
+])
+def test_reset_cause_names_the_rule_source(source, cause):
+    causes = []
+    rule = HysteresisRule(source, source, engage=1, release=1, window=1, engage_hold=0, release_hold=0)
+    policy = SleepPolicy(DecisionEngine([rule]), 60, now=0, on_reset=causes.append)
+    policy.observe_sample(1, {source: 5})
+    policy.observe_sample(2, {source: 5})  # Still engaged: resets again
+    policy.observe_activity(3)
+    assert causes == [cause, cause, "input"]
+    assert reset_cause(rule) == cause
+
+
+def test_policy_holds_the_timer_while_a_rule_is_engaged():
+    policy = SleepPolicy(DecisionEngine(network_rules(10, 10, window=1, release_hold=0)), 60, now=0)
+    policy.observe_sample(10, {"download": 50, "upload": 0})
+    assert policy.time_remaining(500) == 60
+    assert not policy.should_sleep(500)
+    policy.observe_sample(20, {"download": 0, "upload": 0})  # Releases; counts as activity until then
+    assert policy.last_activity == 20
+    assert policy.should_sleep(80)
@@ -0,0 +1,23 @@
+import pytest
+
+from idle import FakeIdleBackend, IDLE_BACKENDS, start_idle_backend
+from scheduler import VirtualClock
+
+
+def test_fake_backend_reports_the_input_it_was_given():
+    clock = VirtualClock(100)
+    backend = FakeIdleBackend(clock)
+    assert backend.last_activity() == 100
+    clock.advance(30)
+    assert backend.idle_seconds() == 30
+    backend.touch(120)
+    assert backend.last_activity() == 120
+    backend.touch(110)  # Input only moves forward
+    assert backend.last_activity() == 120
+
+
+def test_the_fake_backend_is_not_a_command_line_choice():
+    assert "fake" not in IDLE_BACKENDS
+    assert start_idle_backend("fake").name == "fake"
+    with pytest.raises(ValueError):
+        start_idle_backend("bogus")
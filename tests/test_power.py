@@ -0,0 +1,83 @@
+import sys
+import threading
+import time
+
+import pytest
+
+from engine import MonitorEngine
+from fakes import FakeCounters, FakeLogind
+from power import LogindPowerBackend, DBusError
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="logind is Linux-only")
+
+
+@pytest.fixture
+def logind(tmp_path):
+    fake = FakeLogind(str(tmp_path / "bus.sock")).start()
+    yield fake
+    fake.stop()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def events(logind):
+    return [event for _, event, _ in logind.events]
+
+
+def test_hold_release_and_suspend_round_trip(logind):
+    backend = LogindPowerBackend(logind.address)
+    backend.start()
+    try:
+        assert backend.set_awake(True, "download activity")
+        assert not backend.set_awake(True, "download activity")  # Already held: no second Inhibit
+        assert wait_for(lambda: len(logind.inhibitors) == 1)
+        assert backend.set_awake(False)
+        assert wait_for(lambda: not logind.inhibitors)
+        backend.set_awake(True, "upload activity")
+        assert backend.suspend()  # Drops its own inhibitor before asking
+    finally:
+        backend.stop()
+    assert events(logind) == ["inhibit", "release", "inhibit", "release", "suspend"]
+    assert backend.counters()["transitions"] == 4
+
+
+def test_suspend_is_refused_while_another_inhibitor_blocks_it(logind):
+    holder, sleeper = LogindPowerBackend(logind.address), LogindPowerBackend(logind.address)
+    holder.start()
+    sleeper.start()
+    try:
+        holder.set_awake(True, "other program")
+        assert wait_for(lambda: len(logind.inhibitors) == 1)
+        with pytest.raises(DBusError):
+            sleeper.suspend()
+    finally:
+        holder.stop()
+        sleeper.stop()
+    assert "suspend-refused" in events(logind)
+
+
+def test_engine_inhibits_during_a_transfer_and_sleeps_once_idle(logind, monkeypatch):
+    monkeypatch.setenv("DBUS_SYSTEM_BUS_ADDRESS", logind.address)
+    slept = threading.Event()
+    engine = MonitorEngine(1, 1, 1, idle_backend="fake", power_backend="logind", decision_window=0.5,
+                           release_hold=0, max_sample_interval=1, on_sleep=lambda: slept.set() or True)
+    counters = FakeCounters(time.monotonic, ("eth0",))
+    engine.sampler.read_counters = counters
+    counters.set_rate("eth0", download=50)
+    engine.run()
+    try:
+        engine.start()
+        assert wait_for(lambda: engine.power.holding)
+        assert not slept.is_set()
+        counters.set_rate("eth0", download=0)
+        assert slept.wait(10)
+    finally:
+        engine.shutdown()
+    assert events(logind)[:2] == ["inhibit", "release"]
@@ -0,0 +1,78 @@
+import pytest
+
+from fakes import FakeCounters
+from sampler import (counter_delta, InterfaceFilter, AdaptiveInterval, NetworkSampler, COUNTER_WRAP,
+                     DEFAULT_EXCLUDE_INTERFACES)
+from scheduler import VirtualClock
+
+
+def test_counter_delta_counts_forward_and_across_a_32_bit_wrap():
+    assert counter_delta(100, 250) == 150
+    assert counter_delta(COUNTER_WRAP - 10, 5) == 15
+
+
+def test_counter_delta_ignores_a_reset():
+    assert counter_delta(5_000_000, 1_000) == 0
+    assert counter_delta(COUNTER_WRAP * 4, 10) == 0  # 64-bit counters never wrap at 32 bits
+
+
+def test_interface_filter_excludes_virtual_interfaces_by_default():
+    names = dict.fromkeys(("eth0", "wlan0", "lo", "docker0", "veth1a2b", "br-1234", "tun0"))
+    assert InterfaceFilter().select(names) == ("eth0", "wlan0")
+    assert InterfaceFilter(("wl*",)).select(names) == ("wlan0",)
+    assert InterfaceFilter((), ()).select(names) == tuple(sorted(names))
+    assert "veth*" in DEFAULT_EXCLUDE_INTERFACES
+
+
+def test_interface_filter_rescans_when_interfaces_change():
+    interface_filter = InterfaceFilter()
+    assert interface_filter.select({"eth0": None}) == ("eth0",)
+    assert interface_filter.select({"eth0": None, "eth1": None}) == ("eth0", "eth1")
+    assert interface_filter.select({"eth1": None}) == ("eth1",)
+
+
+def test_adaptive_interval_backs_off_only_far_from_thresholds_and_expiry():
+    adaptive = AdaptiveInterval(1, max_interval=10, expiry_accuracy=2)
+    assert adaptive.next_interval(0.0) == 10
+    assert adaptive.next_interval(0.25) == 5.5
+    assert adaptive.next_interval(0.5) == 1
+    assert adaptive.next_interval(1.0) == 1
+    assert adaptive.next_interval(0.0, time_remaining=8) == 4
+    assert adaptive.next_interval(0.0, time_remaining=1) == 2  # Never below the expiry accuracy...
+    assert AdaptiveInterval(3, 10, 2).next_interval(0.0, time_remaining=1) == 3  # ...nor the tick
+    with pytest.raises(ValueError):
+        AdaptiveInterval(5, max_interval=1)
+
+
+def test_sampler_measures_the_configured_rates_on_a_virtual_clock():
+    clock = VirtualClock()
+    counters = FakeCounters(clock, ("eth0", "docker0"))
+    counters.set_rate("eth0", download=8, upload=2)
+    counters.set_rate("docker0", download=100)  # Excluded by default
+    sampler = NetworkSampler(1, read_counters=counters, clock=clock)
+    samples = []
+    sampler.on_sample = lambda now, download, upload, interfaces: samples.append((now, download, upload))
+    assert not sampler.tick()  # Baseline
+    clock.advance(2)
+    assert sampler.tick()
+    assert samples == [(2, pytest.approx(8), pytest.approx(2))]
+
+
+def test_a_failing_trace_disables_tracing_but_not_sampling():
+    clock = VirtualClock()
+    counters = FakeCounters(clock, ("eth0",))
+    counters.set_rate("eth0", download=4)
+    sampler = NetworkSampler(1, read_counters=counters, clock=clock)
+    recorded = []
+
+    def broken_trace(now, readings):
+        recorded.append(sorted(readings))
+        raise OSError("disk full")
+
+    sampler.on_counters = broken_trace
+    sampler.tick()
+    clock.advance(1)
+    assert sampler.tick()
+    assert sampler.on_counters is None
+    assert recorded == [["eth0"]]
+    assert sampler.speeds()[0] == pytest.approx(4)
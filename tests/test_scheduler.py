@@ -0,0 +1,56 @@
+from scheduler import Scheduler, VirtualClock
+
+
+def test_due_tasks_run_in_deadline_order_then_in_submission_order():
+    clock = VirtualClock(100)
+    scheduler = Scheduler(clock)
+    ran = []
+    for deadline, name in ((30, "c"), (10, "a"), (20, "b1"), (20, "b2"), (40, "d")):
+        scheduler.call_at(deadline, lambda now, name=name: ran.append(name), name)
+    scheduler.call_at(50, lambda now: scheduler.stop(), "stop")
+    scheduler.run()
+    assert ran == ["a", "b1", "b2", "c", "d"]
+
+
+def test_cancelled_tasks_do_not_run():
+    clock = VirtualClock(10)
+    scheduler = Scheduler(clock)
+    ran = []
+    scheduler.call_at(1, lambda now: ran.append("kept"))
+    scheduler.call_at(2, lambda now: ran.append("cancelled")).cancel()
+    scheduler.call_at(3, lambda now: scheduler.stop())
+    scheduler.run()
+    assert ran == ["kept"]
+
+
+def test_a_task_reschedules_itself_with_its_return_value():
+    clock = VirtualClock()
+    scheduler = Scheduler(clock)
+    runs = []
+
+    def task(now):
+        runs.append(now)
+        if len(runs) == 3:
+            scheduler.stop()
+        clock.advance(5)  # The work takes five virtual seconds
+        return now + 5
+
+    scheduler.call_at(0, task)
+    scheduler.run()
+    assert runs == [0, 5, 10]
+
+
+def test_every_skips_missed_runs_instead_of_queueing_them():
+    clock = VirtualClock()
+    scheduler = Scheduler(clock)
+    runs = []
+
+    def tick(now):
+        runs.append(now)
+        clock.advance(25 if len(runs) == 1 else 10)  # The first run overruns two whole periods
+        if len(runs) == 3:
+            scheduler.stop()
+
+    scheduler.every(10, tick)
+    scheduler.run()
+    assert runs == [0, 25, 35]
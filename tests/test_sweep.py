@@ -0,0 +1,49 @@
+import random
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from sampler import NicCounters  # noqa: E402
+from sweep import load_sessions, sleep_times, evaluate_session  # noqa: E402
+from tracefile import TraceWriter, Replay  # noqa: E402
+
+SETTINGS = {"download_threshold": 5, "upload_threshold": 5, "cpu_threshold": 50, "decision_window": 5,
+            "release_ratio": 0.5, "engage_hold": 0, "release_hold": 2}
+
+
+def write_trace(path, seed, limit, stop):
+    """A 4000 s trace with transfers, CPU load and input recorded up to a second late."""
+    rng = random.Random(seed)
+    transfers = [(start, start + rng.uniform(5, 80)) for start in sorted(rng.uniform(0, 4000) for _ in range(8))]
+    busy = [(start, start + rng.uniform(5, 80)) for start in sorted(rng.uniform(0, 4000) for _ in range(5))]
+    writer = TraceWriter(str(path))
+    writer.settings(0.0, dict(SETTINGS, inactivity_limit=limit))
+    received = 0
+    last_input = None
+    for second in range(4000):
+        t = float(second)
+        received += 1 + (1_250_000 if any(a <= t < b for a, b in transfers) else 0)
+        writer.counters(t, {"eth0": NicCounters(0, received)})
+        if rng.random() < 0.01:
+            last_input = t - rng.choice([0.0, 0.3, rng.uniform(0, 0.99)])
+        if last_input is not None:
+            writer.activity(t, last_input)
+        if second % 2 == 0:
+            writer.signal(t + 0.5, "cpu", 90.0 if any(a <= t < b for a, b in busy) else 3.0)
+    if stop:
+        writer.stop(4000.0)
+    writer.close()
+
+
+@pytest.mark.parametrize("seed", range(12))
+def test_sweep_and_replay_find_the_same_sleeps(tmp_path, seed):
+    limit = (20, 30, 45, 60)[seed % 4]
+    path = tmp_path / "host.trace"
+    write_trace(path, seed, limit, stop=seed % 3 != 0)
+    replayed = [event["time"] for event in Replay().run(str(path))]
+    session, = load_sessions(str(path))
+    swept = sleep_times(session, 5, 5, 5, limit)
+    assert len(replayed) > 1
+    assert swept == pytest.approx(replayed)
+    assert evaluate_session(session, 5, [5], [5], [limit])[0, 0, 0, 1] == len(replayed)
@@ -0,0 +1,42 @@
+from sampler import NicCounters
+from tracefile import TraceWriter, Replay, read_trace, COUNTERS, GONE
+
+
+def test_an_idle_trace_sleeps_once(tmp_path):
+    path = str(tmp_path / "idle.trace")
+    writer = TraceWriter(path)
+    writer.settings(1000.0, {"inactivity_limit": 60})
+    for second in range(1000, 1400):
+        writer.counters(float(second), {"eth0": NicCounters(0, second)})
+    writer.close()
+    assert [event["time"] for event in Replay().run(path)] == [1060.0]
+
+
+def test_input_after_a_sleep_wakes_the_machine(tmp_path):
+    path = str(tmp_path / "wake.trace")
+    writer = TraceWriter(path)
+    writer.settings(0.0, {"inactivity_limit": 60})
+    for second in range(300):
+        writer.counters(float(second), {"eth0": NicCounters(0, second)})
+        if second == 100:
+            writer.activity(100.0, 99.5)
+    writer.close()
+    assert [event["time"] for event in Replay().run(path)] == [60.0, 159.5]
+
+
+def test_departed_interfaces_give_their_ids_to_new_ones(tmp_path):
+    path = str(tmp_path / "churn.trace")
+    writer = TraceWriter(path)
+    writer.settings(0.0, {})
+    for tick in range(1000):
+        writer.counters(float(tick), {"eth0": NicCounters(0, tick), f"veth{tick}": NicCounters(tick, tick)})
+    writer.close()
+    assert len(writer._ids) == 2
+    seen, gone = set(), set()
+    for kind, _, data in read_trace(path):
+        if kind == COUNTERS:
+            seen.update(data)
+        elif kind == GONE:
+            gone.update(data)
+    assert seen == {"eth0"} | {f"veth{tick}" for tick in range(1000)}
+    assert gone == {f"veth{tick}" for tick in range(999)}
@@ -0,0 +1,334 @@
+import json
+import struct
+import threading
+import time
+
+from decision import DecisionEngine, SleepPolicy, network_rules, DEFAULT_DECISION_WINDOW, \
+    DEFAULT_RELEASE_RATIO, DEFAULT_ENGAGE_HOLD, DEFAULT_RELEASE_HOLD
+from scheduler import VirtualClock
+from signals import build_signals
+from sampler import NetworkSampler, InterfaceFilter, NicCounters, CHECK_INTERVAL, DEFAULT_EXCLUDE_INTERFACES
+
+TRACE_MAGIC = b"SSTRACE2"
+TRACE_MAGIC_V1 = b"SSTRACE1"  # 16-bit ids; still read
+TRACE_FLUSH_INTERVAL = 5  # Seconds of trace kept in the write buffer at most
+
+# Record types; every record is <type:B><payload length:H><payload>
+SETTINGS, NAME, COUNTERS, ACTIVITY, RULE, SLEEP, GONE, STOP, SIGNAL = range(1, 10)
+_HEADER = struct.Struct("<BH")
+_TIME = struct.Struct("<d")
+_COUNT = struct.Struct("<dH")
+_PAIR = struct.Struct("<dd")
+# Records holding a name id; SSTRACE1 used 16-bit ids, which a host with interface churn outgrows
+_ID = struct.Struct("<I")
+_NIC = struct.Struct("<IQQ")
+_RULE = struct.Struct("<dIBd")
+_SIGNAL = struct.Struct("<dId")
+_V1_STRUCTS = (struct.Struct("<H"), struct.Struct("<HQQ"), struct.Struct("<dHBd"), struct.Struct("<dHd"))
+
+
+class TraceWriter:
+    """Append raw counter readings, input times and decisions to a compact binary trace.
+
+    Counters are written only for interfaces whose bytes changed since the
+    previous tick, and names once per file, so an idle machine costs a few
+    bytes per tick. The ids of departed interfaces are given to the next new
+    ones, so interface churn does not grow the name table. Writes go to a
+    buffer flushed every TRACE_FLUSH_INTERVAL seconds; safe to call from any
+    thread.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, "a+b")
+        if self.file.tell() == 0:
+            self.file.write(TRACE_MAGIC)
+        else:
+            self.file.seek(0)
+            magic = self.file.read(len(TRACE_MAGIC))
+            if magic != TRACE_MAGIC:
+                self.file.close()
+                raise ValueError(f"{path} is not a trace of this version; record to a new file")
+        self._ids = {}  # {interface or rule name: id} written to this file
+        self._interfaces = {}  # {id: interface name}, for the ids freed when an interface goes
+        self._free = []  # Ids of departed interfaces, reused before new ones
+        self._next_id = 0
+        self._previous = {}  # {interface id: (bytes_recv, bytes_sent)} as last written
+        self._last_input = None
+        self._next_flush = 0.0
+
+    def _record(self, kind, payload):
+        if self.file.closed:
+            return  # A tick still in flight when the engine shut down
+        self.file.write(_HEADER.pack(kind, len(payload)) + payload)
+
+    def _id(self, name):
+        """The id of ``name``, writing a NAME record the first time; the caller holds the lock."""
+        ident = self._ids.get(name)
+        if ident is None:
+            if self._free:
+                ident = self._free.pop()
+            else:
+                ident = self._next_id
+                self._next_id += 1
+            self._ids[name] = ident
+            self._record(NAME, _ID.pack(ident) + name.encode())
+        return ident
+
+    def _maybe_flush(self, timestamp):
+        if timestamp >= self._next_flush:
+            self._next_flush = timestamp + TRACE_FLUSH_INTERVAL
+            self._flush()
+
+    def settings(self, timestamp, settings):
+        """Record the settings a monitoring session starts with (a JSON-serializable dict)."""
+        with self.lock:
+            self._previous = {}  # The sampler starts from a fresh baseline too
+            settings = dict(settings, wall_time=time.time())
+            self._record(SETTINGS, _TIME.pack(timestamp) + json.dumps(settings).encode())
+            self._flush()
+
+    def counters(self, timestamp, counters):
+        """Record one psutil-style {interface: counters} reading of the monitored interfaces."""
+        with self.lock:
+            previous = self._previous
+            current = {}
+            changed = []
+            for name, nic in counters.items():
+                ident = self._id(name)
+                self._interfaces[ident] = name
+                value = (nic.bytes_recv, nic.bytes_sent)
+                current[ident] = value
+                if previous.get(ident) != value:
+                    changed.append(_NIC.pack(ident, *value))
+            gone = [ident for ident in previous if ident not in current]
+            self._previous = current
+            if gone:
+                self._record(GONE, _COUNT.pack(timestamp, len(gone)) + b"".join(_ID.pack(i) for i in gone))
+                for ident in gone:
+                    name = self._interfaces.pop(ident, None)
+                    if name is not None and self._ids.get(name) == ident:
+                        del self._ids[name]
+                        self._free.append(ident)
+            self._record(COUNTERS, _COUNT.pack(timestamp, len(changed)) + b"".join(changed))
+            self._maybe_flush(timestamp)
+
+    def activity(self, timestamp, last_input):
+        """Record the user's last input time when it has moved."""
+        with self.lock:
+            if last_input == self._last_input:
+                return
+            self._last_input = last_input
+            self._record(ACTIVITY, _PAIR.pack(timestamp, last_input))
+
+    def rule(self, timestamp, rule):
+        with self.lock:
+            self._record(RULE, _RULE.pack(timestamp, self._id(rule.name), rule.engaged, rule.mean.mean))
+
+    def signal(self, timestamp, name, value):
+        """Record one activity signal reading (CPU, disk or process count)."""
+        with self.lock:
+            self._record(SIGNAL, _SIGNAL.pack(timestamp, self._id(name), value))
+
+    def sleep(self, timestamp, inactivity):
+        with self.lock:
+            self._record(SLEEP, _PAIR.pack(timestamp, inactivity))
+            self._flush()
+
+    def stop(self, timestamp):
+        with self.lock:
+            self._record(STOP, _TIME.pack(timestamp))
+            self._flush()
+
+    def _flush(self):
+        if not self.file.closed:
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def read_trace(path):
+    """Yield (type, timestamp, data) for each record of a trace file.
+
+    ``data`` is the settings dict, {interface: NicCounters} of changed
+    counters, the last input time, (rule, engaged, mean), (signal, value),
+    the inactivity at sleep, or the list of vanished interfaces. NAME records are resolved and
+    not yielded; an id may be given to a new name once its interface is gone. A record cut
+    short by a crash ends the trace.
+    """
+    names = {}
+    with open(path, "rb") as f:
+        data = f.read()
+    if data.startswith(TRACE_MAGIC):
+        id_struct, nic_struct, rule_struct, signal_struct = _ID, _NIC, _RULE, _SIGNAL
+    elif data.startswith(TRACE_MAGIC_V1):
+        id_struct, nic_struct, rule_struct, signal_struct = _V1_STRUCTS
+    else:
+        raise ValueError(f"{path} is not a Sleep Sentinel trace")
+    position = len(TRACE_MAGIC)
+    end = len(data)
+    while position + _HEADER.size <= end:
+        kind, length = _HEADER.unpack_from(data, position)
+        position += _HEADER.size
+        if position + length > end:
+            break
+        payload = memoryview(data)[position:position + length]
+        position += length
+        if kind == NAME:
+            names[id_struct.unpack_from(payload)[0]] = bytes(payload[id_struct.size:]).decode()
+        elif kind == COUNTERS:
+            timestamp, count = _COUNT.unpack_from(payload)
+            nics = {}
+            for offset in range(_COUNT.size, _COUNT.size + count * nic_struct.size, nic_struct.size):
+                ident, received, sent = nic_struct.unpack_from(payload, offset)
+                nics[names[ident]] = NicCounters(sent, received)
+            yield COUNTERS, timestamp, nics
+        elif kind == GONE:
+            timestamp, count = _COUNT.unpack_from(payload)
+            yield GONE, timestamp, [names[id_struct.unpack_from(payload, _COUNT.size + i * id_struct.size)[0]]
+                                    for i in range(count)]
+        elif kind == ACTIVITY:
+            timestamp, last_input = _PAIR.unpack_from(payload)
+            yield ACTIVITY, timestamp, last_input
+        elif kind == RULE:
+            timestamp, ident, engaged, mean = rule_struct.unpack_from(payload)
+            yield RULE, timestamp, (names[ident], bool(engaged), mean)
+        elif kind == SIGNAL:
+            timestamp, ident, value = signal_struct.unpack_from(payload)
+            yield SIGNAL, timestamp, (names[ident], value)
+        elif kind == SLEEP:
+            timestamp, inactivity = _PAIR.unpack_from(payload)
+            yield SLEEP, timestamp, inactivity
+        elif kind == SETTINGS:
+            timestamp, = _TIME.unpack_from(payload)
+            yield SETTINGS, timestamp, json.loads(bytes(payload[_TIME.size:]))
+        elif kind == STOP:
+            timestamp, = _TIME.unpack_from(payload)
+            yield STOP, timestamp, None
+
+
+class Replay:
+    """Feed a trace through NetworkSampler and SleepPolicy in virtual time.
+
+    Settings come from the trace's SETTINGS records unless overridden, so a
+    recorded incident can be replayed as it happened or with other
+    thresholds. The inactivity check runs at every expiry the live engine
+    would have scheduled. Each would-be sleep is reported with the state that
+    caused it. After a sleep the machine counts as asleep until the next
+    recorded input, which wakes it and restarts the inactivity timer; this is
+    the wake model of sweep.evaluate_session, so both report the same sleeps.
+    The rules keep following the recorded samples while asleep, so they are
+    in the state the trace shows when the machine wakes.
+    """
+
+    def __init__(self, overrides=None):
+        self.overrides = {key: value for key, value in (overrides or {}).items() if value is not None}
+        self.clock = VirtualClock()
+        self.counters = {}  # Reconstructed {interface: NicCounters}
+        self.sampler = None
+        self.policy = None
+        self.settings = {}
+        self.last_rates = (0.0, 0.0)
+        self.sleeps = []  # Would-be sleep events, as dicts
+        self.recorded_sleeps = []  # SLEEP records in the trace, for comparison
+        self.samples = 0
+        self.records = 0
+        self.asleep = False  # A would-be sleep fired and no input has woken the machine since
+
+    def _start(self, timestamp):
+        self.asleep = False
+        settings = dict(self.settings, **self.overrides)
+        interface_filter = InterfaceFilter(settings.get("include_interfaces", ()),
+                                           settings.get("exclude_interfaces", DEFAULT_EXCLUDE_INTERFACES))
+        self.sampler = NetworkSampler(CHECK_INTERVAL, settings.get("burst_interval"), interface_filter,
+                                      read_counters=lambda: self.counters, clock=self.clock)
+        self.sampler.on_sample = self._on_sample
+        tuning = (settings.get("decision_window", DEFAULT_DECISION_WINDOW),
+                  settings.get("release_ratio", DEFAULT_RELEASE_RATIO),
+                  settings.get("engage_hold", DEFAULT_ENGAGE_HOLD),
+                  settings.get("release_hold", DEFAULT_RELEASE_HOLD))
+        rules = network_rules(settings.get("download_threshold", 10), settings.get("upload_threshold", 10), *tuning)
+        for signal in build_signals(settings.get("cpu_threshold"), settings.get("disk_threshold"),
+                                    settings.get("keep_awake_processes", ()), settings.get("process_traffic", ())):
+            rules += signal.rules(*tuning)
+        self.policy = SleepPolicy(DecisionEngine(rules), settings.get("inactivity_limit", 60), timestamp)
+
+    def _on_sample(self, timestamp, download, upload, interface_speeds):
+        self.samples += 1
+        self.last_rates = (download, upload)
+        self.policy.observe_sample(timestamp, {"download": download, "upload": upload})
+
+    def _check_until(self, timestamp, inclusive):
+        """Run the inactivity checks due before (or, if ``inclusive``, at) ``timestamp``."""
+        policy = self.policy
+        while policy is not None and not self.asleep and not policy.decision_engine.engaged():
+            expiry = policy.last_activity + policy.inactivity_limit
+            if expiry > timestamp or (expiry == timestamp and not inclusive):
+                return
+            self.sleeps.append({
+                "time": expiry,
+                "inactivity": expiry - policy.last_activity,
+                "last_reset": policy.last_reason,
+                "last_activity": policy.last_activity,
+                "download": self.last_rates[0],
+                "upload": self.last_rates[1],
+                "rules": [rule.describe() for rule in policy.decision_engine.rules],
+            })
+            self.asleep = True
+
+    def run(self, path):
+        """Replay the trace at ``path``; returns the would-be sleep events."""
+        for kind, timestamp, data in read_trace(path):
+            self.records += 1
+            self.clock.now = timestamp
+            if kind == SETTINGS:
+                self.settings = data
+                self._start(timestamp)
+                continue
+            # The live check samples before deciding, so a reading at the expiry itself counts
+            self._check_until(timestamp, inclusive=False)
+            if kind == COUNTERS:
+                self.counters.update(data)
+                if self.sampler is not None:
+                    self.sampler.tick(timestamp)
+            elif kind == GONE:
+                for name in data:
+                    self.counters.pop(name, None)
+            elif kind == ACTIVITY and self.policy is not None:
+                if self.asleep:
+                    sleep = self.sleeps[-1]
+                    if data > sleep["time"]:
+                        self.asleep = False  # Input after the sleep woke the machine
+                    elif data > sleep["last_activity"]:
+                        # Input is recorded on the next sample; this one came before the expiry, so no sleep
+                        self.sleeps.pop()
+                        self.asleep = False
+                self.policy.observe_activity(data)
+            elif kind == SIGNAL and self.policy is not None:
+                self.policy.observe_sample(timestamp, {data[0]: data[1]})
+            elif kind == SLEEP:
+                self.recorded_sleeps.append(timestamp)
+            elif kind == STOP:
+                self.policy = None
+                self.asleep = False
+            self._check_until(timestamp, inclusive=True)
+        return self.sleeps
+
+
+def format_report(replay, elapsed):
+    """Human-readable summary of a replay."""
+    lines = [f"Replayed {replay.records} records ({replay.samples} samples) in {elapsed * 1000:.1f} ms"]
+    if not replay.sleeps:
+        lines.append("Sleep would not have fired.")
+    for event in replay.sleeps:
+        lines.append(f"Sleep at t={event['time']:.3f}: {event['inactivity']:.1f}s without activity since "
+                     f"t={event['last_activity']:.3f} (last reset: {event['last_reset']}); "
+                     f"rates {event['download']:.2f}/{event['upload']:.2f} Mbps down/up")
+        for rule in event["rules"]:
+            lines.append(f"    {rule}")
+    if replay.recorded_sleeps:
+        lines.append("Recorded sleeps at " + ", ".join(f"t={t:.3f}" for t in replay.recorded_sleeps))
+    return "\n".join(lines)